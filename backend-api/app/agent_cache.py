@@ -0,0 +1,129 @@
+# backend-api/app/agent_cache.py
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from .config import settings
+from .redis_client import get_async_client
+
+"""
+In-process cache of serialized GET /v1/agent/{slug} responses.
+
+Entries hold the response bytes, their ETag and the edit token (so the token check
+needs no Redis either), bounded by AGENT_CACHE_MAX_ENTRIES and AGENT_CACHE_TTL_SECONDS.
+
+Writers that change what the response shows (updates, phone number ready) publish
+the slug on agent:invalidate inside their MULTI/EXEC; every API process runs
+listen() and drops the entry. The cache is only used while that subscription is
+live: on (re)connect it starts empty, since invalidations may have been missed.
+A fill that raced with an invalidation is discarded rather than stored.
+"""
+
+log = logging.getLogger("pheona.agent_cache")
+
+CHANNEL = "agent:invalidate"
+
+class _Entry:
+    __slots__ = ("body", "etag", "edit_token", "expires")
+
+    def __init__(self, body: bytes, etag: str, edit_token: str, expires: float):
+        self.body = body
+        self.etag = etag
+        self.edit_token = edit_token
+        self.expires = expires
+
+_entries: "OrderedDict[str, _Entry]" = OrderedDict()
+_lock = threading.Lock()
+_live = False
+_epoch = 0   # bumped on every invalidation; fills started under an older epoch are dropped
+_counters: Dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0, "stale_fills": 0}
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def epoch() -> int:
+    return _epoch
+
+def get(slug: str) -> Optional[_Entry]:
+    if not _live or settings.AGENT_CACHE_MAX_ENTRIES <= 0:
+        return None
+    with _lock:
+        entry = _entries.get(slug)
+        if entry is not None and entry.expires > time.monotonic():
+            _entries.move_to_end(slug)
+            _counters["hits"] += 1
+            return entry
+        if entry is not None:
+            del _entries[slug]
+    _counters["misses"] += 1
+    return None
+
+def put(slug: str, body: bytes, edit_token: str, started_epoch: int) -> _Entry:
+    entry = _Entry(body, make_etag(body), edit_token, time.monotonic() + settings.AGENT_CACHE_TTL_SECONDS)
+    if not _live or settings.AGENT_CACHE_MAX_ENTRIES <= 0:
+        return entry
+    with _lock:
+        if started_epoch != _epoch:
+            _counters["stale_fills"] += 1
+            return entry
+        _entries[slug] = entry
+        _entries.move_to_end(slug)
+        while len(_entries) > settings.AGENT_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return entry
+
+def invalidate_local(slug: Optional[str] = None) -> None:
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _counters["invalidations"] += 1
+        if slug is None:
+            _entries.clear()
+        else:
+            _entries.pop(slug, None)
+
+def invalidate_ops(pipe: Any, slug: str) -> None:
+    """Queue the cross-process invalidation on a (transactional) pipeline."""
+    pipe.publish(CHANNEL, slug)
+
+async def listen(redis: Any = None) -> None:
+    """Subscription loop; run as a background task for the life of the API process."""
+    global _live
+    while True:
+        pubsub = None
+        try:
+            pubsub = (redis or get_async_client()).pubsub()
+            await pubsub.subscribe(CHANNEL)
+            invalidate_local()
+            _live = True
+            while True:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if msg is not None and msg.get("type") == "message":
+                    invalidate_local(msg["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Agent cache subscription lost, bypassing cache: %s", e)
+        finally:
+            _live = False
+            invalidate_local()
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+        await asyncio.sleep(1.0)
+
+def stats() -> Dict[str, Any]:
+    lookups = _counters["hits"] + _counters["misses"]
+    return {
+        **_counters,
+        "live": _live,
+        "size": len(_entries),
+        "max_entries": settings.AGENT_CACHE_MAX_ENTRIES,
+        "hit_ratio": (_counters["hits"] / lookups) if lookups else 0.0,
+    }
@@ -0,0 +1,177 @@
+# backend-api/app/agent_codec.py
+from __future__ import annotations
+import base64
+import hashlib
+import json
+import logging
+import zlib
+from typing import Any, Dict, Optional, Tuple
+from .config import settings
+from .templates import registry as template_registry
+
+try:  # optional: smaller, faster payload encoding
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+"""
+Versioned storage codec for agent:{slug} hashes.
+
+v1 (legacy, no "codec" field): payload is json.dumps text, prompts are plain strings.
+v2 ("codec" = "2"): the bulky fields are stored as "<format>:<data>"
+
+  t:<text>           plain (short strings where compression doesn't pay)
+  z:<b85>            zlib
+  zd:<b85>           zlib with the template dictionary (record field "dict" = its id)
+  jz:<b85> / mz:<b85>  payload as zlib'd JSON / msgpack (msgpack when installed)
+
+The template dictionary is the concatenation of every prompt file the template
+references, stored once at agentcodec:dict:{id} (content-addressed, shared by all
+agents built from that template version). Dictionary keys are written without a
+TTL and must never expire or be evicted (run Redis with a noeviction or volatile-*
+maxmemory-policy): records compressed against one are unreadable without it, and
+decode raises MissingDictionary. Compressing against it means the text
+an agent shares with its template is stored as back-references rather than copied.
+zstd would do the same with a trained dictionary, but zlib's preset dictionary
+needs no extra dependency and gets most of the gain on prompts of this size.
+
+Values are base85 text because the Redis client decodes responses. Small fields
+(assistantId, phoneNumber, editToken, revision) stay plain so HGET on them keeps
+working unchanged.
+"""
+
+log = logging.getLogger("pheona.agent_codec")
+
+CODEC_VERSION = "2"
+ENCODED_FIELDS = ("payload", "system_prompt", "first_message")
+_DICT_PREFIX = "agentcodec:dict:"
+_ZDICT_MAX = 32 * 1024  # zlib only uses the last 32 KiB of a preset dictionary
+
+# Dictionaries are immutable per id; keep the ones we've seen in memory
+_dicts: Dict[str, bytes] = {}
+
+class MissingDictionary(ValueError):
+    """A record was compressed against a dictionary that is no longer in Redis."""
+
+def dict_key(dict_id: str) -> str:
+    return _DICT_PREFIX + dict_id
+
+def template_dictionary(template_key: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """(id, bytes) for the template's prompt dictionary, or None if the template is unknown."""
+    if not template_key:
+        return None
+    try:
+        texts = template_registry.prompt_texts(template_key)
+    except Exception as e:
+        log.warning("No codec dictionary for %s: %s", template_key, e)
+        return None
+    # Most-shared text last: zlib prefers the closest (latest) matches
+    data = "\n".join(reversed(texts)).encode("utf-8")
+    if len(data) > _ZDICT_MAX:
+        data = data[-_ZDICT_MAX:]
+        while data and 0x80 <= data[0] < 0xC0:  # don't start mid-character; it's stored as text
+            data = data[1:]
+    dict_id = hashlib.sha256(data).hexdigest()[:16]
+    _dicts.setdefault(dict_id, data)
+    return dict_id, data
+
+def _b85(data: bytes) -> str:
+    return base64.b85encode(data).decode("ascii")
+
+def _compress(data: bytes, zdict: Optional[bytes]) -> bytes:
+    c = zlib.compressobj(9, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, **({"zdict": zdict} if zdict else {}))
+    return c.compress(data) + c.flush()
+
+def _decompress(data: bytes, zdict: Optional[bytes]) -> bytes:
+    d = zlib.decompressobj(-15, **({"zdict": zdict} if zdict else {}))
+    return d.decompress(data) + d.flush()
+
+def _encode_text(text: str, zdict: Optional[bytes]) -> str:
+    raw = text.encode("utf-8")
+    best = "t:" + text
+    candidates = [("z", _compress(raw, None))]
+    if zdict:
+        candidates.append(("zd", _compress(raw, zdict)))
+    for fmt, blob in candidates:
+        encoded = f"{fmt}:{_b85(blob)}"
+        if len(encoded) < len(best.encode("utf-8")):
+            best = encoded
+    return best
+
+def _decode_text(value: str, zdict: Optional[bytes]) -> str:
+    fmt, _, data = value.partition(":")
+    if fmt == "t":
+        return data
+    if fmt == "z":
+        return _decompress(base64.b85decode(data), None).decode("utf-8")
+    if fmt == "zd":
+        if zdict is None:
+            raise MissingDictionary("record needs a codec dictionary that could not be loaded")
+        return _decompress(base64.b85decode(data), zdict).decode("utf-8")
+    raise ValueError(f"unknown text format {fmt!r}")
+
+def _encode_payload(payload: Dict[str, Any]) -> str:
+    if msgpack is not None and settings.AGENT_CODEC_MSGPACK:
+        return "mz:" + _b85(_compress(msgpack.packb(payload, use_bin_type=True), None))
+    return "jz:" + _b85(_compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), None))
+
+def _decode_payload(value: str) -> Dict[str, Any]:
+    fmt, _, data = value.partition(":")
+    raw = _decompress(base64.b85decode(data), None)
+    if fmt == "mz":
+        if msgpack is None:
+            raise RuntimeError("msgpack is required to read this agent record")
+        return msgpack.unpackb(raw, raw=False)
+    if fmt == "jz":
+        return json.loads(raw)
+    raise ValueError(f"unknown payload format {fmt!r}")
+
+def encode(record: Dict[str, Any]) -> Tuple[Dict[str, str], Optional[Tuple[str, bytes]]]:
+    """
+    Logical record (payload as a dict) → hash mapping, plus the dictionary the caller
+    must make sure exists (see ensure_dict_ops) when one was used.
+    """
+    payload = record["payload"]
+    dictionary = template_dictionary(payload.get("template_key"))
+    zdict = dictionary[1] if dictionary else None
+    out = {k: str(v) for k, v in record.items() if k not in ENCODED_FIELDS}
+    out["codec"] = CODEC_VERSION
+    out["payload"] = _encode_payload(payload)
+    out["system_prompt"] = _encode_text(record["system_prompt"], zdict)
+    out["first_message"] = _encode_text(record["first_message"], zdict)
+    used = any(out[f].startswith("zd:") for f in ("system_prompt", "first_message"))
+    out["dict"] = dictionary[0] if used else ""
+    return out, (dictionary if used else None)
+
+def ensure_dict_ops(pipe: Any, dictionary: Optional[Tuple[str, bytes]]) -> None:
+    # No TTL on purpose: every record that references the id needs it for as long as it exists
+    if dictionary is not None:
+        pipe.set(dict_key(dictionary[0]), dictionary[1].decode("utf-8"), nx=True)
+
+async def _load_dict(redis: Any, dict_id: str) -> Optional[bytes]:
+    if not dict_id:
+        return None
+    data = _dicts.get(dict_id)
+    if data is None:
+        raw = await redis.get(dict_key(dict_id))
+        if raw is None:
+            return None
+        data = _dicts[dict_id] = raw.encode("utf-8")
+    return data
+
+async def decode(raw: Dict[str, str], redis: Any) -> Dict[str, Any]:
+    """Hash mapping (any version) → logical record with payload as a dict."""
+    if raw.get("codec") != CODEC_VERSION:
+        out: Dict[str, Any] = dict(raw)
+        out["payload"] = json.loads(raw["payload"]) if raw.get("payload") else {}
+        return out
+    zdict = await _load_dict(redis, raw.get("dict", ""))
+    out = {k: v for k, v in raw.items() if k not in ("codec", "dict")}
+    out["payload"] = _decode_payload(raw["payload"])
+    out["system_prompt"] = _decode_text(raw["system_prompt"], zdict)
+    out["first_message"] = _decode_text(raw["first_message"], zdict)
+    return out
+
+def encoded_size(mapping: Dict[str, str]) -> int:
+    """Bytes of field names + values, a proxy for the hash's memory."""
+    return sum(len(k.encode("utf-8")) + len(str(v).encode("utf-8")) for k, v in mapping.items())
@@ -0,0 +1,227 @@
+# backend-api/app/agent_index.py
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import math
+import re
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from . import agent_codec
+from .redis_client import get_async_client, close_async_client
+
+"""
+Secondary indexes over agent:{slug}, written in the same MULTI/EXEC as the record.
+
+  agents:by_created              zset  slug → created_at (ms)
+  agents:by_template:{key}       zset  slug → created_at (ms)
+  agents:by_name                 zset  "{normalized business name}\\0{slug}" → 0 (lex order)
+
+Listing is newest-first by created_at (optionally within one template), or in name
+order for a business-name prefix; both are O(log n + page) with an opaque cursor
+that records the last item returned. A name prefix combined with a template is
+served from the name index and filtered with ZMSCORE against the template set.
+
+Plain summary fields (createdAt, agentName, businessName, templateKey) live on the
+agent hash so a page is one pipelined HMGET, with no decoding of the codec fields.
+
+Existing records: python -m app.agent_index backfill
+"""
+
+log = logging.getLogger("pheona.agent_index")
+
+BY_CREATED = "agents:by_created"
+BY_NAME = "agents:by_name"
+SUMMARY_FIELDS = ("createdAt", "agentName", "businessName", "templateKey", "phoneNumber")
+_MAX_SCAN_PAGES = 20   # bound on filtered scans (prefix + template) per request
+
+def by_template(template_key: str) -> str:
+    return f"agents:by_template:{template_key}"
+
+def normalize_name(name: str) -> str:
+    """ASCII, lowercase, single spaces: every byte sorts below \\x7f, which bounds prefix ranges."""
+    value = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", value.lower()).strip()
+
+def _name_member(business_name: str, slug: str) -> str:
+    return f"{normalize_name(business_name)}\0{slug}"
+
+def summary_fields(payload: Dict[str, Any], created_at_ms: Optional[int] = None) -> Dict[str, str]:
+    fields = {
+        "agentName": payload.get("agent_name") or "",
+        "businessName": payload.get("business_name") or "",
+        "templateKey": payload.get("template_key") or "",
+    }
+    if created_at_ms is not None:
+        fields["createdAt"] = str(created_at_ms)
+    return fields
+
+def index_ops(pipe: Any, slug: str, payload: Dict[str, Any], created_at_ms: int) -> None:
+    pipe.zadd(BY_CREATED, {slug: created_at_ms})
+    if payload.get("template_key"):
+        pipe.zadd(by_template(payload["template_key"]), {slug: created_at_ms})
+    pipe.zadd(BY_NAME, {_name_member(payload.get("business_name") or "", slug): 0})
+
+def reindex_ops(pipe: Any, slug: str, before: Dict[str, Any], after: Dict[str, Any], created_at_ms: int) -> None:
+    """Moves the entries whose indexed fields changed (business name, template)."""
+    if before.get("template_key") != after.get("template_key"):
+        if before.get("template_key"):
+            pipe.zrem(by_template(before["template_key"]), slug)
+        if after.get("template_key"):
+            pipe.zadd(by_template(after["template_key"]), {slug: created_at_ms})
+    if normalize_name(before.get("business_name") or "") != normalize_name(after.get("business_name") or ""):
+        pipe.zrem(BY_NAME, _name_member(before.get("business_name") or "", slug))
+        pipe.zadd(BY_NAME, {_name_member(after.get("business_name") or "", slug): 0})
+
+def encode_cursor(obj: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(obj, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+# Cursor fields per listing mode: by score (newest first) or by name
+_CURSOR_FIELDS = {"score": {"s", "m"}, "name": {"m"}}
+
+def decode_cursor(cursor: Optional[str], mode: str) -> Optional[Dict[str, Any]]:
+    """Parses a cursor from encode_cursor; ValueError unless it is well formed and for `mode`."""
+    if not cursor:
+        return None
+    try:
+        obj = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(obj, dict) or set(obj) != _CURSOR_FIELDS[mode] or not isinstance(obj["m"], str):
+        raise ValueError("invalid cursor")
+    if mode == "score" and (isinstance(obj["s"], bool) or not isinstance(obj["s"], (int, float))
+                            or not math.isfinite(obj["s"])):
+        raise ValueError("invalid cursor")
+    return obj
+
+async def _page_by_score(redis: Any, key: str, limit: int, cursor: Optional[Dict[str, Any]]) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+    max_score: Any = "+inf"
+    after: Optional[Tuple[float, str]] = None
+    if cursor:
+        max_score, after = cursor["s"], (float(cursor["s"]), cursor["m"])
+    out: List[Tuple[str, float]] = []
+    offset = 0
+    while len(out) <= limit:
+        rows = await redis.zrevrangebyscore(key, max_score, "-inf", start=offset, num=limit + 1, withscores=True)
+        offset += len(rows)
+        for member, score in rows:
+            # Same-score members come in descending lex order; skip the ones already returned
+            if after and score == after[0] and member >= after[1]:
+                continue
+            out.append((member, score))
+        if len(rows) < limit + 1:
+            break
+    page = out[:limit]
+    nxt = {"s": page[-1][1], "m": page[-1][0]} if len(out) > limit else None
+    return [m for m, _ in page], nxt
+
+async def _page_by_name(
+    redis: Any, prefix: str, limit: int, cursor: Optional[Dict[str, Any]],
+    keep: Optional[Callable[[List[str]], Awaitable[List[bool]]]] = None,
+) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+    prefix = normalize_name(prefix)
+    lo = "(" + cursor["m"] if cursor else "[" + prefix
+    hi = "(" + prefix + "\x7f"
+    out: List[str] = []
+    exhausted = False
+    for _ in range(_MAX_SCAN_PAGES):
+        members = await redis.zrangebylex(BY_NAME, lo, hi, start=0, num=limit + 1)
+        flags = await keep([m.rsplit("\0", 1)[1] for m in members]) if keep and members else [True] * len(members)
+        for member, ok in zip(members, flags):
+            lo = "(" + member
+            if ok:
+                out.append(member)
+                if len(out) > limit:
+                    break
+        if len(out) > limit:
+            break
+        if len(members) < limit + 1:
+            exhausted = True
+            break
+    if len(out) > limit:
+        nxt: Optional[Dict[str, Any]] = {"m": out[limit - 1]}
+    else:
+        # Scan budget used up with candidates left: resume after the last one examined
+        nxt = None if exhausted else {"m": lo[1:]}
+    return [m.rsplit("\0", 1)[1] for m in out[:limit]], nxt
+
+async def list_agents(
+    *, template_key: Optional[str] = None, name_prefix: Optional[str] = None,
+    limit: int = 20, cursor: Optional[str] = None, redis: Any = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    redis = redis or get_async_client()
+    cur = decode_cursor(cursor, "name" if name_prefix else "score")
+    if name_prefix:
+        keep = None
+        if template_key:
+            async def keep(slugs: List[str]) -> List[bool]:
+                scores = await redis.zmscore(by_template(template_key), slugs)
+                return [s is not None for s in scores]
+        slugs, nxt = await _page_by_name(redis, name_prefix, limit, cur, keep)
+    else:
+        key = by_template(template_key) if template_key else BY_CREATED
+        slugs, nxt = await _page_by_score(redis, key, limit, cur)
+
+    pipe = redis.pipeline(transaction=False)
+    for slug in slugs:
+        pipe.hmget(f"agent:{slug}", SUMMARY_FIELDS)
+    rows = await pipe.execute() if slugs else []
+    items = []
+    for slug, values in zip(slugs, rows):
+        if values[0] is None and values[1] is None:
+            continue  # deleted since it was indexed
+        item = dict(zip(SUMMARY_FIELDS, values))
+        items.append({
+            "slug": slug,
+            "agent_name": item["agentName"] or "",
+            "business_name": item["businessName"] or "",
+            "template_key": item["templateKey"] or "",
+            "created_at": int(item["createdAt"] or 0) / 1000.0,
+            "phoneNumber": item["phoneNumber"] or None,
+        })
+    return items, (encode_cursor(nxt) if nxt else None)
+
+# ---------------- backfill ----------------
+
+async def backfill(redis: Any = None, batch: int = 500) -> Dict[str, int]:
+    """Indexes every agent:{slug} hash; safe to re-run (ZADD/HSET are idempotent)."""
+    redis = redis or get_async_client()
+    counts = {"agents": 0, "indexed": 0}
+    async for key in redis.scan_iter(match="agent:*", count=batch, _type="hash"):
+        if not re.match(r"^agent:[^:]+$", key):
+            continue
+        raw = await redis.hgetall(key)
+        if not raw or "payload" not in raw:
+            continue
+        counts["agents"] += 1
+        slug = key.split(":", 1)[1]
+        record = await agent_codec.decode(raw, redis)
+        created = raw.get("createdAt")
+        if not created:
+            # Pre-index records: best available timestamp is when provisioning last moved
+            prov = await redis.hmget(f"{key}:provisioning", "reserved_at", "updated_at")
+            created = next((int(float(v) * 1000) for v in prov if v), int(time.time() * 1000))
+        pipe = redis.pipeline(transaction=True)
+        pipe.hset(key, mapping=summary_fields(record["payload"], int(created)))
+        index_ops(pipe, slug, record["payload"], int(created))
+        await pipe.execute()
+        counts["indexed"] += 1
+    return counts
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Agent secondary indexes")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch", type=int, default=500, help="SCAN count hint")
+    args = parser.parse_args()
+    try:
+        counts = await backfill(batch=args.batch)
+        print(json.dumps(counts))
+    finally:
+        await close_async_client()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main())
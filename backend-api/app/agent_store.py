@@ -0,0 +1,209 @@
+# backend-api/app/agent_store.py
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from . import agent_cache, agent_codec, agent_index, provisioning
+from .config import settings
+from .redis_client import ar
+
+"""
+Agent persistence on the asyncio Redis client.
+
+  agent:{slug}               → hash {assistantId, phoneNumber, payload, system_prompt, first_message,
+                                      editToken, revision, codec, dict, createdAt, agentName,
+                                      businessName, templateKey}; the bulky fields are
+                                      compressed, see agent_codec.py
+  agents:*                   → listing indexes, see agent_index.py
+  agent:by_token:{token}     → slug
+  agent:{slug}:provisioning  → see provisioning.py
+  agent:{slug}:revisions     → list of reverse diffs, oldest first (see revisions.py)
+  agent:{slug}:lock          → held for the duration of an update
+
+New agents are written with a single MULTI/EXEC so the record, the token index and
+the provisioning task (and the listing indexes) land together or not at all;
+updates write the new fields and their revision the same way. Bulk creates share
+one MULTI/EXEC per batch of agents (BatchWriter).
+"""
+
+log = logging.getLogger("pheona.agent_store")
+
+def agent_key(slug: str) -> str:
+    return f"agent:{slug}"
+
+def token_key(edit_token: str) -> str:
+    return f"agent:by_token:{edit_token}"
+
+def revisions_key(slug: str) -> str:
+    return f"agent:{slug}:revisions"
+
+def lock_key(slug: str) -> str:
+    return f"agent:{slug}:lock"
+
+def _new_agent_ops(
+    pipe: Any,
+    *,
+    slug: str,
+    edit_token: str,
+    assistant_id: str,
+    payload: Dict[str, Any],
+    system_prompt: str,
+    first_message: str,
+    provision_phone_number: bool,
+    phone_label: Optional[str] = None,
+    area_code: Optional[str] = None,
+    phone_number_id: Optional[str] = None,
+    reserved_at: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Queues a new agent's writes on a transactional pipeline; returns the provisioning state."""
+    created_at = int(time.time() * 1000)
+    mapping, dictionary = agent_codec.encode({
+        "assistantId": assistant_id,
+        "phoneNumber": "",
+        "payload": payload,
+        "system_prompt": system_prompt,
+        "first_message": first_message,
+        "editToken": edit_token,
+        **agent_index.summary_fields(payload, created_at),
+    })
+    agent_codec.ensure_dict_ops(pipe, dictionary)
+    pipe.hset(agent_key(slug), mapping=mapping)
+    agent_index.index_ops(pipe, slug, payload, created_at)
+    pipe.set(token_key(edit_token), slug)
+    if provision_phone_number:
+        return provisioning.queue_ops(
+            pipe, slug, assistant_id, label=phone_label, area_code=area_code,
+            phone_number_id=phone_number_id, reserved_at=reserved_at,
+        )
+    prov_state = provisioning.initial_state(provisioning.SKIPPED)
+    pipe.hset(provisioning.state_key(slug), mapping=prov_state)
+    return prov_state
+
+async def save_new_agent(**fields: Any) -> Dict[str, Any]:
+    """Persists a new agent and (optionally) queues its number; returns the provisioning state."""
+    pipe = ar.pipeline(transaction=True)
+    prov_state = _new_agent_ops(pipe, **fields)
+    await pipe.execute()
+    return prov_state
+
+class BatchWriter:
+    """
+    Coalesces save_new_agent calls from concurrent tasks into one MULTI/EXEC per
+    batch (up to max_batch agents, or whatever arrived within max_delay). A failed
+    batch fails every caller in it; nothing in it was written.
+
+        async with BatchWriter() as writer:
+            prov_state = await writer.save(slug=..., ...)
+    """
+
+    def __init__(self, max_batch: Optional[int] = None, max_delay: float = 0.02):
+        self.max_batch = max(1, max_batch or settings.BULK_WRITE_BATCH)
+        self.max_delay = max_delay
+        self._queue: "asyncio.Queue[Tuple[Dict[str, Any], asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "BatchWriter":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        while not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.cancel()
+
+    async def save(self, **fields: Any) -> Dict[str, Any]:
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((fields, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch = [(fields, fut) for fields, fut in batch if not fut.done()]
+            if not batch:
+                continue
+            pipe = ar.pipeline(transaction=True)
+            queued = []
+            for fields, fut in batch:
+                try:
+                    queued.append((fut, _new_agent_ops(pipe, **fields)))
+                except Exception as e:  # encoding failed before anything was queued for this agent
+                    fut.set_exception(e)
+            try:
+                if queued:
+                    await pipe.execute()
+            except Exception as e:
+                for fut, _ in queued:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for fut, state in queued:
+                if not fut.done():
+                    fut.set_result(state)
+
+async def get_agent(slug: str) -> Optional[Dict[str, Any]]:
+    """Decoded record (payload as a dict), whatever codec version it was stored with."""
+    data = await ar.hgetall(agent_key(slug))
+    if not data:
+        return None
+    try:
+        return await agent_codec.decode(data, ar)
+    except agent_codec.MissingDictionary:
+        log.error("Agent %s references codec dictionary %s, which is missing from Redis", slug, data.get("dict"))
+        raise HTTPException(status_code=503, detail="Agent record is temporarily unreadable (codec dictionary missing)")
+
+async def get_edit_token(slug: str) -> Optional[str]:
+    return await ar.hget(agent_key(slug), "editToken")
+
+async def acquire_update_lock(slug: str) -> Optional[str]:
+    token = secrets.token_hex(8)
+    ok = await ar.set(lock_key(slug), token, nx=True, px=int(settings.AGENT_UPDATE_LOCK_SECONDS * 1000))
+    return token if ok else None
+
+async def release_update_lock(slug: str, token: str) -> None:
+    if await ar.get(lock_key(slug)) == token:
+        await ar.delete(lock_key(slug))
+
+async def save_update(slug: str, record: Dict[str, Any], revision: Dict[str, Any],
+                      previous_payload: Optional[Dict[str, Any]] = None) -> None:
+    """`record` is the full decoded record with the updated values."""
+    mapping, dictionary = agent_codec.encode({**record, **agent_index.summary_fields(record["payload"])})
+    # Owned by the provisioning worker, which may have set it since `record` was read
+    mapping.pop("phoneNumber", None)
+    pipe = ar.pipeline(transaction=True)
+    agent_codec.ensure_dict_ops(pipe, dictionary)
+    pipe.hset(agent_key(slug), mapping=mapping)
+    if previous_payload is not None:
+        created_at = int(record.get("createdAt") or 0)
+        agent_index.reindex_ops(pipe, slug, previous_payload, record["payload"], created_at)
+    pipe.rpush(revisions_key(slug), json.dumps(revision, separators=(",", ":"), ensure_ascii=False))
+    pipe.ltrim(revisions_key(slug), -max(1, settings.AGENT_MAX_REVISIONS), -1)
+    agent_cache.invalidate_ops(pipe, slug)
+    await pipe.execute()
+    agent_cache.invalidate_local(slug)
+
+async def get_revisions(slug: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Newest first."""
+    raw = await ar.lrange(revisions_key(slug), -limit, -1)
+    return [json.loads(r) for r in reversed(raw)]
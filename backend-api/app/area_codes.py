@@ -0,0 +1,145 @@
+# backend-api/app/area_codes.py
+from __future__ import annotations
+import asyncio
+import logging
+import math
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+from .config import settings
+from .redis_client import get_async_client
+
+"""
+Shared model of which US area codes Vapi currently has free numbers in.
+
+areacode:stats holds, per code, exponentially decayed counts of successes (s:),
+failures (f:) and "try one of …" hints from error bodies (h:), plus the last
+update time (t:). Scores are the Beta(1,1) posterior mean of success with hints
+counted at half weight (capped: one rejected provision repeats the same hint), so
+a code nobody has tried scores 0.5 and sorts between proven and exhausted codes.
+
+Decay makes every update a read-modify-write, so one attempt (the code plus its
+hints) is applied as a single WATCH/MULTI transaction, retried on conflict.
+Updates from the same process are serialized first, so WATCH only has to
+arbitrate between worker processes.
+
+areacode:metrics counts attempts and successes so attempts-per-success can be tracked.
+"""
+
+log = logging.getLogger("pheona.area_codes")
+
+STATS_KEY = "areacode:stats"
+METRICS_KEY = "areacode:metrics"
+DEFAULT_SEEDS = ["510", "518", "904", "509", "415", "407"]
+HINT_WEIGHT = 0.5
+HINT_CAP = 2.0
+
+def _decay(value: float, age: float) -> float:
+    half_life = settings.AREACODE_HALF_LIFE_SECONDS
+    return value * math.pow(0.5, max(0.0, age) / half_life) if half_life > 0 else value
+
+def _codes(raw: Dict[str, str], now: float) -> Dict[str, Dict[str, float]]:
+    out: Dict[str, Dict[str, float]] = {}
+    for field, val in raw.items():
+        kind, _, code = field.partition(":")
+        out.setdefault(code, {"s": 0.0, "f": 0.0, "h": 0.0, "t": now})[kind] = float(val)
+    for c in out.values():
+        age = now - c["t"]
+        for k in ("s", "f", "h"):
+            c[k] = _decay(c[k], age)
+    return out
+
+def score(c: Dict[str, float]) -> float:
+    hint = HINT_WEIGHT * min(HINT_CAP, c.get("h", 0.0))
+    return (c.get("s", 0.0) + hint + 1.0) / (c.get("s", 0.0) + c.get("f", 0.0) + hint + 2.0)
+
+async def snapshot(redis: Optional[aioredis.Redis] = None) -> Dict[str, Dict[str, float]]:
+    raw = await (redis or get_async_client()).hgetall(STATS_KEY)
+    return _codes(raw, time.time())
+
+async def ordered(preferred: Iterable[Optional[str]] = (), seeds: Optional[List[str]] = None,
+                  redis: Optional[aioredis.Redis] = None) -> List[str]:
+    """
+    Caller preferences first (e.g. body.area_code, VAPI_DEFAULT_AREACODE), then every
+    known or seeded code by descending success probability. Seeds break ties in order.
+    """
+    try:
+        stats = await snapshot(redis)
+    except Exception as e:
+        log.warning("Area-code stats unavailable, using seed order: %s", e)
+        stats = {}
+    seeds = list(seeds or DEFAULT_SEEDS)
+    rank = {c: i for i, c in enumerate(seeds)}
+    candidates = list(dict.fromkeys(seeds + list(stats)))
+    candidates.sort(key=lambda c: (-score(stats.get(c, {})), rank.get(c, len(rank))))
+    head = [c for c in dict.fromkeys(p for p in preferred if p)]
+    return head + [c for c in candidates if c not in head]
+
+_UPDATE_TRIES = 5
+_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+def _update_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _locks.get(loop)
+    if lock is None:
+        lock = _locks[loop] = asyncio.Lock()
+    return lock
+
+def _bumped(raw: List[Optional[str]], now: float, incr: Dict[str, float]) -> Dict[str, float]:
+    s, f, h, t = (float(v) if v is not None else 0.0 for v in raw)
+    age = (now - t) if t else 0.0
+    return {k: _decay(v, age) + incr.get(k, 0.0) for k, v in (("s", s), ("f", f), ("h", h))}
+
+async def record_attempt(code: str, ok: bool, hints: Iterable[str] = (),
+                         redis: Optional[aioredis.Redis] = None) -> None:
+    redis = redis or get_async_client()
+    updates: Dict[str, Dict[str, float]] = {code: {"s": 1.0} if ok else {"f": 1.0}}
+    for hint in hints:
+        if hint != code:
+            updates.setdefault(hint, {"h": 1.0})
+    fields = [f"{k}:{c}" for c in updates for k in ("s", "f", "h", "t")]
+    try:
+        async with _update_lock():
+            for _ in range(_UPDATE_TRIES):
+                async with redis.pipeline(transaction=True) as pipe:
+                    try:
+                        await pipe.watch(STATS_KEY)
+                        raw = await pipe.hmget(STATS_KEY, fields)
+                        now = time.time()
+                        mapping: Dict[str, float] = {}
+                        for i, (c, incr) in enumerate(updates.items()):
+                            mapping.update({f"{k}:{c}": v for k, v in _bumped(raw[4 * i:4 * i + 4], now, incr).items()})
+                            mapping[f"t:{c}"] = now
+                        pipe.multi()
+                        pipe.hset(STATS_KEY, mapping=mapping)
+                        pipe.hincrby(METRICS_KEY, "attempts", 1)
+                        if ok:
+                            pipe.hincrby(METRICS_KEY, "successes", 1)
+                        await pipe.execute()
+                        return
+                    except WatchError:
+                        continue  # another worker updated the stats; re-read and retry
+        log.warning("Dropped area-code outcome for %s after %d conflicting updates", code, _UPDATE_TRIES)
+    except Exception as e:
+        log.warning("Could not record area-code outcome for %s: %s", code, e)
+
+async def stats(limit: int = 20, redis: Optional[aioredis.Redis] = None) -> Dict[str, Any]:
+    redis = redis or get_async_client()
+    metrics = await redis.hgetall(METRICS_KEY)
+    attempts = int(metrics.get("attempts") or 0)
+    successes = int(metrics.get("successes") or 0)
+    codes: List[Tuple[str, Dict[str, float]]] = sorted(
+        (await snapshot(redis)).items(), key=lambda kv: -score(kv[1])
+    )
+    return {
+        "attempts": attempts,
+        "successes": successes,
+        "attempts_per_success": (attempts / successes) if successes else None,
+        "codes": [
+            {"area_code": code, "score": round(score(c), 4), "successes": round(c["s"], 3),
+             "failures": round(c["f"], 3), "hints": round(c["h"], 3)}
+            for code, c in codes[:limit]
+        ],
+    }
@@ -36,20 +36,113 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: Optional[str] = None
     # If your Redis Cloud endpoint requires TLS, set REDIS_TLS=1
     REDIS_TLS: Optional[bool] = None
+    # Connection pool (per process)
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0          # wait for a free pooled connection (asyncio client)
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30    # PING idle connections before reuse
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
 
     # --- Vapi ---
     VAPI_API_KEY: str
     VAPI_BASE_URL: str = "https://api.vapi.ai"
     VAPI_DEFAULT_AREACODE: Optional[str] = None
+    # Public URL of POST /v1/vapi/webhook, registered as the server URL on new numbers (optional)
+    VAPI_WEBHOOK_URL: Optional[str] = None
+    # Shared secret Vapi sends back as X-Vapi-Secret; the webhook is disabled when unset
+    VAPI_WEBHOOK_SECRET: Optional[str] = None
+    # Shared HTTP client (one pool per process)
+    VAPI_HTTP2: bool = True
+    VAPI_MAX_CONNECTIONS: int = 50
+    VAPI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    VAPI_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    VAPI_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    VAPI_TIMEOUT_SECONDS: float = 30.0
+
+    # --- Phone-number provisioning (Redis stream + workers) ---
+    # Run a worker inside the API process (dev / single instance). Disable when running `python -m app.worker`.
+    PROVISIONING_INLINE_WORKER: bool = True
+    PROVISIONING_WORKER_CONCURRENCY: int = 20
+    PROVISIONING_LEASE_SECONDS: int = 60
+    PROVISIONING_MAX_RETRIES: int = 4
+    PROVISIONING_RETRY_BASE_SECONDS: float = 5.0
+    PROVISIONING_RETRY_MAX_SECONDS: float = 300.0
+    PROVISIONING_POLL_TIMEOUT_SECONDS: float = 180.0
+    # Adaptive readiness polling: fast first check, then exponential backoff with jitter
+    PROVISIONING_POLL_INITIAL_SECONDS: float = 1.0
+    PROVISIONING_POLL_BACKOFF: float = 2.0
+    PROVISIONING_POLL_MAX_INTERVAL_SECONDS: float = 15.0
+    # Delay the first check to the observed p25 time-to-ready once enough samples exist
+    PROVISIONING_POLL_LEARN: bool = True
+    # Half-life of area-code success/failure evidence (older outcomes count less)
+    AREACODE_HALF_LIFE_SECONDS: float = 6 * 3600
 
     # --- Groq (prompt specialization only) ---
     GROQ_API_KEY: str
     GROQ_MODEL: str = "openai/gpt-oss-120b"  # supports json_schema outputs
+    # Max in-flight specializations per worker process; extra requests queue without blocking the loop
+    GROQ_MAX_CONCURRENCY: int = 8
+    GROQ_TIMEOUT_SECONDS: float = 60.0
+    GROQ_BASE_URL: Optional[str] = None
+
+    # --- Specializer routing (multi-provider) ---
+    # JSON list of {name, kind: groq|openai, model, base_url, api_key_env, json_schema}; empty = GROQ_MODEL only
+    SPECIALIZER_PROVIDERS: str = ""
+    # Send a hedge to the next-best provider if the first hasn't answered by then; 0 disables hedging
+    SPECIALIZER_HEDGE_AFTER_MS: int = 0
+
+    # --- Specialization cache (in-process LRU + Redis) ---
+    SPEC_CACHE_MAX_ENTRIES: int = 512
+    SPEC_CACHE_TTL_SECONDS: int = 86400
+    # Cross-worker single-flight lock; should exceed the slowest expected LLM call
+    SPEC_SINGLEFLIGHT_LOCK_SECONDS: float = 90.0
+    # How long a preview id stays valid for /agent/create to reuse
+    PREVIEW_TTL_SECONDS: int = 1800
+
+    # --- Agent records ---
+    AGENT_MAX_REVISIONS: int = 50            # reverse diffs kept per agent (oldest trimmed)
+    AGENT_UPDATE_LOCK_SECONDS: float = 60.0  # one update per agent at a time
+    # In-process cache of GET /v1/agent/{slug} responses (invalidated over pub/sub)
+    AGENT_CACHE_MAX_ENTRIES: int = 1024
+    AGENT_CACHE_TTL_SECONDS: float = 30.0
+    AGENT_CODEC_MSGPACK: bool = True         # msgpack payloads when the package is installed (else JSON)
+
+    # --- Create pipeline ---
+    # Reserve the phone number while the prompt is specialized, attach it to the assistant after
+    # (single creates only; bulk leaves numbers to the provisioning worker)
+    CREATE_EARLY_NUMBER: bool = True
+    # How long create waits for a slow reservation once the assistant exists (then the worker provisions)
+    CREATE_EARLY_NUMBER_WAIT_SECONDS: float = 5.0
+
+    # --- Idempotency-Key on /v1/agent/create ---
+    IDEMPOTENCY_TTL_SECONDS: int = 86400       # how long a finished response is replayed
+    IDEMPOTENCY_LOCK_SECONDS: float = 300.0    # in-progress claim; expires if the worker dies
+    IDEMPOTENCY_WAIT_SECONDS: float = 90.0     # duplicates wait this long for the original
+
+    # --- Bulk create (POST /v1/agents/bulk) ---
+    BULK_MAX_ITEMS: int = 500
+    BULK_SPECIALIZE_CONCURRENCY: int = 8     # per request, on top of GROQ_MAX_CONCURRENCY
+    BULK_VAPI_CONCURRENCY: int = 5           # concurrent assistant creates per request
+    BULK_WRITE_BATCH: int = 50               # agents per MULTI/EXEC
+
+    # --- Metrics ---
+    METRICS_ENABLED: bool = True     # GET /metrics (Prometheus text format)
+    METRICS_WORKER_PORT: int = 0     # standalone worker: serve its metrics on this port; 0 = off
+
+    # --- Tracing ---
+    TRACE_EXPORTERS: str = ""                # comma list of jsonl, otlp; empty disables tracing
+    TRACE_SAMPLE_RATIO: float = 0.05         # share of traces kept (callers can force one with the sampled flag)
+    TRACE_JSONL_PATH: str = "traces/spans.jsonl"
+    TRACE_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACE_OTLP_HEADERS: str = ""             # "key=value,key2=value2", e.g. vendor auth
+    TRACE_SERVICE_NAME: str = "pheona-backend"
 
     # --- Paths ---
     PHEONA_REPO_ROOT: str = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
     PHEONA_TEMPLATES_DIR: str = os.path.join(PHEONA_REPO_ROOT, "templates")
     PHEONA_PROMPTS_DIR: str = os.path.join(PHEONA_REPO_ROOT, "prompts")
+    # mtime polling interval for template/prompt hot reload; 0 disables
+    PHEONA_TEMPLATES_RELOAD_SECONDS: float = 5.0
 
     @property
     def allowed_origins(self) -> List[str]:
@@ -0,0 +1,101 @@
+# backend-api/app/idempotency.py
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import secrets
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+from redis.exceptions import WatchError
+from .config import settings
+from .redis_client import ar
+
+"""
+Idempotency-Key support for POST /v1/agent/create.
+
+  idem:create:{key} → {"state": "pending" | "done", "fp": <body hash>, "owner", "status", "body"}
+
+The first request with a key claims it with SET NX (state "pending", expiring
+after IDEMPOTENCY_LOCK_SECONDS in case the worker dies) and stores the final
+response under the same key for IDEMPOTENCY_TTL_SECONDS. A duplicate that arrives
+while the first is running waits for it (up to IDEMPOTENCY_WAIT_SECONDS); one that
+arrives later gets the stored response replayed. Reusing a key with a different
+body is a conflict. Server errors release the key so the client can retry; the
+release only deletes the caller's own pending claim (WATCH + compare owner), so a
+request whose claim expired can't drop a newer request's claim or stored response.
+
+If Redis is unavailable the request runs without idempotency rather than failing.
+"""
+
+log = logging.getLogger("pheona.idempotency")
+
+MAX_KEY_LENGTH = 255
+
+class IdempotencyConflict(Exception):
+    """The key was used before with a different request body."""
+
+class IdempotencyInProgress(Exception):
+    """The original request is still running after the wait budget."""
+
+def _key(idempotency_key: str) -> str:
+    return f"idem:create:{idempotency_key}"
+
+def fingerprint(body: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+async def begin(idempotency_key: str, fp: str) -> Union[str, Tuple[int, str]]:
+    """
+    str → the caller owns the key (the value is its owner token) and must finish() or release() it.
+    (status, body) → a stored response to replay.
+    """
+    key = _key(idempotency_key)
+    owner = secrets.token_hex(8)
+    pending = json.dumps({"state": "pending", "fp": fp, "owner": owner, "started": time.time()})
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        if await ar.set(key, pending, nx=True, px=int(settings.IDEMPOTENCY_LOCK_SECONDS * 1000)):
+            return owner
+        raw = await ar.get(key)
+        if raw is None:
+            continue  # released or expired between SET and GET; try to claim it again
+        record = json.loads(raw)
+        if record.get("fp") != fp:
+            raise IdempotencyConflict()
+        if record.get("state") == "done":
+            return int(record["status"]), record["body"]
+        if time.monotonic() >= deadline:
+            raise IdempotencyInProgress()
+        await asyncio.sleep(delay * (0.5 + random.random()))
+        delay = min(delay * 2, 1.0)
+
+async def finish(idempotency_key: str, fp: str, status: int, body: str) -> None:
+    try:
+        await ar.set(
+            _key(idempotency_key),
+            json.dumps({"state": "done", "fp": fp, "status": status, "body": body}),
+            ex=settings.IDEMPOTENCY_TTL_SECONDS,
+        )
+    except Exception as e:
+        # The agent exists; a retry with this key would create another one
+        log.error("Storing idempotent response for %s failed: %s", idempotency_key, e)
+
+async def release(idempotency_key: str, owner: str) -> None:
+    """Drops the caller's pending claim; a no-op if the key is someone else's by now."""
+    key = _key(idempotency_key)
+    try:
+        async with ar.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            raw = await pipe.get(key)
+            record = json.loads(raw) if raw else {}
+            if record.get("state") != "pending" or record.get("owner") != owner:
+                return
+            pipe.multi()
+            pipe.delete(key)
+            await pipe.execute()
+    except WatchError:
+        pass  # changed under us, so it is no longer our claim
+    except Exception as e:
+        log.warning("Releasing idempotency key %s failed: %s", idempotency_key, e)
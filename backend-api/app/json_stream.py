@@ -0,0 +1,116 @@
+# backend-api/app/json_stream.py
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+"""
+Incremental parser for a streamed JSON object.
+
+Fed arbitrary chunks of a completion, it returns (field, text) deltas for the
+top-level string values of the requested fields as soon as their characters
+arrive, decoding escapes (including \\uXXXX surrogate pairs split across chunks;
+an unpaired surrogate becomes U+FFFD).
+Anything before the opening brace (e.g. a code fence) is ignored, nested values
+are skipped, and nothing is buffered beyond a pending escape sequence.
+"""
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class JSONFieldStream:
+    def __init__(self, fields: Iterable[str]):
+        self.fields = set(fields)
+        self.values: Dict[str, str] = {f: "" for f in self.fields}
+        self.done = False
+        self._depth = 0
+        self._in_str = False
+        self._esc: Optional[str] = None       # chars after a backslash, until the escape completes
+        self._high: Optional[int] = None      # pending high surrogate from a \\uXXXX pair
+        self._expect_key = True
+        self._role: Optional[str] = None      # "key" | "value" | None (skipped string)
+        self._key_buf: List[str] = []
+        self._key: Optional[str] = None
+        self._out: List[Tuple[str, str]] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        self._out = []
+        for ch in chunk:
+            if self.done:
+                break
+            if self._in_str:
+                self._string_char(ch)
+            else:
+                self._structural(ch)
+        return self._out
+
+    def _structural(self, ch: str) -> None:
+        if ch == '"':
+            if self._depth == 0:
+                return
+            self._in_str = True
+            if self._depth == 1 and self._expect_key:
+                self._role, self._key_buf = "key", []
+            elif self._depth == 1 and self._key in self.fields:
+                self._role = "value"
+            else:
+                self._role = None
+        elif ch in "{[":
+            self._depth += 1
+            if self._depth == 1:
+                self._expect_key = True
+        elif ch in "}]":
+            if self._depth > 0:
+                self._depth -= 1
+                self.done = self._depth == 0
+        elif self._depth == 1 and ch == ":":
+            self._expect_key = False
+        elif self._depth == 1 and ch == ",":
+            self._expect_key, self._key = True, None
+
+    def _string_char(self, ch: str) -> None:
+        if self._esc is not None:
+            self._esc += ch
+            if self._esc[0] == "u":
+                if len(self._esc) < 5:
+                    return
+                self._esc, code = None, int(self._esc[1:], 16)
+                if self._high is not None and 0xDC00 <= code < 0xE000:
+                    code = 0x10000 + ((self._high - 0xD800) << 10) + (code - 0xDC00)
+                    self._high = None
+                    self._emit(chr(code))
+                    return
+                self._drop_high()
+                if 0xD800 <= code < 0xDC00:
+                    self._high = code
+                else:
+                    self._emit("\ufffd" if 0xDC00 <= code < 0xE000 else chr(code))
+            else:
+                self._drop_high()
+                self._esc, decoded = None, _ESCAPES.get(ch, ch)
+                self._emit(decoded)
+        elif ch == "\\":
+            self._esc = ""
+        elif ch == '"':
+            self._drop_high()
+            self._in_str = False
+            if self._role == "key":
+                self._key = "".join(self._key_buf)
+            self._role = None
+        else:
+            self._drop_high()
+            self._emit(ch)
+
+    def _drop_high(self) -> None:
+        # A high surrogate not followed by its low half can't be encoded; keep a marker
+        if self._high is not None:
+            self._high = None
+            self._emit("\ufffd")
+
+    def _emit(self, text: str) -> None:
+        if self._role == "key":
+            self._key_buf.append(text)
+        elif self._role == "value":
+            self.values[self._key] += text
+            # Coalesce consecutive characters of one field into a single delta
+            if self._out and self._out[-1][0] == self._key:
+                self._out[-1] = (self._key, self._out[-1][1] + text)
+            else:
+                self._out.append((self._key, text))
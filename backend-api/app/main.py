@@ -1,11 +1,63 @@
 # backend-api/app/main.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
 from .routes.agents import router as agents_router
+from .routes.templates import router as templates_router
+from .routes.vapi_webhooks import router as vapi_webhooks_router
+from . import agent_cache, metrics, tracing, vapi_client, redis_client, prompt_specializer
+from .templates import registry as template_registry
+from .worker import ProvisioningWorker
 
-app = FastAPI(title="Pheona Backend", version="0.1.0")
+log = logging.getLogger("pheona.main")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Templates and prompts are served from memory; reload on file changes
+    template_registry.load_all()
+    reload_task = None
+    if settings.PHEONA_TEMPLATES_RELOAD_SECONDS > 0:
+        reload_task = asyncio.create_task(template_registry.watch(settings.PHEONA_TEMPLATES_RELOAD_SECONDS))
+    # One pooled Vapi HTTP client for the life of the process
+    await vapi_client.startup()
+    trace_task = asyncio.create_task(tracing.run_exporter()) if tracing.enabled() else None
+    # Serve hot agents from memory; entries are dropped on agent:invalidate
+    try:
+        cache_task = asyncio.create_task(agent_cache.listen(redis_client.get_async_client()))
+    except RuntimeError as e:
+        cache_task = None
+        log.warning("Agent read cache disabled: %s", e)
+    worker_task = None
+    if settings.PROVISIONING_INLINE_WORKER:
+        try:
+            worker = ProvisioningWorker()
+            worker_task = asyncio.create_task(worker.run())
+        except RuntimeError as e:
+            # Redis not configured: the API still serves previews
+            log.warning("Inline provisioning worker disabled: %s", e)
+    try:
+        yield
+    finally:
+        if worker_task is not None:
+            worker.stop()
+            await asyncio.wait([worker_task], timeout=5)
+            worker_task.cancel()
+        if reload_task is not None:
+            reload_task.cancel()
+        if cache_task is not None:
+            cache_task.cancel()
+        if trace_task is not None:
+            trace_task.cancel()
+            await asyncio.gather(trace_task, return_exceptions=True)
+        await vapi_client.shutdown()
+        await prompt_specializer.close_router()
+        await redis_client.close_async_client()
+
+app = FastAPI(title="Pheona Backend", version="0.1.0", lifespan=lifespan)
 
 # CORS: allow localhost in dev, and optionally a regex (e.g., *.streamlit.app) on deploy.
 # FastAPI/Starlette CORS supports allow_origin_regex. :contentReference[oaicite:3]{index=3}
@@ -18,7 +70,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request histograms + Server-Timing on every response; Prometheus scrapes /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+# Outermost, so the request span covers everything else
+app.add_middleware(tracing.TracingMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_route("/metrics", metrics.metrics_endpoint, include_in_schema=False)
+
 app.include_router(agents_router)
+app.include_router(templates_router)
+app.include_router(vapi_webhooks_router)
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=False)
@@ -0,0 +1,178 @@
+# backend-api/app/metrics.py
+from __future__ import annotations
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.responses import Response
+
+"""
+Prometheus metrics and Server-Timing.
+
+Everything is registered on the default registry and exported at GET /metrics
+(the standalone worker serves its own on METRICS_WORKER_PORT). Cache counters are
+read from spec_cache.stats() / agent_cache.stats() at scrape time rather than
+duplicated here.
+
+Server-Timing: MetricsMiddleware opens a per-request accumulator; add_timing()
+(called by the same hooks that feed the histograms, and by stage_timings) sums
+time per name, and the header is attached when the response starts:
+
+  Server-Timing: specialize;dur=812.4, llm;dur=805.1, vapi;dur=231.0, redis;dur=3.2, app;dur=1051.7
+
+Stages that are still running when headers go out (streamed responses, the early
+number reservation) are not included.
+"""
+
+_FAST = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_SLOW = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+TEMPLATE_LOAD = Histogram(
+    "pheona_template_load_seconds", "Reading, hashing and compiling one template and its prompts", buckets=_FAST,
+)
+SPECIALIZE = Histogram(
+    "pheona_specialize_seconds", "One LLM specialization call",
+    ["backend", "model", "mode"], buckets=_SLOW,
+)
+SPECIALIZE_ERRORS = Counter(
+    "pheona_specialize_errors_total", "Failed LLM specialization calls (transport, HTTP or invalid output)",
+    ["backend", "model", "mode"],
+)
+VAPI_REQUEST = Histogram(
+    "pheona_vapi_request_seconds", "Vapi HTTP requests by endpoint",
+    ["method", "endpoint", "status"], buckets=_SLOW,
+)
+VAPI_ERRORS = Counter(
+    "pheona_vapi_errors_total", "Vapi requests that failed (HTTP >= 400 or transport error)",
+    ["method", "endpoint", "kind"],
+)
+POLL_ITERATIONS = Histogram(
+    "pheona_vapi_poll_iterations", "GET /phone-number checks per readiness wait",
+    ["outcome"], buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32),
+)
+AREA_CODE_ATTEMPTS = Histogram(
+    "pheona_area_code_attempts", "POST /phone-number attempts per reservation",
+    ["outcome"], buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15),
+)
+REDIS_OP = Histogram(
+    "pheona_redis_op_seconds", "Redis commands and pipelines (op = command name, PIPELINE or MULTI)",
+    ["op"], buckets=_FAST,
+)
+REDIS_ERRORS = Counter("pheona_redis_errors_total", "Redis commands that raised", ["op"])
+STAGE = Histogram(
+    "pheona_stage_seconds", "Stages of multi-step requests (see stage_timings)",
+    ["flow", "stage"], buckets=_SLOW,
+)
+HTTP_REQUEST = Histogram(
+    "pheona_http_request_seconds", "API requests by route template",
+    ["method", "route", "status"], buckets=_SLOW,
+)
+
+# ---------------- Server-Timing ----------------
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("pheona_server_timing", default=None)
+
+def add_timing(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"app;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+class MetricsMiddleware:
+    """Pure ASGI (so streamed responses pass through untouched): request histogram + Server-Timing."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def _send(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - started)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode("ascii"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _timings.reset(token)
+            route = scope.get("route")
+            HTTP_REQUEST.labels(
+                scope.get("method", ""), getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
+
+# ---------------- hooks ----------------
+
+_ID_SEGMENT = re.compile(r"^/(assistant|phone-number)/[^/]+")
+
+def vapi_endpoint(path: str) -> str:
+    """Path → bounded label: /assistant/abc-123 → /assistant/{id}."""
+    return _ID_SEGMENT.sub(r"/\1/{id}", path.split("?", 1)[0])
+
+def observe_vapi(method: str, path: str, status: Optional[int], seconds: float) -> None:
+    endpoint = vapi_endpoint(path)
+    VAPI_REQUEST.labels(method, endpoint, str(status or "error")).observe(seconds)
+    if status is None or status >= 400:
+        VAPI_ERRORS.labels(method, endpoint, "transport" if status is None else str(status)).inc()
+    add_timing("vapi", seconds)
+
+def observe_specialize(backend: str, model: str, mode: str, seconds: Optional[float]) -> None:
+    """seconds=None records a failure."""
+    if seconds is None:
+        SPECIALIZE_ERRORS.labels(backend, model, mode).inc()
+        return
+    SPECIALIZE.labels(backend, model, mode).observe(seconds)
+    add_timing("llm", seconds)
+
+def observe_redis(op: str, seconds: float, error: bool = False) -> None:
+    REDIS_OP.labels(op).observe(seconds)
+    if error:
+        REDIS_ERRORS.labels(op).inc()
+    add_timing("redis", seconds)
+
+# ---------------- cache counters (read at scrape time) ----------------
+
+class _CacheCollector:
+    def describe(self) -> Iterator[Any]:
+        # Lets register() skip a collect() at import time (the cache modules aren't importable yet)
+        yield CounterMetricFamily("pheona_cache_events", "", labels=["cache", "event"])
+        yield GaugeMetricFamily("pheona_cache_entries", "", labels=["cache"])
+
+    def collect(self) -> Iterator[Any]:
+        from . import agent_cache, spec_cache  # late: both import the Redis client, which imports us
+        events = CounterMetricFamily("pheona_cache_events", "Cache lookups and maintenance events",
+                                     labels=["cache", "event"])
+        sizes = GaugeMetricFamily("pheona_cache_entries", "Entries held in process", labels=["cache"])
+        spec = spec_cache.stats()
+        for event in ("l1_hits", "l2_hits", "misses", "coalesced_local", "coalesced_remote", "redis_errors"):
+            events.add_metric(["specialization", event], spec[event])
+        sizes.add_metric(["specialization"], spec["l1_size"])
+        agents = agent_cache.stats()
+        for event in ("hits", "misses", "invalidations", "stale_fills"):
+            events.add_metric(["agent", event], agents[event])
+        sizes.add_metric(["agent"], agents["size"])
+        yield events
+        yield sizes
+
+REGISTRY.register(_CacheCollector())
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
+
+async def metrics_endpoint(request: Any) -> Response:
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
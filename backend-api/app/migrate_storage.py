@@ -0,0 +1,116 @@
+# backend-api/app/migrate_storage.py
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+from typing import Any, Dict, Optional
+from redis.exceptions import WatchError
+from . import agent_codec
+from .redis_client import get_async_client, close_async_client
+
+"""
+Re-encodes agent:{slug} hashes with the current storage codec and reports bytes saved.
+
+  python -m app.migrate_storage            # migrate legacy records, print a report
+  python -m app.migrate_storage --dry-run  # report only, write nothing
+
+One JSON line per agent ({"slug", "codec", "plain_bytes", "stored_bytes", "saved_bytes"}),
+where plain_bytes is the legacy (uncompressed) layout of the same record, then a
+summary line. Each record is rewritten under WATCH, so a concurrent update wins
+and the record is retried; phoneNumber is never rewritten.
+"""
+
+log = logging.getLogger("pheona.migrate_storage")
+
+_AGENT_KEY = re.compile(r"^agent:[^:]+$")
+
+def _legacy_mapping(record: Dict[str, Any]) -> Dict[str, str]:
+    return {k: json.dumps(v) if k == "payload" else str(v) for k, v in record.items()}
+
+async def _migrate_one(redis: Any, key: str, dry_run: bool, attempts: int = 3) -> Optional[Dict[str, Any]]:
+    for _ in range(attempts):
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                raw = await pipe.hgetall(key)
+                if not raw or "payload" not in raw:
+                    return None
+                record = await agent_codec.decode(raw, redis)
+                plain = agent_codec.encoded_size(_legacy_mapping(record))
+                codec = raw.get("codec", "1")
+                if codec == agent_codec.CODEC_VERSION or dry_run:
+                    stored = agent_codec.encoded_size(
+                        raw if codec == agent_codec.CODEC_VERSION else agent_codec.encode(record)[0]
+                    )
+                else:
+                    mapping, dictionary = agent_codec.encode(record)
+                    stored = agent_codec.encoded_size(mapping)
+                    mapping.pop("phoneNumber", None)
+                    pipe.multi()
+                    agent_codec.ensure_dict_ops(pipe, dictionary)
+                    pipe.hset(key, mapping=mapping)
+                    await pipe.execute()
+                return {
+                    "slug": key.split(":", 1)[1],
+                    "codec": codec,
+                    "plain_bytes": plain,
+                    "stored_bytes": stored,
+                    "saved_bytes": plain - stored,
+                }
+            except WatchError:
+                continue
+    log.warning("Gave up on %s after %d concurrent modifications", key, attempts)
+    return None
+
+async def migrate(dry_run: bool = False, batch: int = 500, out=sys.stdout) -> Dict[str, Any]:
+    redis = get_async_client()
+    totals = {"agents": 0, "migrated": 0, "plain_bytes": 0, "stored_bytes": 0, "dictionaries": set()}
+    async for key in redis.scan_iter(match="agent:*", count=batch, _type="hash"):
+        if not _AGENT_KEY.match(key):
+            continue
+        row = await _migrate_one(redis, key, dry_run)
+        if row is None:
+            continue
+        out.write(json.dumps(row) + "\n")
+        totals["agents"] += 1
+        totals["migrated"] += int(row["codec"] != agent_codec.CODEC_VERSION and not dry_run)
+        totals["plain_bytes"] += row["plain_bytes"]
+        totals["stored_bytes"] += row["stored_bytes"]
+    async for key in redis.scan_iter(match=agent_codec.dict_key("*"), count=batch):
+        totals["dictionaries"].add(key)
+
+    # Dictionaries are shared, so they are counted once in the total
+    dict_bytes = 0
+    for key in totals["dictionaries"]:
+        dict_bytes += await redis.strlen(key)
+    summary = {
+        "summary": True,
+        "dry_run": dry_run,
+        "agents": totals["agents"],
+        "migrated": totals["migrated"],
+        "plain_bytes": totals["plain_bytes"],
+        "stored_bytes": totals["stored_bytes"],
+        "dictionary_bytes": dict_bytes,
+        "saved_bytes": totals["plain_bytes"] - totals["stored_bytes"] - dict_bytes,
+        "avg_saved_per_agent": round((totals["plain_bytes"] - totals["stored_bytes"]) / totals["agents"], 1)
+        if totals["agents"] else 0.0,
+    }
+    out.write(json.dumps(summary) + "\n")
+    return summary
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate agent records to the compressed codec")
+    parser.add_argument("--dry-run", action="store_true", help="report only; do not rewrite records")
+    parser.add_argument("--batch", type=int, default=500, help="SCAN count hint")
+    args = parser.parse_args()
+    try:
+        await migrate(dry_run=args.dry_run, batch=args.batch)
+    finally:
+        await close_async_client()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main())
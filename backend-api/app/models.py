@@ -41,10 +41,25 @@ class PromptPreview(BaseModel):
 class PreviewResponse(BaseModel):
     missing: MissingFieldReport
     preview: Optional[PromptPreview] = None
+    # Pass back to /agent/create to reuse this exact prompt instead of re-running the LLM
+    preview_id: Optional[str] = None
 
 class CreateAgentRequest(AgentBuilderPayload):
     # MVP default: provision a free US number (subject to account limits)
     provision_phone_number: bool = True
+    # Optional handoff from /agent/preview; ignored if expired or the payload changed
+    preview_id: Optional[str] = None
+
+ProvisioningState = Literal["pending", "ready", "failed", "skipped"]
+
+class ProvisioningStatus(BaseModel):
+    status: ProvisioningState
+    phoneNumber: Optional[str] = None
+    phoneNumberId: Optional[str] = None
+    attempts: int = 0
+    retries: int = 0
+    error: Optional[str] = None
+    updated_at: int = 0
 
 class CreateAgentResponse(BaseModel):
     slug: str
@@ -54,6 +69,8 @@ class CreateAgentResponse(BaseModel):
     payload: AgentBuilderPayload
     system_prompt: str
     first_message: str
+    # Phone numbers are provisioned in the background; poll /v1/agent/{slug}/provisioning
+    provisioning: Optional[ProvisioningStatus] = None
 
 class SavedAgent(BaseModel):
     slug: str
@@ -67,5 +84,37 @@ class SavedAgent(BaseModel):
 class LoadAgentResponse(SavedAgent):
     pass
 
+class UpdateAgentResponse(SavedAgent):
+    revision: int = 0
+    changed_fields: List[str] = Field(default_factory=list)
+    respecialized: bool = False       # prompt-relevant fields changed and the prompt was rebuilt
+    assistant_patched: bool = False   # a PATCH was sent to the existing Vapi assistant
+
+class AgentSummary(BaseModel):
+    slug: str
+    agent_name: str
+    business_name: str
+    template_key: str
+    created_at: float                 # epoch seconds
+    phoneNumber: Optional[str] = None
+
+class AgentList(BaseModel):
+    agents: List[AgentSummary]
+    next_cursor: Optional[str] = None
+
 class LoadAgentRequest(BaseModel):
     token: str
+
+class TemplateSummary(BaseModel):
+    key: str
+    name: str
+    industry: Optional[str] = None
+    subcategory: Optional[str] = None
+    use_case: Optional[str] = None
+    version: Optional[Any] = None
+    required_fields: List[str] = Field(default_factory=list)
+    defaults: Dict[str, Any] = Field(default_factory=dict)
+    content_hash: str
+
+class TemplateCatalog(BaseModel):
+    templates: List[TemplateSummary]
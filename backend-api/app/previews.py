@@ -0,0 +1,51 @@
+# backend-api/app/previews.py
+from __future__ import annotations
+import json
+import logging
+import secrets
+from typing import Optional, Tuple
+from .config import settings
+from .redis_client import ar
+
+"""
+Short-lived preview handoff.
+
+/v1/agent/preview stores its result under preview:{id} together with the
+specialization cache key it was produced for. /v1/agent/create can pass that id
+back and reuse the exact previewed prompt, provided the key still matches
+(same payload, template version, base prompt and model).
+"""
+
+log = logging.getLogger("pheona.previews")
+
+def _key(preview_id: str) -> str:
+    return f"preview:{preview_id}"
+
+async def save_preview(cache_key: str, system_prompt: str, first_message: str) -> Optional[str]:
+    preview_id = secrets.token_urlsafe(16)
+    try:
+        await ar.set(
+            _key(preview_id),
+            json.dumps({"key": cache_key, "system_prompt": system_prompt, "first_message": first_message}),
+            ex=settings.PREVIEW_TTL_SECONDS,
+        )
+    except Exception as e:
+        # Preview still works without a handoff id; create will just re-specialize
+        log.warning("Preview persist failed: %s", e)
+        return None
+    return preview_id
+
+async def load_preview(preview_id: str, cache_key: str) -> Optional[Tuple[str, str]]:
+    """Returns (system_prompt, first_message) if the id exists and was made for the same inputs."""
+    try:
+        raw = await ar.get(_key(preview_id))
+    except Exception as e:
+        log.warning("Preview lookup failed: %s", e)
+        return None
+    if not raw:
+        return None
+    obj = json.loads(raw)
+    if obj.get("key") != cache_key:
+        log.info("Preview %s does not match the create payload; re-specializing", preview_id)
+        return None
+    return obj["system_prompt"], obj["first_message"]
@@ -1,18 +1,59 @@
 # backend-api/app/prompt_specializer.py
-from typing import Dict, Any, Tuple, Optional
+import asyncio
+import json as _json
+import time
+from typing import Dict, Any, AsyncIterator, Tuple, Optional, List
 from groq import Groq
+from . import tracing
 from .config import settings
+from .specializer_backends import SpecializerBackend, SpecializerRouter, backends_from_settings
 
 """
 Use Groq Structured Outputs when the model supports JSON Schema.
 If not, fall back to JSON Object mode, which enforces valid JSON syntax.
 
+The async path goes through a SpecializerRouter (see specializer_backends), so the
+request is built per backend: schema vs object mode follows that backend's model.
+
 Docs:
 - Structured Outputs & supported models: https://console.groq.com/docs/structured-outputs
 - API reference (response_format json_schema / json_object): https://console.groq.com/docs/api-reference
 """
 
-client = Groq(api_key=settings.GROQ_API_KEY)
+client = Groq(api_key=settings.GROQ_API_KEY, timeout=settings.GROQ_TIMEOUT_SECONDS)
+
+# Per-worker cap on in-flight specializations (created lazily inside the running loop).
+_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, settings.GROQ_MAX_CONCURRENCY))
+    return _semaphore
+
+_router: Optional[SpecializerRouter] = None
+
+def get_router() -> SpecializerRouter:
+    global _router
+    if _router is None:
+        _router = SpecializerRouter(backends_from_settings())
+    return _router
+
+def set_router(router: Optional[SpecializerRouter]) -> None:
+    """Swap the provider set (bench/fakes); None rebuilds from settings on next use."""
+    global _router
+    _router = router
+
+async def close_router() -> None:
+    global _router
+    if _router is not None:
+        for backend in _router.backends:
+            await backend.aclose()
+        _router = None
+
+def model_fingerprint() -> str:
+    """Cache-key component for whatever can produce the specialization."""
+    return get_router().fingerprint()
 
 # Known models that support response_format={"type":"json_schema"} per Groq docs.
 SUPPORTED_JSON_SCHEMA_MODELS = {
@@ -24,14 +65,18 @@ SUPPORTED_JSON_SCHEMA_MODELS = {
     "meta-llama/llama-4-scout-17b-16e-instruct",
 }
 
-def specialize(
+def _build_request(
     base_system_prompt: str,
     base_first_message: str,
     inputs: Dict[str, Any],
-    meta_instructions: Optional[str] = None
-) -> Tuple[str, str]:
-    model = settings.GROQ_MODEL
-    use_schema = model in SUPPORTED_JSON_SCHEMA_MODELS
+    meta_instructions: Optional[str] = None,
+    model: Optional[str] = None,
+    use_schema: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """Builds the chat.completions kwargs shared by the sync and async paths."""
+    model = model or settings.GROQ_MODEL
+    if use_schema is None:
+        use_schema = model in SUPPORTED_JSON_SCHEMA_MODELS
 
     # Common meta
     meta = meta_instructions or "Return STRICT JSON for the required keys."
@@ -52,7 +97,7 @@ def specialize(
 Return JSON with keys: system_prompt, first_message.
 """
 
-    messages = [
+    messages: List[Dict[str, str]] = [
         {"role": "system", "content": "You return only valid JSON for the requested keys."},
         {"role": "user", "content": meta_prompt},
     ]
@@ -72,12 +117,7 @@ Return JSON with keys: system_prompt, first_message.
             },
             "strict": True,
         }
-        resp = client.chat.completions.create(
-            model=model,
-            response_format={"type": "json_schema", "json_schema": schema},
-            messages=messages,
-            temperature=0.3,
-        )
+        response_format = {"type": "json_schema", "json_schema": schema}
     else:
         # Fallback: JSON Object mode (valid JSON syntax, no schema guarantee)
         # Add explicit instruction to output *only* the two keys we need.
@@ -85,17 +125,88 @@ Return JSON with keys: system_prompt, first_message.
             "You MUST return only a JSON object with keys: system_prompt and first_message. "
             "Do not include code fences or extra text."
         )
-        resp = client.chat.completions.create(
-            model=model,
-            response_format={"type": "json_object"},
-            messages=messages,
-            temperature=0.3,
-        )
+        response_format = {"type": "json_object"}
 
-    content = resp.choices[0].message.content
-    import json as _json
+    return {
+        "model": model,
+        "response_format": response_format,
+        "messages": messages,
+        "temperature": 0.3,
+    }
+
+def _parse_completion(content: str) -> Tuple[str, str]:
     obj = _json.loads(content)
     # Minimal sanity fallback, in case a model adds extra keys.
     system_prompt = obj.get("system_prompt") or ""
     first_message = obj.get("first_message") or ""
     return system_prompt, first_message
+
+def _extract_object(content: str) -> str:
+    # Streaming runs without response_format, so tolerate code fences / stray text around the object
+    start, end = content.find("{"), content.rfind("}")
+    return content[start:end + 1] if start != -1 and end > start else content
+
+def _parse_strict(content: str) -> Tuple[str, str]:
+    # Router path: an empty system prompt is a bad answer, so let another backend try
+    system_prompt, first_message = _parse_completion(content)
+    if not system_prompt:
+        raise ValueError("completion has no system_prompt")
+    return system_prompt, first_message
+
+def specialize(
+    base_system_prompt: str,
+    base_first_message: str,
+    inputs: Dict[str, Any],
+    meta_instructions: Optional[str] = None
+) -> Tuple[str, str]:
+    """Blocking variant, kept for scripts and callers outside the event loop."""
+    kwargs = _build_request(base_system_prompt, base_first_message, inputs, meta_instructions)
+    resp = client.chat.completions.create(**kwargs)
+    return _parse_completion(resp.choices[0].message.content)
+
+async def specialize_async(
+    base_system_prompt: str,
+    base_first_message: str,
+    inputs: Dict[str, Any],
+    meta_instructions: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Non-blocking variant for request handlers. At most GROQ_MAX_CONCURRENCY calls are
+    in flight per worker; further callers wait on the semaphore instead of the event loop.
+    """
+    def build(backend: SpecializerBackend) -> Dict[str, Any]:
+        return _build_request(
+            base_system_prompt, base_first_message, inputs, meta_instructions,
+            model=backend.model, use_schema=backend.json_schema,
+        )
+
+    with tracing.span("specialize", template_fields=len(inputs)) as span:
+        queued = time.perf_counter()
+        async with _get_semaphore():
+            span.set(queue_wait_ms=round((time.perf_counter() - queued) * 1000, 1))
+            return await get_router().run(build, _parse_strict)
+
+async def specialize_stream(
+    base_system_prompt: str,
+    base_first_message: str,
+    inputs: Dict[str, Any],
+    meta_instructions: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant for the SSE preview: yields ("delta", text) chunks of the raw
+    completion, then ("result", (system_prompt, first_message)).
+
+    Groq doesn't stream with response_format set, so this always uses the plain
+    "return only a JSON object" instruction and validates the JSON at the end.
+    """
+    def build(backend: SpecializerBackend) -> Dict[str, Any]:
+        request = _build_request(
+            base_system_prompt, base_first_message, inputs, meta_instructions,
+            model=backend.model, use_schema=False,
+        )
+        request.pop("response_format")
+        return request
+
+    async with _get_semaphore():
+        async for event in get_router().stream(build, lambda text: _parse_strict(_extract_object(text))):
+            yield event
@@ -0,0 +1,241 @@
+# backend-api/app/provisioning.py
+from __future__ import annotations
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+import httpx
+import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+from . import agent_cache, area_codes, readiness, tracing, vapi_client
+from .config import settings
+from .redis_client import get_async_client
+
+"""
+Durable phone-number provisioning.
+
+/agent/create returns as soon as the assistant exists and enqueues a task on a
+Redis stream; workers (app.worker, or the in-app worker in development) drain it.
+Progress lives next to the agent record:
+
+  agent:{slug}:provisioning  → hash {status, phoneNumber, phoneNumberId, reserved_at, attempts, retries, error, updated_at}
+  provisioning:tasks         → stream consumed by the "provisioners" group
+  provisioning:delayed       → zset of retries, scored by the time they become due
+
+status is one of: pending → ready | failed (or skipped when not requested).
+process() is idempotent: it skips finished agents and resumes polling from a stored
+phoneNumberId instead of creating a second number.
+"""
+
+log = logging.getLogger("pheona.provisioning")
+
+PENDING, READY, FAILED, SKIPPED = "pending", "ready", "failed", "skipped"
+
+STREAM = "provisioning:tasks"
+GROUP = "provisioners"
+DELAYED = "provisioning:delayed"
+
+class NumberNotReady(Exception):
+    """The number exists in Vapi but had no E.164 assignment within the poll window."""
+    def __init__(self, phone_number_id: str):
+        super().__init__(f"Number {phone_number_id} not assigned within the poll window")
+        self.phone_number_id = phone_number_id
+
+def state_key(slug: str) -> str:
+    return f"agent:{slug}:provisioning"
+
+def initial_state(status: str = PENDING) -> Dict[str, Any]:
+    return {
+        "status": status,
+        "phoneNumber": "",
+        "phoneNumberId": "",
+        "reserved_at": "",
+        "attempts": 0,
+        "retries": 0,
+        "error": "",
+        "updated_at": int(time.time()),
+    }
+
+async def update_state(slug: str, redis: Optional[aioredis.Redis] = None, **fields: Any) -> None:
+    fields["updated_at"] = int(time.time())
+    await (redis or get_async_client()).hset(
+        state_key(slug), mapping={k: ("" if v is None else v) for k, v in fields.items()}
+    )
+
+async def get_state(slug: str, redis: Optional[aioredis.Redis] = None) -> Optional[Dict[str, Any]]:
+    data = await (redis or get_async_client()).hgetall(state_key(slug))
+    if not data:
+        return None
+    return {
+        "status": data.get("status") or PENDING,
+        "phoneNumber": data.get("phoneNumber") or None,
+        "phoneNumberId": data.get("phoneNumberId") or None,
+        "reserved_at": float(data.get("reserved_at") or 0) or None,
+        "attempts": int(data.get("attempts") or 0),
+        "retries": int(data.get("retries") or 0),
+        "error": data.get("error") or None,
+        "updated_at": int(data.get("updated_at") or 0),
+    }
+
+def queue_ops(pipe: Any, slug: str, assistant_id: str, label: Optional[str] = None,
+              area_code: Optional[str] = None, phone_number_id: Optional[str] = None,
+              reserved_at: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Adds the pending state + stream task to a caller's pipeline; returns the state.
+    With phone_number_id (reserved during create) the worker only waits for it.
+    """
+    state = initial_state(PENDING)
+    if phone_number_id:
+        state.update(phoneNumberId=phone_number_id, reserved_at=f"{reserved_at or time.time():.3f}", attempts=1)
+    task = {"slug": slug, "assistant_id": assistant_id, "label": label or "", "area_code": area_code or "", "retry": 0,
+            "traceparent": tracing.current_traceparent() or ""}
+    pipe.hset(state_key(slug), mapping=state)
+    pipe.xadd(STREAM, task)
+    return state
+
+async def enqueue(slug: str, assistant_id: str, label: Optional[str] = None,
+                  area_code: Optional[str] = None,
+                  redis: Optional[aioredis.Redis] = None) -> Dict[str, Any]:
+    """Writes the pending state and the stream task in one round trip; returns the state."""
+    pipe = (redis or get_async_client()).pipeline(transaction=True)
+    state = queue_ops(pipe, slug, assistant_id, label, area_code)
+    await pipe.execute()
+    return state
+
+async def schedule_retry(task: Dict[str, Any], delay: float, redis: Optional[aioredis.Redis] = None) -> None:
+    await (redis or get_async_client()).zadd(DELAYED, {json.dumps(task, sort_keys=True): time.time() + delay})
+
+async def promote_due(redis: Optional[aioredis.Redis] = None, limit: int = 100) -> int:
+    """
+    Moves due retries back onto the stream. ZREM and XADD commit in one MULTI, so a
+    crash between them can't drop a task; WATCH makes sure only one worker moves each.
+    """
+    redis = redis or get_async_client()
+    moved = 0
+    for member in await redis.zrangebyscore(DELAYED, "-inf", time.time(), start=0, num=limit):
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(DELAYED)
+                if await pipe.zscore(DELAYED, member) is None:
+                    continue  # another worker already moved it
+                pipe.multi()
+                pipe.zrem(DELAYED, member)
+                pipe.xadd(STREAM, json.loads(member))
+                await pipe.execute()
+                moved += 1
+            except WatchError:
+                continue  # the zset changed under us; the next pass picks the task up
+    return moved
+
+async def mark_ready(slug: str, number: str, phone_number_id: str, redis: Optional[aioredis.Redis] = None) -> None:
+    pipe = (redis or get_async_client()).pipeline(transaction=True)
+    pipe.hset(f"agent:{slug}", "phoneNumber", number)
+    pipe.hset(state_key(slug), mapping={
+        "status": READY, "phoneNumber": number, "phoneNumberId": phone_number_id,
+        "error": "", "updated_at": int(time.time()),
+    })
+    agent_cache.invalidate_ops(pipe, slug)
+    await pipe.execute()
+    log.info("Provisioned %s for agent %s", number, slug)
+
+async def fail(slug: str, error: str, redis: Optional[aioredis.Redis] = None) -> None:
+    """Terminal failure: delete any dangling Vapi stub so the org stays clean."""
+    state = await get_state(slug, redis) or {}
+    phone_id = state.get("phoneNumberId")
+    if phone_id:
+        try:
+            await vapi_client._delete_phone_number(phone_id)
+            log.warning("Deleted unprovisioned Vapi number id=%s for %s", phone_id, slug)
+        except Exception as e:
+            log.error("Failed to delete unprovisioned number id=%s: %s", phone_id, e)
+    await update_state(slug, redis, status=FAILED, error=error[:500])
+
+async def reserve_unattached(label: Optional[str] = None, area_code: Optional[str] = None,
+                             redis: Optional[aioredis.Redis] = None) -> Dict[str, Any]:
+    """
+    Reserves a number before its assistant exists (create overlaps this with
+    specialization); attach it with vapi_client.attach_phone_number.
+    """
+    redis = redis or get_async_client()
+
+    async def _area_code(code: str, ok: bool, hints: List[str]) -> None:
+        await area_codes.record_attempt(code, ok, hints, redis)
+
+    codes = await area_codes.ordered((area_code, settings.VAPI_DEFAULT_AREACODE), redis=redis)
+    created = await vapi_client.reserve_phone_number(None, label, seed_area_codes=codes, on_area_code=_area_code)
+    if not created.get("id"):
+        raise RuntimeError("Vapi returned no phone-number id")
+    return created
+
+async def discard_number(phone_number_id: str) -> None:
+    """Compensation for a number reserved by a create that did not complete."""
+    try:
+        await vapi_client._delete_phone_number(phone_number_id)
+        log.warning("Deleted orphaned Vapi number id=%s", phone_number_id)
+    except Exception as e:
+        log.error("Failed to delete orphaned number id=%s: %s", phone_number_id, e)
+
+async def process(task: Dict[str, Any], redis: Optional[aioredis.Redis] = None) -> None:
+    """
+    Runs one provisioning task to completion. Raises on retryable problems
+    (Vapi errors, NumberNotReady); the worker decides whether to retry or fail.
+    """
+    redis = redis or get_async_client()
+    slug = task["slug"]
+    state = await get_state(slug, redis) or {}
+    if state.get("status") in (READY, FAILED, SKIPPED):
+        return
+
+    phone_id = state.get("phoneNumberId")
+    reserved_at = state.get("reserved_at") or time.time()
+    pn: Optional[Dict[str, Any]] = None
+
+    if phone_id:
+        # Resume: a previous run already created the number, just keep waiting for it
+        try:
+            pn = await _wait(phone_id, reserved_at, redis)
+        except httpx.HTTPStatusError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            log.warning("Stored number id=%s for %s no longer exists; creating a new one", phone_id, slug)
+            phone_id = None
+            await update_state(slug, redis, phoneNumberId="", reserved_at="")
+
+    if not phone_id:
+        async def _progress(attempts: int, phone_number_id: Optional[str]) -> None:
+            fields: Dict[str, Any] = {"attempts": attempts, "phoneNumberId": phone_number_id or ""}
+            if phone_number_id:
+                fields["reserved_at"] = f"{time.time():.3f}"
+            await update_state(slug, redis, **fields)
+
+        async def _area_code(code: str, ok: bool, hints: List[str]) -> None:
+            await area_codes.record_attempt(code, ok, hints, redis)
+
+        # Caller's area code first, then codes ordered by recent success probability
+        codes = await area_codes.ordered((task.get("area_code"), settings.VAPI_DEFAULT_AREACODE), redis=redis)
+        created = await vapi_client.reserve_phone_number(
+            task["assistant_id"], task.get("label") or None,
+            seed_area_codes=codes, on_progress=_progress, on_area_code=_area_code,
+        )
+        phone_id = created.get("id")
+        if not phone_id:
+            raise RuntimeError("Vapi returned no phone-number id")
+        reserved_at = time.time()
+        # Early exit: sometimes the number is assigned in the create response already
+        pn = created if vapi_client.phone_number_e164(created) else await _wait(phone_id, reserved_at, redis)
+
+    if pn is None:
+        raise NumberNotReady(phone_id)
+    await readiness.record_time_to_ready(time.time() - reserved_at, redis)
+    await mark_ready(slug, vapi_client.phone_number_e164(pn), phone_id, redis)
+
+async def _wait(phone_id: str, reserved_at: float, redis: aioredis.Redis) -> Optional[Dict[str, Any]]:
+    """Adaptive poll of one number, woken early by webhook pushes."""
+    schedule = await readiness.schedule(max(0.0, time.time() - reserved_at), redis)
+    async with readiness.Waiter(phone_id, redis) as waiter:
+        return await vapi_client.wait_for_phone_number(
+            phone_id,
+            poll_timeout=settings.PROVISIONING_POLL_TIMEOUT_SECONDS,
+            schedule=schedule,
+            sleep=waiter.sleep,
+        )
@@ -0,0 +1,208 @@
+# backend-api/app/readiness.py
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+import redis.asyncio as aioredis
+from .config import settings
+from .redis_client import get_async_client
+
+"""
+When to poll GET /phone-number/{id} while waiting for an E.164 assignment.
+
+- Schedule: quick first checks, then exponential backoff with jitter, capped at
+  PROVISIONING_POLL_MAX_INTERVAL_SECONDS. With enough history, the first check is
+  pushed out to the observed p25 time-to-ready so we don't spend calls on numbers
+  that are almost never ready that early.
+- History: time-to-ready samples live in provisioning:ttr (capped list).
+- Push: POST /v1/vapi/webhook publishes on provisioning:ready:{id}; one pattern
+  subscription per process fans the message out to that number's Waiter, which
+  cuts the current sleep short so we check immediately.
+"""
+
+log = logging.getLogger("pheona.readiness")
+
+TTR_KEY = "provisioning:ttr"
+TTR_SAMPLES = 500
+MIN_SAMPLES = 20
+
+def channel(phone_number_id: str) -> str:
+    return f"provisioning:ready:{phone_number_id}"
+
+def backoff_schedule(first: float, initial: float, factor: float, cap: float) -> Iterator[float]:
+    """first, then initial·factor^n with equal jitter, never above cap. Infinite; callers bound it by time."""
+    yield first
+    delay = initial
+    while True:
+        d = min(cap, delay)
+        yield d / 2 + random.uniform(0, d / 2)
+        delay *= factor
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+_learned: dict = {"at": 0.0, "p25": None}
+
+async def learned_p25(redis: Optional[aioredis.Redis] = None) -> Optional[float]:
+    """p25 of recent time-to-ready, refreshed at most once a minute per process."""
+    if not settings.PROVISIONING_POLL_LEARN:
+        return None
+    now = time.monotonic()
+    if now - _learned["at"] < 60:
+        return _learned["p25"]
+    _learned["at"] = now
+    try:
+        raw = await (redis or get_async_client()).lrange(TTR_KEY, 0, TTR_SAMPLES - 1)
+    except Exception as e:
+        log.warning("Could not read time-to-ready samples: %s", e)
+        return _learned["p25"]
+    vals = sorted(float(v) for v in raw)
+    _learned["p25"] = _percentile(vals, 0.25) if len(vals) >= MIN_SAMPLES else None
+    return _learned["p25"]
+
+async def schedule(elapsed: float = 0.0, redis: Optional[aioredis.Redis] = None) -> Iterator[float]:
+    """Poll delays for a number that was reserved `elapsed` seconds ago."""
+    first = settings.PROVISIONING_POLL_INITIAL_SECONDS
+    p25 = await learned_p25(redis)
+    if p25 is not None:
+        first = max(first, p25 - elapsed)
+    return backoff_schedule(
+        first,
+        settings.PROVISIONING_POLL_INITIAL_SECONDS,
+        settings.PROVISIONING_POLL_BACKOFF,
+        settings.PROVISIONING_POLL_MAX_INTERVAL_SECONDS,
+    )
+
+async def record_time_to_ready(seconds: float, redis: Optional[aioredis.Redis] = None) -> None:
+    pipe = (redis or get_async_client()).pipeline(transaction=False)
+    pipe.lpush(TTR_KEY, f"{seconds:.3f}")
+    pipe.ltrim(TTR_KEY, 0, TTR_SAMPLES - 1)
+    await pipe.execute()
+
+async def notify_ready(phone_number_id: str, redis: Optional[aioredis.Redis] = None) -> int:
+    """Wakes any worker waiting on this number. Returns the number of subscribers reached."""
+    return await (redis or get_async_client()).publish(channel(phone_number_id), "1")
+
+class _Dispatcher:
+    """
+    One PSUBSCRIBE on provisioning:ready:* per Redis client, shared by every Waiter
+    in the process, so concurrent waits hold one pooled connection instead of one
+    each. Opened with the first waiter and closed after the last.
+    """
+    def __init__(self, redis: aioredis.Redis):
+        self.redis = redis
+        self.waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def add(self, phone_number_id: str, event: asyncio.Event) -> "_Dispatcher":
+        """Returns the dispatcher that now holds the event; discard() must go to that one."""
+        async with self._lock:
+            current = _dispatchers.setdefault(self.redis, self)
+            if current is self:
+                if self._task is None or self._task.done():
+                    await self._start()
+                self.waiters.setdefault(phone_number_id, set()).add(event)
+                return self
+        # Stopped and replaced while we queued for the lock
+        return await current.add(phone_number_id, event)
+
+    async def discard(self, phone_number_id: str, event: asyncio.Event) -> None:
+        async with self._lock:
+            events = self.waiters.get(phone_number_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self.waiters[phone_number_id]
+            if not self.waiters:
+                await self._stop()
+
+    async def _start(self) -> None:
+        await self._close()
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.psubscribe(channel("*"))
+        except Exception:
+            await pubsub.aclose()
+            raise
+        self._pubsub = pubsub
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _stop(self) -> None:
+        # Unregister before the first await, so a Waiter arriving while we tear down
+        # opens a fresh dispatcher rather than restarting this one behind the registry
+        if _dispatchers.get(self.redis) is self:
+            del _dispatchers[self.redis]
+        await self._close()
+
+    async def _close(self) -> None:
+        # Clearing _pubsub also ends the listener on its next poll, should the cancel
+        # be swallowed by a read that completed at the same moment
+        pubsub, self._pubsub = self._pubsub, None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if pubsub is not None:
+            try:
+                await pubsub.punsubscribe()
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+    async def _listen(self, pubsub: Any) -> None:
+        prefix = channel("")
+        try:
+            while self._pubsub is pubsub:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if msg is None:
+                    continue
+                for event in self.waiters.get(str(msg["channel"])[len(prefix):], ()):
+                    event.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Waiters fall back to their poll schedule; the next add() resubscribes
+            log.warning("Readiness push listener stopped: %s", e)
+
+_dispatchers: Dict[aioredis.Redis, _Dispatcher] = {}
+
+class Waiter:
+    """
+    Registers one number with the process-wide readiness dispatcher; sleep() returns
+    early (True) when a push arrives. Falls back to a plain sleep if pub/sub fails.
+    """
+    def __init__(self, phone_number_id: str, redis: Optional[aioredis.Redis] = None):
+        self.phone_number_id = phone_number_id
+        self.redis = redis or get_async_client()
+        self._event = asyncio.Event()
+        self._dispatcher: Optional[_Dispatcher] = None
+
+    async def __aenter__(self) -> "Waiter":
+        dispatcher = _dispatchers.get(self.redis)
+        if dispatcher is None:
+            dispatcher = _dispatchers[self.redis] = _Dispatcher(self.redis)
+        try:
+            self._dispatcher = await dispatcher.add(self.phone_number_id, self._event)
+        except Exception as e:
+            log.warning("Readiness push disabled for %s: %s", self.phone_number_id, e)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._dispatcher is not None:
+            await self._dispatcher.discard(self.phone_number_id, self._event)
+
+    async def sleep(self, delay: float) -> bool:
+        if self._dispatcher is None:
+            await asyncio.sleep(delay)
+            return False
+        try:
+            await asyncio.wait_for(self._event.wait(), delay)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
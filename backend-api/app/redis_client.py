@@ -1,8 +1,12 @@
 # backend-api/app/redis_client.py
 from __future__ import annotations
 import os
+import time
 import redis
-from typing import Optional
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from typing import Any, List, Optional
+from . import metrics, tracing
 from .config import settings
 
 """
@@ -10,9 +14,13 @@ Lazy Redis client that supports:
 - REDIS_URL (redis://... or rediss://...)
 - OR REDIS_HOST/REDIS_PORT/REDIS_PASSWORD (+ optional REDIS_TLS=1 to enable TLS)
 No connection is attempted at import time.
+
+The asyncio client times every command and pipeline into pheona_redis_op_seconds
+and a trace span.
 """
 
 _client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
 
 def _bool_env(val: Optional[bool | str]) -> bool:
     if isinstance(val, bool):
@@ -21,35 +29,113 @@ def _bool_env(val: Optional[bool | str]) -> bool:
         return False
     return str(val).strip().lower() in ("1", "true", "yes", "y", "on")
 
-def get_client() -> redis.Redis:
-    global _client
-    if _client is not None:
-        return _client
-
+def _connection_kwargs() -> dict:
+    """Shared connection settings for the sync and asyncio clients."""
     if settings.REDIS_URL:
-        # from_url will handle redis:// vs rediss:// automatically
-        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
-        return _client
+        return {"url": settings.REDIS_URL}
 
     if not (settings.REDIS_HOST and settings.REDIS_PORT and settings.REDIS_PASSWORD):
         raise RuntimeError(
             "Redis is not configured. Set REDIS_URL or REDIS_HOST/REDIS_PORT/REDIS_PASSWORD."
         )
 
-    use_tls = _bool_env(settings.REDIS_TLS)
-    _client = redis.Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        username=settings.REDIS_USERNAME or "default",
-        password=settings.REDIS_PASSWORD,
-        decode_responses=True,
-        ssl=use_tls,            # redis-py supports ssl=... for TLS connections
-    )
+    return {
+        "host": settings.REDIS_HOST,
+        "port": settings.REDIS_PORT,
+        "username": settings.REDIS_USERNAME or "default",
+        "password": settings.REDIS_PASSWORD,
+        "ssl": _bool_env(settings.REDIS_TLS),  # redis-py supports ssl=... for TLS connections
+    }
+
+def get_client() -> redis.Redis:
+    global _client
+    if _client is not None:
+        return _client
+
+    kwargs = _connection_kwargs()
+    if "url" in kwargs:
+        # from_url will handle redis:// vs rediss:// automatically
+        _client = redis.Redis.from_url(kwargs["url"], **_pool_kwargs())
+    else:
+        _client = redis.Redis(**kwargs, **_pool_kwargs())
     return _client
 
+def _pool_kwargs() -> dict:
+    return {
+        "decode_responses": True,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    }
+
+class _TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        op = "MULTI" if self.is_transaction else "PIPELINE"
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"redis {op}", tracing.CLIENT, commands=len(self.command_stack)):
+                result = await super().execute(raise_on_error)
+        except Exception:
+            metrics.observe_redis(op, time.perf_counter() - started, error=True)
+            raise
+        metrics.observe_redis(op, time.perf_counter() - started)
+        return result
+
+class _TimedRedis(aioredis.Redis):
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        op = str(args[0]).upper() if args else "?"
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"redis {op}", tracing.CLIENT):
+                result = await super().execute_command(*args, **options)
+        except Exception:
+            metrics.observe_redis(op, time.perf_counter() - started, error=True)
+            raise
+        metrics.observe_redis(op, time.perf_counter() - started)
+        return result
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return _TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+def get_async_client() -> aioredis.Redis:
+    """
+    asyncio client used on the event loop (routes, provisioning worker). Backed by a
+    blocking pool: when all REDIS_MAX_CONNECTIONS are busy, callers wait up to
+    REDIS_POOL_TIMEOUT for a free connection instead of failing.
+    """
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+
+    kwargs = _connection_kwargs()
+    pool_kwargs = {**_pool_kwargs(), "timeout": settings.REDIS_POOL_TIMEOUT}
+    if "url" in kwargs:
+        pool = aioredis.BlockingConnectionPool.from_url(kwargs["url"], **pool_kwargs)
+    else:
+        if kwargs.pop("ssl"):
+            pool_kwargs["connection_class"] = aioredis.SSLConnection
+        pool = aioredis.BlockingConnectionPool(**kwargs, **pool_kwargs)
+    _async_client = _TimedRedis(connection_pool=pool)
+    return _async_client
+
+async def close_async_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        # The client doesn't own an explicitly passed pool; release its sockets too
+        await _async_client.connection_pool.disconnect()
+        _async_client = None
+
 class _RedisProxy:
     def __getattr__(self, name):
         return getattr(get_client(), name)
 
-# Export a proxy that lazily resolves the client
+class _AsyncRedisProxy:
+    def __getattr__(self, name):
+        return getattr(get_async_client(), name)
+
+# Export proxies that lazily resolve the clients.
+# `r` (sync) is kept for scripts and backwards compatibility; async code should use `ar`.
 r = _RedisProxy()
+ar = _AsyncRedisProxy()
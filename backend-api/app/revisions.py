@@ -0,0 +1,72 @@
+# backend-api/app/revisions.py
+from __future__ import annotations
+import difflib
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+"""
+Compact reverse diffs for agent revisions.
+
+The agent hash always holds the current version in full. Each update appends one
+revision that records how to get back to the previous version:
+
+  {"rev": 3, "at": 1700000000.0,
+   "payload": {"timezone": "America/Chicago"},               # previous values of changed fields
+   "system_prompt": [[12, 14, ["old line\\n", ...]], ...],    # line ops to apply to the new text
+   "first_message": [[0, 1, ["Hi, old greeting"]]]}
+
+Unchanged prompt fields are omitted, so payload-only edits cost a few bytes.
+"""
+
+_MISSING = "__missing__"
+
+Delta = List[List[Any]]   # [[start, end, replacement_lines], ...] against the new text's lines
+
+def text_delta(old: str, new: str) -> Delta:
+    """Ops that turn `new` back into `old`, by line."""
+    a, b = new.splitlines(keepends=True), old.splitlines(keepends=True)
+    ops: Delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag != "equal":
+            ops.append([i1, i2, b[j1:j2]])
+    return ops
+
+def apply_delta(new: str, delta: Delta) -> str:
+    lines = new.splitlines(keepends=True)
+    # Apply from the end so earlier offsets stay valid
+    for start, end, replacement in sorted(delta, key=lambda op: op[0], reverse=True):
+        lines[start:end] = replacement
+    return "".join(lines)
+
+def payload_changes(old: Dict[str, Any], new: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Previous values of the fields that differ (absent ones as a sentinel)."""
+    return {f: old.get(f, _MISSING) for f in fields if old.get(f, _MISSING) != new.get(f, _MISSING)}
+
+def make_revision(
+    rev: int,
+    payload_before: Dict[str, Any],
+    prompts_before: Optional[Tuple[str, str]] = None,
+    prompts_after: Optional[Tuple[str, str]] = None,
+) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"rev": rev, "at": round(time.time(), 3), "payload": payload_before}
+    if prompts_before is not None and prompts_after is not None:
+        for name, old, new in zip(("system_prompt", "first_message"), prompts_before, prompts_after):
+            if old != new:
+                entry[name] = text_delta(old, new)
+    return entry
+
+def revert(current: Dict[str, Any], revision: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuilds the version before `revision` from `current`
+    ({"payload": {...}, "system_prompt": str, "first_message": str}).
+    """
+    payload = dict(current["payload"])
+    for f, v in revision.get("payload", {}).items():
+        if v == _MISSING:
+            payload.pop(f, None)
+        else:
+            payload[f] = v
+    out = {"payload": payload}
+    for name in ("system_prompt", "first_message"):
+        out[name] = apply_delta(current[name], revision[name]) if name in revision else current[name]
+    return out
@@ -1,20 +1,29 @@
 # backend-api/app/routes/agents.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from ..auth import require_api_key
 from ..models import (
     AgentBuilderPayload, PreviewResponse, MissingFieldReport,
     PromptPreview, CreateAgentRequest, CreateAgentResponse,
-    LoadAgentResponse, SavedAgent
+    LoadAgentResponse, ProvisioningStatus, UpdateAgentResponse, AgentList
 )
-from ..templates import load_template, load_prompt_text, check_required
-from ..prompt_specializer import specialize
-from .. import vapi_client
-from ..redis_client import r
-from ..utils import slugify, short_id, new_edit_token
+from ..templates import load_template, load_prompt_text, check_required, registry as template_registry
+from ..prompt_specializer import specialize_async, specialize_stream, get_router, model_fingerprint
+from ..json_stream import JSONFieldStream
+from .. import spec_cache, previews, idempotency, stage_timings, tracing
+from .. import vapi_client, provisioning, area_codes, agent_store, agent_cache, agent_index, revisions
+from ..redis_client import ar
+from ..utils import slugify, short_id, new_edit_token, etag_matches
 from ..config import settings
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import contextlib
+import hmac
 import json
 import httpx
 import logging
+import time
 import redis as redis_lib
 
 log = logging.getLogger("pheona.routes.agents")
@@ -25,12 +34,82 @@ async def health():
     ok = True
     try:
         # Try lightweight Redis ping (won't error if Redis is disabled/missing env)
-        r.ping()
+        await ar.ping()
         redis_ok = True
     except Exception:
         redis_ok = False
     return {"ok": ok, "service": "pheona-backend", "env": settings.ENV, "redis": redis_ok}
 
+@router.get("/cache/stats", dependencies=[Depends(require_api_key)])
+async def cache_stats():
+    return {"specialization": spec_cache.stats(), "agents": agent_cache.stats()}
+
+@router.get("/stats/specializers", dependencies=[Depends(require_api_key)])
+async def specializer_stats():
+    router_ = get_router()
+    return {"hedge_after_ms": int(router_.hedge_after * 1000), "backends": router_.snapshot()}
+
+@router.get("/stats/stages", dependencies=[Depends(require_api_key)])
+async def stage_stats():
+    return stage_timings.snapshot()
+
+@router.get("/stats/tracing", dependencies=[Depends(require_api_key)])
+async def tracing_stats():
+    return tracing.stats()
+
+@router.get("/stats/area-codes", dependencies=[Depends(require_api_key)])
+async def area_code_stats(limit: int = Query(20, ge=1, le=200)):
+    return await area_codes.stats(limit)
+
+def _builder_payload(body: AgentBuilderPayload) -> AgentBuilderPayload:
+    # Project request subclasses (e.g. CreateAgentRequest) onto the prompt-relevant fields only,
+    # so preview and create share cache entries for the same inputs.
+    return AgentBuilderPayload.model_validate(body.model_dump(include=set(AgentBuilderPayload.model_fields)))
+
+def _fast_render(body: AgentBuilderPayload) -> Optional[Tuple[str, str]]:
+    """Slot templates render locally (no LLM, no cache) unless free-form instructions need the model."""
+    slots = template_registry.slots(body.template_key)
+    if slots is None:
+        return None
+    values = _builder_payload(body).model_dump(mode="json")
+    if slots.needs_llm(values):
+        return None
+    return slots.render(values)
+
+def _specialization_inputs(template: Dict[str, Any], body: AgentBuilderPayload) -> Tuple[AgentBuilderPayload, str, str, Optional[str], str]:
+    payload = _builder_payload(body)
+    meta_instr = load_prompt_text(template["prompt_specialization_instructions_path"]) \
+        if template.get("prompt_specialization_instructions_path") else None
+
+    slots = template_registry.slots(payload.template_key)
+    if slots is not None:
+        # The LLM refines the deterministic rendering instead of the raw base prompt
+        base_system, base_first = slots.render(payload.model_dump(mode="json"))
+    else:
+        base_system = load_prompt_text(template["system_prompt_base_path"])
+        base_first = f"Hi, this is {payload.agent_name} with {payload.business_name}. How can I help today?"
+    key = spec_cache.make_key(
+        payload, base_system, base_first, meta_instr, template.get("version"),
+        model=model_fingerprint(),
+        template_hash=template_registry.content_hash(payload.template_key),
+    )
+    return payload, base_system, base_first, meta_instr, key
+
+async def _specialize_for(template: Dict[str, Any], body: AgentBuilderPayload, preview_id: Optional[str] = None) -> Tuple[str, str, Optional[str]]:
+    """Returns (system_prompt, first_message, cache_key); the key is None for a local render."""
+    rendered = _fast_render(body)
+    if rendered is not None:
+        return rendered[0], rendered[1], None
+    payload, base_system, base_first, meta_instr, key = _specialization_inputs(template, body)
+    if preview_id:
+        previewed = await previews.load_preview(preview_id, key)
+        if previewed is not None:
+            return previewed[0], previewed[1], key
+    system_prompt, first_message = await spec_cache.get_or_specialize(
+        key, lambda: specialize_async(base_system, base_first, payload.model_dump(), meta_instr)
+    )
+    return system_prompt, first_message, key
+
 @router.post("/agent/preview", response_model=PreviewResponse, dependencies=[Depends(require_api_key)])
 async def agent_preview(payload: AgentBuilderPayload):
     template = load_template(payload.template_key)
@@ -38,104 +117,523 @@ async def agent_preview(payload: AgentBuilderPayload):
     if missing:
         return PreviewResponse(missing=MissingFieldReport(missing_fields=missing), preview=None)
 
-    base_system = load_prompt_text(template["system_prompt_base_path"])
-    meta_instr = load_prompt_text(template["prompt_specialization_instructions_path"]) \
-        if template.get("prompt_specialization_instructions_path") else None
-
-    base_first = f"Hi, this is {payload.agent_name} with {payload.business_name}. How can I help today?"
-    system_prompt, first_message = specialize(base_system, base_first, payload.model_dump(), meta_instr)
+    system_prompt, first_message, key = await _specialize_for(template, payload)
 
     return PreviewResponse(
         missing=MissingFieldReport(missing_fields=[]),
-        preview=PromptPreview(system_prompt=system_prompt, first_message=first_message)
+        preview=PromptPreview(system_prompt=system_prompt, first_message=first_message),
+        # Local renders are instant to redo, so there's nothing to hand off
+        preview_id=await previews.save_preview(key, system_prompt, first_message) if key else None,
     )
 
-@router.post("/agent/create", response_model=CreateAgentResponse, dependencies=[Depends(require_api_key)])
-async def agent_create(body: CreateAgentRequest):
-    template = load_template(body.template_key)
-    missing = check_required(template, body.model_dump())
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _preview_events(template: Dict[str, Any], body: AgentBuilderPayload, missing: List[str]) -> AsyncIterator[str]:
     if missing:
-        raise HTTPException(status_code=422, detail={"missing_fields": missing})
+        yield _sse("done", PreviewResponse(missing=MissingFieldReport(missing_fields=missing)).model_dump(mode="json"))
+        return
 
-    base_system = load_prompt_text(template["system_prompt_base_path"])
-    meta_instr = load_prompt_text(template["prompt_specialization_instructions_path"]) \
-        if template.get("prompt_specialization_instructions_path") else None
+    key: Optional[str] = None
+    streamed = False
+    ready = _fast_render(body)
+    if ready is None:
+        payload, base_system, base_first, meta_instr, key = _specialization_inputs(template, body)
+        parser = JSONFieldStream(("system_prompt", "first_message"))
+        try:
+            # Cache hits and joined flights come back as a single result with no deltas
+            async for kind, value in spec_cache.stream_or_join(
+                key, lambda: specialize_stream(base_system, base_first, payload.model_dump(), meta_instr)
+            ):
+                if kind == "delta":
+                    streamed = True
+                    for field, text in parser.feed(value):
+                        yield _sse("delta", {"field": field, "text": text})
+                else:
+                    ready = value
+        except Exception as e:
+            log.error("Streaming preview failed: %s", e)
+            yield _sse("error", {"detail": "specialization_failed"})
+            return
+    system_prompt, first_message = ready
+    if not streamed:
+        for field, text in (("system_prompt", system_prompt), ("first_message", first_message)):
+            yield _sse("delta", {"field": field, "text": text})
 
-    base_first = f"Hi, this is {body.agent_name} with {body.business_name}. How can I help today?"
-    system_prompt, first_message = specialize(base_system, base_first, body.model_dump(), meta_instr)
+    yield _sse("done", PreviewResponse(
+        missing=MissingFieldReport(missing_fields=[]),
+        preview=PromptPreview(system_prompt=system_prompt, first_message=first_message),
+        preview_id=await previews.save_preview(key, system_prompt, first_message) if key else None,
+    ).model_dump(mode="json"))
+
+@router.post("/agent/preview/stream", dependencies=[Depends(require_api_key)])
+async def agent_preview_stream(payload: AgentBuilderPayload):
+    """
+    Server-Sent Events variant of /agent/preview:
+      event: delta  {"field": "system_prompt" | "first_message", "text": "..."}  as generated
+      event: done   PreviewResponse (validated preview + preview_id, or the missing fields)
+      event: error  {"detail": "..."}
+    """
+    template = load_template(payload.template_key)
+    missing = check_required(template, payload.model_dump())
+    return StreamingResponse(
+        _preview_events(template, payload, missing),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Cleanup tasks that outlive their request (orphaned early numbers)
+_background: set = set()
 
-    # Create Vapi assistant
+def _spawn(coro: Any) -> None:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+async def _reserve_number(label: str, area_code: Optional[str], stages: stage_timings.Stages) -> Dict[str, Any]:
+    with stages.stage("number_reserve"):
+        return await provisioning.reserve_unattached(label, area_code)
+
+def _discard_when_done(task: "asyncio.Task[Dict[str, Any]]") -> None:
+    """Compensation for an early reservation nobody will use, whenever it finishes."""
+    def _done(t: "asyncio.Task[Dict[str, Any]]") -> None:
+        if not t.cancelled() and t.exception() is None:
+            _spawn(provisioning.discard_number(t.result()["id"]))
+    task.add_done_callback(_done)
+
+async def _attach_number(task: "asyncio.Task[Dict[str, Any]]", assistant_id: str,
+                         stages: stage_timings.Stages) -> Optional[Tuple[str, float]]:
+    """
+    (phone_number_id, reserved_at) once the early number routes to the assistant, or
+    None to leave provisioning to the worker (reservation slow, failed, or not attachable).
+    """
+    if not task.done():
+        with stages.stage("number_wait"):
+            try:
+                await asyncio.wait_for(asyncio.shield(task), settings.CREATE_EARLY_NUMBER_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                _discard_when_done(task)
+                return None
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise  # we were cancelled, not the reservation
+            except Exception:
+                pass
+    if task.cancelled():
+        log.info("Early number reservation cancelled; the worker will provision")
+        return None
+    exc = task.exception()
+    if exc is not None:
+        log.info("Early number reservation failed (%s); the worker will provision", exc)
+        return None
+    phone_id = task.result()["id"]
     try:
-        assistant = await vapi_client.create_assistant(
-            name=body.agent_name,
-            system_prompt=system_prompt,
-            first_message=first_message,
-            voice_gender=body.voice_gender,
-            business_name=body.business_name,
-        )
-    except httpx.HTTPStatusError as e:
-        detail_txt = e.response.text if e.response is not None else str(e)
-        log.error("Assistant create failed: %s", detail_txt)
-        raise HTTPException(status_code=400, detail={"error": "vapi_assistant_create_failed", "upstream": detail_txt})
+        with stages.stage("number_attach"):
+            await vapi_client.attach_phone_number(phone_id, assistant_id)
+    except Exception as e:
+        log.warning("Attaching number id=%s failed: %s", phone_id, e)
+        _spawn(provisioning.discard_number(phone_id))
+        return None
+    return phone_id, time.time()
+
+async def _create_agent(
+    body: CreateAgentRequest,
+    *,
+    spec_slots: Optional[asyncio.Semaphore] = None,
+    vapi_slots: Optional[asyncio.Semaphore] = None,
+    save: Callable[..., Awaitable[Dict[str, Any]]] = agent_store.save_new_agent,
+    early_number: bool = True,
+) -> CreateAgentResponse:
+    """
+    Specialize → Vapi assistant → persist, with the phone number reserved alongside
+    specialization (CREATE_EARLY_NUMBER) and attached once the assistant exists.
+    On failure, everything created upstream so far is deleted again.
+    Bulk creates pass their own limits and batched writer, and no early number: with
+    a whole batch reserving at once, the reservations would just queue in front of
+    the assistant creates, and the worker's numbers need no attach PATCH.
+    """
+    stages = stage_timings.Stages("create")
+    with stages.stage("template"):
+        template = load_template(body.template_key)
+        missing = check_required(template, body.model_dump())
+    if missing:
+        raise HTTPException(status_code=422, detail={"missing_fields": missing})
 
-    assistant_id = assistant.get("id")
-    if not assistant_id:
-        raise HTTPException(status_code=502, detail="Vapi assistant creation failed (no id in response)")
+    slug = f"{slugify(body.agent_name)}-{short_id()}"
+    edit_token = new_edit_token()
+    phone_label = f"{body.agent_name} Line"
+    early: Optional[asyncio.Task] = None
+    if body.provision_phone_number and early_number and settings.CREATE_EARLY_NUMBER:
+        early = asyncio.create_task(_reserve_number(phone_label, body.area_code, stages))
+    assistant_id: Optional[str] = None
+    attached: Optional[Tuple[str, float]] = None
+    try:
+        async with spec_slots or contextlib.nullcontext():
+            with stages.stage("specialize"):
+                system_prompt, first_message, _ = await _specialize_for(template, body, preview_id=body.preview_id)
 
-    phone_number = None
-    if body.provision_phone_number:
+        # Create Vapi assistant
         try:
-            pn = await vapi_client.create_phone_number(assistant_id=assistant_id, label=f"{body.agent_name} Line")
-            phone_number = pn.get("number") or pn.get("e164") or pn.get("name")
+            async with vapi_slots or contextlib.nullcontext():
+                with stages.stage("assistant"):
+                    assistant = await vapi_client.create_assistant(
+                        name=body.agent_name,
+                        system_prompt=system_prompt,
+                        first_message=first_message,
+                        voice_gender=body.voice_gender,
+                        business_name=body.business_name,
+                    )
         except httpx.HTTPStatusError as e:
             detail_txt = e.response.text if e.response is not None else str(e)
-            log.error("Phone provisioning failed: %s", detail_txt)
-            phone_number = None
+            log.error("Assistant create failed: %s", detail_txt)
+            raise HTTPException(status_code=400, detail={"error": "vapi_assistant_create_failed", "upstream": detail_txt})
 
-    slug = f"{slugify(body.agent_name)}-{short_id()}"
-    edit_token = new_edit_token()
+        assistant_id = assistant.get("id")
+        if not assistant_id:
+            raise HTTPException(status_code=502, detail="Vapi assistant creation failed (no id in response)")
 
-    # Persist to Redis
-    try:
-        r.hset(f"agent:{slug}", mapping={
-            "assistantId": assistant_id,
-            "phoneNumber": phone_number or "",
-            "payload": json.dumps(body.model_dump()),
-            "system_prompt": system_prompt,
-            "first_message": first_message,
-            "editToken": edit_token,
-        })
-        r.set(f"agent:by_token:{edit_token}", slug)
-    except redis_lib.RedisError as e:
-        log.error("Redis persist failed: %s", e)
-        raise HTTPException(status_code=500, detail="Agent created, but persistence failed. Check Redis config.")
+        if early is not None:
+            attached = await _attach_number(early, assistant_id, stages)
+            early = None  # attached, or already handed to cleanup
+
+        # Persist to Redis (one MULTI/EXEC). Number provisioning can take minutes, so it is
+        # queued for the workers in the same transaction and the client polls for it.
+        try:
+            with stages.stage("persist"):
+                prov_state = await save(
+                    slug=slug,
+                    edit_token=edit_token,
+                    assistant_id=assistant_id,
+                    payload=body.model_dump(mode="json"),
+                    system_prompt=system_prompt,
+                    first_message=first_message,
+                    provision_phone_number=body.provision_phone_number,
+                    phone_label=phone_label,
+                    area_code=body.area_code,
+                    phone_number_id=attached[0] if attached else None,
+                    reserved_at=attached[1] if attached else None,
+                )
+        except redis_lib.RedisError as e:
+            log.error("Redis persist failed: %s", e)
+            raise HTTPException(status_code=500, detail="Agent could not be saved. Check Redis config.")
+    except BaseException:
+        stages.finish(ok=False)
+        # Compensate: nothing references these upstream resources now
+        if attached is not None:
+            _spawn(provisioning.discard_number(attached[0]))
+        elif early is not None:
+            _discard_when_done(early)
+        if assistant_id:
+            _spawn(_discard_assistant(assistant_id))
+        raise
+    stages.finish()
 
     return CreateAgentResponse(
         slug=slug,
         editToken=edit_token,
         assistantId=assistant_id,
-        phoneNumber=phone_number,
+        phoneNumber=None,
         payload=body,
         system_prompt=system_prompt,
         first_message=first_message,
+        provisioning=ProvisioningStatus(status=prov_state["status"], updated_at=prov_state["updated_at"]),
     )
 
+async def _discard_assistant(assistant_id: str) -> None:
+    try:
+        await vapi_client.delete_assistant(assistant_id)
+        log.warning("Deleted assistant %s after a failed create", assistant_id)
+    except Exception as e:
+        log.error("Failed to delete assistant %s: %s", assistant_id, e)
+
+@router.post("/agent/create", response_model=CreateAgentResponse, dependencies=[Depends(require_api_key)])
+async def agent_create(
+    body: CreateAgentRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """
+    With an Idempotency-Key header, retries of the same request (client timeouts, proxy
+    re-submits) wait for or replay the first response instead of creating another agent.
+    """
+    if not idempotency_key:
+        return await _create_agent(body)
+    if len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key too long")
+
+    # preview_id only says where the prompt may come from, not what to create: re-running
+    # Preview before retrying must not turn the retry into a conflict
+    fp = idempotency.fingerprint(body.model_dump(mode="json", exclude={"preview_id"}))
+    try:
+        claim = await idempotency.begin(idempotency_key, fp)
+    except idempotency.IdempotencyConflict:
+        raise HTTPException(status_code=409, detail={"error": "idempotency_key_reused",
+                                                     "message": "Idempotency-Key was used with a different request body"})
+    except idempotency.IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail={"error": "idempotency_key_in_progress",
+                                                     "message": "The original request is still running; retry later"},
+                            headers={"Retry-After": "5"})
+    except redis_lib.RedisError as e:
+        log.warning("Idempotency unavailable, creating without it: %s", e)
+        return await _create_agent(body)
+    if not isinstance(claim, str):
+        status, content = claim
+        return Response(content=content, status_code=status, media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+
+    try:
+        created = await _create_agent(body)
+    except HTTPException as e:
+        # Client errors are deterministic for this body: replay them. Server errors free the key.
+        if e.status_code < 500:
+            await idempotency.finish(idempotency_key, fp, e.status_code, json.dumps({"detail": e.detail}))
+        else:
+            await idempotency.release(idempotency_key, claim)
+        raise
+    except BaseException:
+        await asyncio.shield(idempotency.release(idempotency_key, claim))
+        raise
+    content = created.model_dump_json()
+    await idempotency.finish(idempotency_key, fp, 200, content)
+    return Response(content=content, media_type="application/json")
+
+def _parse_bulk(raw: bytes, content_type: str) -> List[Any]:
+    """A JSON array, {"agents": [...]}, or NDJSON (one object per line) → raw items."""
+    text = raw.decode("utf-8")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("agents")
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of agents, {\"agents\": [...]}, or NDJSON")
+    return data
+
+async def _bulk_item(
+    index: int, item: Any, spec_slots: asyncio.Semaphore, vapi_slots: asyncio.Semaphore,
+    writer: agent_store.BatchWriter,
+) -> Dict[str, Any]:
+    try:
+        body = CreateAgentRequest.model_validate(item)
+        created = await _create_agent(body, spec_slots=spec_slots, vapi_slots=vapi_slots, save=writer.save,
+                                      early_number=False)
+    except ValidationError as e:
+        return {"index": index, "ok": False, "status": 422,
+                "error": json.loads(e.json(include_url=False, include_input=False))}
+    except HTTPException as e:
+        return {"index": index, "ok": False, "status": e.status_code, "error": e.detail}
+    except Exception as e:
+        log.error("Bulk item %d failed: %s", index, e)
+        return {"index": index, "ok": False, "status": 500, "error": "internal_error"}
+    return {"index": index, "ok": True, "result": created.model_dump(mode="json")}
+
+async def _bulk_events(items: List[Any]) -> AsyncIterator[str]:
+    spec_slots = asyncio.Semaphore(max(1, settings.BULK_SPECIALIZE_CONCURRENCY))
+    vapi_slots = asyncio.Semaphore(max(1, settings.BULK_VAPI_CONCURRENCY))
+    created = failed = 0
+    async with agent_store.BatchWriter() as writer:
+        tasks = [asyncio.create_task(_bulk_item(i, item, spec_slots, vapi_slots, writer))
+                 for i, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                row = await next_done
+                created += int(row["ok"])
+                failed += int(not row["ok"])
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+        finally:
+            # Client went away (or we failed): don't keep creating assistants nobody will see
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    yield json.dumps({"summary": True, "total": len(items), "created": created, "failed": failed}) + "\n"
+
+@router.post("/agents/bulk", dependencies=[Depends(require_api_key)])
+async def agents_bulk(request: Request):
+    """
+    Creates many agents in one request. Body: a JSON array of CreateAgentRequest (or
+    {"agents": [...]}), or NDJSON with Content-Type application/x-ndjson.
+
+    Streams NDJSON in completion order, one line per item:
+      {"index": i, "ok": true, "result": CreateAgentResponse}
+      {"index": i, "ok": false, "status": 4xx/5xx, "error": ...}
+    then {"summary": true, "total", "created", "failed"}. Specialization and Vapi
+    calls are bounded separately (BULK_SPECIALIZE_CONCURRENCY, BULK_VAPI_CONCURRENCY)
+    and records are written in batched MULTI/EXECs.
+    """
+    try:
+        items = _parse_bulk(await request.body(), request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid bulk body: {e}")
+    if not items:
+        raise HTTPException(status_code=400, detail="no agents in request")
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"at most {settings.BULK_MAX_ITEMS} agents per request")
+    return StreamingResponse(
+        _bulk_events(items),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/agents", response_model=AgentList, dependencies=[Depends(require_api_key)])
+async def list_agents(
+    template_key: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="business name prefix"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+):
+    """Operator listing: newest first, or by name for a prefix search; follow next_cursor for more."""
+    try:
+        items, next_cursor = await agent_index.list_agents(
+            template_key=template_key, name_prefix=q, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AgentList(agents=items, next_cursor=next_cursor)
+
+def _check_edit_token(expected: Optional[str], token: str) -> None:
+    # Constant-time, so response timing doesn't leak how much of a guessed token matched
+    if not expected or not hmac.compare_digest(expected.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid token")
+
 @router.get("/agent/{slug}", response_model=LoadAgentResponse, dependencies=[Depends(require_api_key)])
-async def load_agent(slug: str, token: str = Query(..., description="edit token")):
-    data = r.hgetall(f"agent:{slug}")
+async def load_agent(
+    slug: str,
+    token: str = Query(..., description="edit token"),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    entry = agent_cache.get(slug)
+    if entry is None:
+        started = agent_cache.epoch()
+        data = await agent_store.get_agent(slug)
+        if not data:
+            raise HTTPException(status_code=404, detail="Not found")
+        body = LoadAgentResponse(
+            slug=slug,
+            editToken=data["editToken"],
+            assistantId=data["assistantId"],
+            phoneNumber=data.get("phoneNumber") or None,
+            payload=data["payload"],
+            system_prompt=data["system_prompt"],
+            first_message=data["first_message"],
+        ).model_dump_json().encode("utf-8")
+        entry = agent_cache.put(slug, body, data["editToken"], started)
+    _check_edit_token(entry.edit_token, token)
+
+    # no-cache: clients may keep it but must revalidate (the phone number can arrive any time)
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+# Builder fields that never reach the prompt (the phone number is kept on update)
+_NON_PROMPT_FIELDS = {"area_code"}
+
+def _stored_builder_fields(stored: Dict[str, Any]) -> Dict[str, Any]:
+    return AgentBuilderPayload.model_validate(
+        {k: v for k, v in stored.items() if k in AgentBuilderPayload.model_fields}
+    ).model_dump(mode="json")
+
+@router.put("/agent/{slug}", response_model=UpdateAgentResponse, dependencies=[Depends(require_api_key)])
+async def agent_update(slug: str, body: AgentBuilderPayload, token: str = Query(..., description="edit token")):
+    """
+    Applies a new builder payload to an existing agent. Only prompt-relevant changes
+    re-run specialization; the Vapi assistant is PATCHed with just the parts that
+    changed, and the assistant id and phone number stay the same.
+    """
+    data = await agent_store.get_agent(slug)
     if not data:
         raise HTTPException(status_code=404, detail="Not found")
-    if data.get("editToken") != token:
-        raise HTTPException(status_code=403, detail="Invalid token")
+    _check_edit_token(data.get("editToken"), token)
 
-    payload = json.loads(data["payload"])
-    obj = SavedAgent(
-        slug=slug,
-        editToken=data["editToken"],
-        assistantId=data["assistantId"],
-        phoneNumber=data.get("phoneNumber") or None,
-        payload=payload,
-        system_prompt=data["system_prompt"],
-        first_message=data["first_message"],
-    )
-    return LoadAgentResponse(**obj.model_dump())
+    lock = await agent_store.acquire_update_lock(slug)
+    if lock is None:
+        raise HTTPException(status_code=409, detail="Another update for this agent is in progress")
+    try:
+        # Re-read under the lock so we diff against the latest revision
+        data = await agent_store.get_agent(slug)
+        stored = data["payload"]
+        before = _stored_builder_fields(stored)
+        after = _builder_payload(body).model_dump(mode="json")
+        changed = [f for f in AgentBuilderPayload.model_fields if before.get(f) != after.get(f)]
+        revision = int(data.get("revision") or 0)
+        old_prompts = (data["system_prompt"], data["first_message"])
+
+        def response(prompts: Tuple[str, str], **extra: Any) -> UpdateAgentResponse:
+            return UpdateAgentResponse(
+                slug=slug, editToken=data["editToken"], assistantId=data["assistantId"],
+                phoneNumber=data.get("phoneNumber") or None, payload=body,
+                system_prompt=prompts[0], first_message=prompts[1],
+                revision=revision, changed_fields=changed, **extra,
+            )
+
+        if not changed:
+            return response(old_prompts)
+
+        template = load_template(body.template_key)
+        missing = check_required(template, body.model_dump())
+        if missing:
+            raise HTTPException(status_code=422, detail={"missing_fields": missing})
+
+        respecialize = bool(set(changed) - _NON_PROMPT_FIELDS)
+        new_prompts = old_prompts
+        if respecialize:
+            system_prompt, first_message, _ = await _specialize_for(template, body)
+            new_prompts = (system_prompt, first_message)
+
+        patch: Dict[str, Any] = {}
+        if "agent_name" in changed:
+            patch["name"] = body.agent_name
+        if new_prompts[0] != old_prompts[0]:
+            patch["system_prompt"] = new_prompts[0]
+        if new_prompts[1] != old_prompts[1]:
+            patch["first_message"] = new_prompts[1]
+        if patch:
+            try:
+                await vapi_client.update_assistant(data["assistantId"], **patch)
+            except httpx.HTTPStatusError as e:
+                detail_txt = e.response.text if e.response is not None else str(e)
+                log.error("Assistant update failed: %s", detail_txt)
+                raise HTTPException(status_code=400, detail={"error": "vapi_assistant_update_failed", "upstream": detail_txt})
+
+        new_stored = {**stored, **after}
+        revision += 1
+        entry = revisions.make_revision(
+            revision,
+            revisions.payload_changes(stored, new_stored, changed),
+            old_prompts, new_prompts,
+        )
+        try:
+            await agent_store.save_update(slug, {
+                **data,
+                "payload": new_stored,
+                "system_prompt": new_prompts[0],
+                "first_message": new_prompts[1],
+                "revision": str(revision),
+            }, entry, previous_payload=stored)
+        except redis_lib.RedisError as e:
+            log.error("Redis persist failed: %s", e)
+            raise HTTPException(status_code=500, detail="Agent updated upstream, but persistence failed. Check Redis config.")
+        return response(new_prompts, respecialized=respecialize, assistant_patched=bool(patch))
+    finally:
+        await agent_store.release_update_lock(slug, lock)
+
+@router.get("/agent/{slug}/revisions", dependencies=[Depends(require_api_key)])
+async def agent_revisions(slug: str, token: str = Query(..., description="edit token"),
+                          limit: int = Query(20, ge=1, le=200)):
+    edit_token = await agent_store.get_edit_token(slug)
+    if not edit_token:
+        raise HTTPException(status_code=404, detail="Not found")
+    _check_edit_token(edit_token, token)
+    return {"slug": slug, "revisions": await agent_store.get_revisions(slug, limit)}
+
+@router.get("/agent/{slug}/provisioning", response_model=ProvisioningStatus, dependencies=[Depends(require_api_key)])
+async def agent_provisioning(slug: str, token: str = Query(..., description="edit token")):
+    edit_token = await agent_store.get_edit_token(slug)
+    if not edit_token:
+        raise HTTPException(status_code=404, detail="Not found")
+    _check_edit_token(edit_token, token)
+
+    state = await provisioning.get_state(slug)
+    if state is None:
+        # Agents created before background provisioning existed
+        return ProvisioningStatus(status=provisioning.SKIPPED)
+    return ProvisioningStatus(**state)
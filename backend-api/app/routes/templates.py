@@ -0,0 +1,25 @@
+# backend-api/app/routes/templates.py
+from fastapi import APIRouter, Depends, Header, Query, Response
+from fastapi.responses import JSONResponse
+from typing import Optional
+from ..auth import require_api_key
+from ..models import TemplateCatalog
+from ..templates import registry
+from ..utils import etag_matches
+
+router = APIRouter(prefix="/v1", tags=["templates"])
+
+@router.get("/templates", response_model=TemplateCatalog, dependencies=[Depends(require_api_key)])
+async def list_templates(
+    industry: Optional[str] = Query(None),
+    subcategory: Optional[str] = Query(None),
+    use_case: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    # Served from the registry's precomputed index; no file I/O per request
+    entries, tag = registry.catalog(industry=industry, subcategory=subcategory, use_case=use_case)
+    etag = f'"{tag}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=60"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"templates": entries}, headers=headers)
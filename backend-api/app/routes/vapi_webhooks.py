@@ -0,0 +1,40 @@
+# backend-api/app/routes/vapi_webhooks.py
+from fastapi import APIRouter, Header, HTTPException, Request
+from typing import Any, Iterator, Optional
+from .. import readiness
+from ..config import settings
+import hmac
+import logging
+
+log = logging.getLogger("pheona.routes.vapi_webhooks")
+router = APIRouter(prefix="/v1/vapi", tags=["vapi"])
+
+def _phone_number_ids(obj: Any) -> Iterator[str]:
+    # Vapi server messages nest the number differently per event type
+    # (message.phoneNumber.id, phoneNumberId, call.phoneNumberId, ...); collect them all.
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k == "phoneNumberId" and isinstance(v, str):
+                yield v
+            elif k == "phoneNumber" and isinstance(v, dict) and isinstance(v.get("id"), str):
+                yield v["id"]
+            yield from _phone_number_ids(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _phone_number_ids(v)
+
+@router.post("/webhook")
+async def vapi_webhook(request: Request, x_vapi_secret: Optional[str] = Header(default=None)):
+    if not settings.VAPI_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_vapi_secret or not hmac.compare_digest(x_vapi_secret, settings.VAPI_WEBHOOK_SECRET):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+
+    body = await request.json()
+    woken = 0
+    for phone_id in dict.fromkeys(_phone_number_ids(body)):
+        try:
+            woken += await readiness.notify_ready(phone_id)
+        except Exception as e:
+            log.warning("Could not publish readiness for %s: %s", phone_id, e)
+    return {"ok": True, "woken": woken}
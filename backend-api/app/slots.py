@@ -0,0 +1,139 @@
+# backend-api/app/slots.py
+from __future__ import annotations
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+"""
+Deterministic placeholder rendering for templates that declare slots.
+
+A template opts in with a "slots" block:
+
+  "slots": {
+    "system_prompt_path": "prompts/.../inbound_slots.md",
+    "first_message": "Hi, this is {{agent_name}} with {{business_name}}. How can I help today?",
+    "llm": "free_instructions"      // or "always"
+  }
+
+Placeholder syntax (a small Mustache subset):
+  {{name}}             value of a payload field ("" when empty)
+  {{name|join}}        list joined with ", "
+  {{name|json}}        pretty JSON (e.g. info_to_collect)
+  {{#name}}…{{/name}}  rendered when the field is non-empty
+  {{^name}}…{{/name}}  rendered when the field is empty
+Section tags alone on a line drop that line entirely.
+
+Text is compiled once (at template load) into a render plan of literal strings and
+value lookups, validated against the allowed field names, so rendering is a
+single pass with no parsing and always gives the same output for the same input.
+With llm="free_instructions" the LLM only runs when free_instructions is set, and
+then it starts from the rendered text instead of the raw base prompt.
+"""
+
+class SlotTemplateError(ValueError): ...
+
+_TAG = re.compile(r"\{\{\s*([#^/]?)\s*([A-Za-z_][A-Za-z0-9_]*)\s*(?:\|\s*([a-z]+)\s*)?\}\}")
+_STANDALONE = re.compile(r"(?m)^[ \t]*(\{\{\s*[#^/][^}]*\}\})[ \t]*\r?\n")
+
+def _text(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return "yes" if v else "no"
+    return str(v)
+
+def _join(v: Any) -> str:
+    if isinstance(v, (list, tuple)):
+        return ", ".join(_text(x) for x in v)
+    return _text(v)
+
+def _json(v: Any) -> str:
+    return json.dumps(v, ensure_ascii=False, indent=2)
+
+_FILTERS: Dict[str, Callable[[Any], str]] = {"text": _text, "join": _join, "json": _json}
+
+def _empty(v: Any) -> bool:
+    if isinstance(v, str):
+        return not v.strip()
+    return v is None or v == [] or v == {} or v is False
+
+# A plan node is a literal string, a (name, filter) lookup, or a (name, inverted, sub-plan) section
+_Node = Union[str, Tuple[str, Callable[[Any], str]], Tuple[str, bool, "List[_Node]"]]
+
+class RenderPlan:
+    __slots__ = ("_nodes", "fields")
+
+    def __init__(self, nodes: List[_Node], fields: Iterable[str]):
+        self._nodes = nodes
+        self.fields = frozenset(fields)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        out: List[str] = []
+        _render(self._nodes, values, out)
+        return "".join(out)
+
+def _render(nodes: List[_Node], values: Dict[str, Any], out: List[str]) -> None:
+    for node in nodes:
+        if isinstance(node, str):
+            out.append(node)
+        elif len(node) == 2:
+            out.append(node[1](values.get(node[0])))
+        elif _empty(values.get(node[0])) == node[1]:
+            _render(node[2], values, out)
+
+def compile_plan(text: str, allowed: Iterable[str]) -> RenderPlan:
+    allowed = set(allowed)
+    text = _STANDALONE.sub(r"\1", text)
+    root: List[_Node] = []
+    stack: List[Tuple[Optional[str], List[_Node]]] = [(None, root)]
+    used = set()
+    pos = 0
+    for m in _TAG.finditer(text):
+        if m.start() > pos:
+            stack[-1][1].append(text[pos:m.start()])
+        pos = m.end()
+        sigil, name, filt = m.group(1), m.group(2), m.group(3)
+        if name not in allowed:
+            raise SlotTemplateError(f"unknown slot '{name}'")
+        used.add(name)
+        if sigil == "/":
+            if stack[-1][0] != name:
+                raise SlotTemplateError(f"unexpected {{{{/{name}}}}}")
+            stack.pop()
+        elif sigil:
+            body: List[_Node] = []
+            stack[-1][1].append((name, sigil == "^", body))
+            stack.append((name, body))
+        else:
+            if (filt or "text") not in _FILTERS:
+                raise SlotTemplateError(f"unknown filter '{filt}' on '{name}'")
+            stack[-1][1].append((name, _FILTERS[filt or "text"]))
+    if len(stack) > 1:
+        raise SlotTemplateError(f"unclosed section '{stack[-1][0]}'")
+    if pos < len(text):
+        root.append(text[pos:])
+    return RenderPlan(root, used)
+
+class SlotTemplate:
+    """Compiled system prompt + first message for one template."""
+    __slots__ = ("system_prompt", "first_message", "llm")
+
+    def __init__(self, system_prompt: RenderPlan, first_message: RenderPlan, llm: str):
+        self.system_prompt = system_prompt
+        self.first_message = first_message
+        self.llm = llm
+
+    def needs_llm(self, values: Dict[str, Any]) -> bool:
+        if self.llm == "always":
+            return True
+        return not _empty(values.get("free_instructions"))
+
+    def render(self, values: Dict[str, Any]) -> Tuple[str, str]:
+        return self.system_prompt.render(values).strip(), self.first_message.render(values).strip()
+
+def compile_slots(spec: Dict[str, Any], system_text: str, allowed: Iterable[str]) -> SlotTemplate:
+    llm = spec.get("llm", "free_instructions")
+    if llm not in ("free_instructions", "always"):
+        raise SlotTemplateError(f"slots.llm must be 'free_instructions' or 'always', got {llm!r}")
+    first = spec.get("first_message") or "Hi, this is {{agent_name}} with {{business_name}}. How can I help today?"
+    return SlotTemplate(compile_plan(system_text, allowed), compile_plan(first, allowed), llm)
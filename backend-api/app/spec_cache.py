@@ -0,0 +1,325 @@
+# backend-api/app/spec_cache.py
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from .config import settings
+from .models import AgentBuilderPayload
+from .redis_client import ar
+
+"""
+Content-addressed cache in front of prompt specialization.
+
+Lookup order: in-process LRU (L1) → Redis with TTL (L2) → LLM.
+The key hashes everything that can change the LLM output: the canonicalized
+AgentBuilderPayload, base prompt, base first message, meta instructions,
+template version and content hash, and the specializer provider set. Redis is
+optional here: any Redis error is logged and treated as a miss so
+specialization still works without it.
+
+Misses are single-flight: concurrent callers for the same key in this process
+await one shared future, and across workers the first caller takes
+specflight:lock:{key} (SET NX PX) while the others subscribe to
+specflight:done:{key} for the result. If the holder fails or disappears, waiters
+fall back to computing it themselves; if it is cancelled, one of its local
+waiters takes over. Streamed previews (stream_or_join) share the same flights.
+"""
+
+log = logging.getLogger("pheona.spec_cache")
+
+_KEY_PREFIX = "speccache:"
+_LOCK_PREFIX = "specflight:lock:"
+_DONE_PREFIX = "specflight:done:"
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            val = self._data.get(key)
+            if val is not None:
+                self._data.move_to_end(key)
+            return val
+
+    def put(self, key: str, val: Tuple[str, str]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = val
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+_l1 = _LRU(settings.SPEC_CACHE_MAX_ENTRIES)
+_counters: Dict[str, int] = {
+    "l1_hits": 0, "l2_hits": 0, "misses": 0, "redis_errors": 0,
+    "coalesced_local": 0, "coalesced_remote": 0,
+}
+_inflight: Dict[str, "asyncio.Future[Tuple[str, str]]"] = {}
+
+def canonical_payload(payload: AgentBuilderPayload) -> str:
+    """Stable JSON for the prompt-relevant payload (sorted keys, JSON-mode values)."""
+    return json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def make_key(
+    payload: AgentBuilderPayload,
+    base_system_prompt: str,
+    base_first_message: str,
+    meta_instructions: Optional[str],
+    template_version: Any,
+    model: Optional[str] = None,
+    template_hash: str = "",
+) -> str:
+    h = hashlib.sha256()
+    for part in (
+        canonical_payload(payload),
+        base_system_prompt,
+        base_first_message,
+        meta_instructions or "",
+        str(template_version),
+        template_hash,
+        model or settings.GROQ_MODEL,
+    ):
+        # Length-prefix each part so adjacent fields can't collide
+        b = part.encode("utf-8")
+        h.update(str(len(b)).encode("ascii") + b":" + b)
+    return h.hexdigest()
+
+async def _redis_get(key: str) -> Optional[Tuple[str, str]]:
+    try:
+        raw = await ar.get(_KEY_PREFIX + key)
+    except Exception as e:
+        _counters["redis_errors"] += 1
+        log.warning("Spec cache Redis read failed: %s", e)
+        return None
+    if not raw:
+        return None
+    obj = json.loads(raw)
+    return obj["system_prompt"], obj["first_message"]
+
+async def _redis_put(key: str, val: Tuple[str, str]) -> None:
+    try:
+        await ar.set(
+            _KEY_PREFIX + key,
+            json.dumps({"system_prompt": val[0], "first_message": val[1]}),
+            ex=settings.SPEC_CACHE_TTL_SECONDS,
+        )
+    except Exception as e:
+        _counters["redis_errors"] += 1
+        log.warning("Spec cache Redis write failed: %s", e)
+
+async def lookup(key: str) -> Optional[Tuple[str, str]]:
+    val = _l1.get(key)
+    if val is not None:
+        _counters["l1_hits"] += 1
+        return val
+    val = await _redis_get(key)
+    if val is not None:
+        _counters["l2_hits"] += 1
+        _l1.put(key, val)
+        return val
+    return None
+
+async def store(key: str, val: Tuple[str, str]) -> None:
+    _l1.put(key, val)
+    await _redis_put(key, val)
+
+async def _publish(key: str, val: Optional[Tuple[str, str]]) -> None:
+    msg = {"ok": False} if val is None else {"ok": True, "system_prompt": val[0], "first_message": val[1]}
+    try:
+        await ar.publish(_DONE_PREFIX + key, json.dumps(msg))
+    except Exception as e:
+        _counters["redis_errors"] += 1
+        log.warning("Single-flight publish failed: %s", e)
+
+async def _release(key: str, token: str) -> None:
+    try:
+        # Only drop our own lock (it may have expired and been re-taken)
+        if await ar.get(_LOCK_PREFIX + key) == token:
+            await ar.delete(_LOCK_PREFIX + key)
+    except Exception as e:
+        _counters["redis_errors"] += 1
+        log.warning("Single-flight unlock failed: %s", e)
+
+async def _await_remote(key: str) -> Optional[Tuple[str, str]]:
+    """Waits for another worker's result; None if it failed or went away."""
+    deadline = time.monotonic() + settings.SPEC_SINGLEFLIGHT_LOCK_SECONDS
+    pubsub = ar.pubsub()
+    try:
+        await pubsub.subscribe(_DONE_PREFIX + key)
+        # The holder may have finished between our lock attempt and subscribing
+        val = await _redis_get(key)
+        if val is not None:
+            return val
+        while time.monotonic() < deadline:
+            msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if msg is not None:
+                obj = json.loads(msg["data"])
+                return (obj["system_prompt"], obj["first_message"]) if obj.get("ok") else None
+            if not await ar.exists(_LOCK_PREFIX + key):
+                return await _redis_get(key)
+        return None
+    except Exception as e:
+        _counters["redis_errors"] += 1
+        log.warning("Single-flight wait failed: %s", e)
+        return None
+    finally:
+        try:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+class _LeaderCancelled(Exception):
+    """The caller computing a key went away; its waiters retry instead of failing."""
+
+async def _follow(key: str) -> Optional[Tuple[str, str]]:
+    """Result of this process's in-flight computation of `key`; None if nobody is (still) computing it."""
+    while (fut := _inflight.get(key)) is not None:
+        try:
+            val = await asyncio.shield(fut)
+        except _LeaderCancelled:
+            continue  # the next waiter to wake up becomes the leader
+        _counters["coalesced_local"] += 1
+        return val
+    return None
+
+def _claim(key: str) -> "asyncio.Future[Tuple[str, str]]":
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    return fut
+
+def _settle(key: str, fut: "asyncio.Future[Tuple[str, str]]", val: Optional[Tuple[str, str]] = None,
+            error: Optional[BaseException] = None) -> None:
+    if _inflight.get(key) is fut:
+        del _inflight[key]
+    if error is None:
+        fut.set_result(val)
+        return
+    # Cancellation (client gone, hedge lost) is the leader's own business, not its waiters'
+    fut.set_exception(error if isinstance(error, Exception) else _LeaderCancelled())
+    fut.exception()  # mark retrieved; waiters (if any) still receive it
+
+async def _try_lock(key: str) -> Tuple[bool, str]:
+    """(acquired, token); without Redis we compute locally with no token to release."""
+    token = secrets.token_hex(8)
+    try:
+        acquired = await ar.set(_LOCK_PREFIX + key, token, nx=True, px=int(settings.SPEC_SINGLEFLIGHT_LOCK_SECONDS * 1000))
+    except Exception as e:
+        _counters["redis_errors"] += 1
+        log.warning("Single-flight lock failed, computing locally: %s", e)
+        return True, ""
+    return bool(acquired), token
+
+async def _join_remote(key: str) -> Optional[Tuple[str, str]]:
+    val = await _await_remote(key)
+    if val is not None:
+        _counters["coalesced_remote"] += 1
+        _l1.put(key, val)
+    return val
+
+async def _compute_once(key: str, compute: Callable[[], Awaitable[Tuple[str, str]]]) -> Tuple[str, str]:
+    acquired, token = await _try_lock(key)
+    if not acquired:
+        val = await _join_remote(key)
+        if val is not None:
+            return val
+    held = acquired and bool(token)
+
+    _counters["misses"] += 1
+    try:
+        val = await compute()
+    except Exception:
+        if held:
+            await _publish(key, None)  # let waiters fall back now instead of at lock expiry
+        raise
+    finally:
+        if held:
+            await _release(key, token)
+    await store(key, val)
+    if held:
+        await _publish(key, val)
+    return val
+
+async def get_or_specialize(key: str, compute: Callable[[], Awaitable[Tuple[str, str]]]) -> Tuple[str, str]:
+    val = await lookup(key) or await _follow(key)
+    if val is not None:
+        return val
+
+    fut = _claim(key)
+    try:
+        val = await _compute_once(key, compute)
+    except BaseException as e:
+        _settle(key, fut, error=e)
+        raise
+    _settle(key, fut, val)
+    return val
+
+async def stream_or_join(key: str, stream: Callable[[], AsyncIterator[Tuple[str, Any]]]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming get_or_specialize, for specialize_stream(): yields ("delta", text) as the
+    LLM produces it, then ("result", (system_prompt, first_message)). Callers served
+    from the cache or by someone else's computation (here or in another worker) get
+    only the result. A leader whose consumer goes away releases its waiters to retry.
+    """
+    val = await lookup(key) or await _follow(key)
+    if val is not None:
+        yield "result", val
+        return
+
+    fut = _claim(key)
+    try:
+        acquired, token = await _try_lock(key)
+        if not acquired:
+            val = await _join_remote(key)
+        if val is None:
+            held = acquired and bool(token)
+            _counters["misses"] += 1
+            try:
+                async for kind, value in stream():
+                    if kind == "delta":
+                        yield kind, value
+                    else:
+                        val = value
+                if val is None:
+                    raise RuntimeError("specialization stream ended without a result")
+            except Exception:
+                if held:
+                    await _publish(key, None)
+                raise
+            finally:
+                if held:
+                    await _release(key, token)
+            await store(key, val)
+            if held:
+                await _publish(key, val)
+    except BaseException as e:
+        _settle(key, fut, error=e)
+        raise
+    _settle(key, fut, val)
+    yield "result", val
+
+def stats() -> Dict[str, Any]:
+    hits = _counters["l1_hits"] + _counters["l2_hits"]
+    coalesced = _counters["coalesced_local"] + _counters["coalesced_remote"]
+    total = hits + coalesced + _counters["misses"]
+    return {
+        **_counters,
+        "llm_calls_avoided": hits + coalesced,
+        "l1_size": len(_l1),
+        "l1_max_entries": _l1.max_entries,
+        "hit_ratio": (hits / total) if total else 0.0,
+        "avoided_ratio": ((hits + coalesced) / total) if total else 0.0,
+    }
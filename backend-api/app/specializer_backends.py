@@ -0,0 +1,306 @@
+# backend-api/app/specializer_backends.py
+from __future__ import annotations
+import abc
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+import httpx
+from groq import AsyncGroq
+from . import metrics, tracing
+from .config import settings
+
+"""
+Pluggable LLM providers for prompt specialization, with latency-aware routing.
+
+SPECIALIZER_PROVIDERS is a JSON list; each entry becomes one backend:
+
+  {"name": "groq-120b", "kind": "groq",   "model": "openai/gpt-oss-120b"}
+  {"name": "groq-20b",  "kind": "groq",   "model": "openai/gpt-oss-20b", "json_schema": true}
+  {"name": "local",     "kind": "openai", "model": "m", "base_url": "http://127.0.0.1:9001/v1",
+   "api_key_env": "LOCAL_LLM_KEY"}
+
+"groq" uses the Groq SDK (GROQ_API_KEY unless api_key_env is given); "openai" is any
+OpenAI-compatible /chat/completions endpoint, which is also how local fakes plug in.
+Unset, the router has a single Groq backend for GROQ_MODEL (the previous behaviour).
+
+Routing ranks backends by rolling p95 latency inflated by error rate; a backend
+with a burst of recent errors is tripped to the back for a cooldown. The best
+backend is called first; if it hasn't answered after SPECIALIZER_HEDGE_AFTER_MS a
+hedge goes to the runner-up and the first success wins. Failures fail over down
+the list.
+
+Streaming (the SSE preview) is not hedged: it starts on the best backend and
+fails over down the list only while nothing has been yielded yet. Once a delta
+has reached the caller, a failure is raised instead, since the client has
+already shown partial output.
+"""
+
+log = logging.getLogger("pheona.specializer_backends")
+
+T = TypeVar("T")
+
+_WINDOW = 100                 # samples kept per backend
+_PRIOR_LATENCY = 3.0          # assumed p95 (s) before a backend has any samples
+_TRIP_ERROR_RATE = 0.5
+_TRIP_MIN_SAMPLES = 5
+_TRIP_COOLDOWN = 30.0
+
+class SpecializerBackend(abc.ABC):
+    """One provider + model that can run a JSON-mode chat completion."""
+    kind = "base"
+
+    def __init__(self, name: str, model: str, json_schema: Optional[bool] = None):
+        self.name = name
+        self.model = model
+        # None → decided by the caller from the model name (SUPPORTED_JSON_SCHEMA_MODELS)
+        self.json_schema = json_schema
+
+    @abc.abstractmethod
+    async def complete(self, request: Dict[str, Any]) -> str:
+        """Runs chat.completions with the given kwargs and returns the message content."""
+
+    @abc.abstractmethod
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Yields content deltas. Backends without streaming can delegate here via
+        super().stream(), which yields the whole reply once.
+        """
+        yield await self.complete(request)
+
+    async def aclose(self) -> None:
+        pass
+
+class GroqBackend(SpecializerBackend):
+    kind = "groq"
+
+    def __init__(self, name: str, model: str, *, api_key: str, base_url: Optional[str] = None,
+                 json_schema: Optional[bool] = None):
+        super().__init__(name, model, json_schema)
+        self._client = AsyncGroq(api_key=api_key, base_url=base_url, timeout=settings.GROQ_TIMEOUT_SECONDS)
+
+    async def complete(self, request: Dict[str, Any]) -> str:
+        resp = await self._client.chat.completions.create(**request)
+        return resp.choices[0].message.content
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[str]:
+        chunks = await self._client.chat.completions.create(**request, stream=True)
+        async for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+class OpenAICompatibleBackend(SpecializerBackend):
+    kind = "openai"
+
+    def __init__(self, name: str, model: str, *, base_url: str, api_key: Optional[str] = None,
+                 json_schema: Optional[bool] = None):
+        super().__init__(name, model, json_schema)
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.AsyncClient(base_url=base_url.rstrip("/"), headers=headers,
+                                         timeout=settings.GROQ_TIMEOUT_SECONDS)
+
+    async def complete(self, request: Dict[str, Any]) -> str:
+        res = await self._client.post("/chat/completions", json=request)
+        res.raise_for_status()
+        return res.json()["choices"][0]["message"]["content"]
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[str]:
+        async with self._client.stream("POST", "/chat/completions", json={**request, "stream": True}) as res:
+            res.raise_for_status()
+            async for line in res.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                text = (choices[0].get("delta") or {}).get("content") if choices else None
+                if text:
+                    yield text
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+def _from_config(cfg: Dict[str, Any]) -> SpecializerBackend:
+    kind = cfg.get("kind", "groq")
+    model = cfg["model"]
+    name = cfg.get("name") or f"{kind}:{model}"
+    api_key = os.getenv(cfg["api_key_env"]) if cfg.get("api_key_env") else None
+    if kind == "groq":
+        return GroqBackend(name, model, api_key=api_key or settings.GROQ_API_KEY,
+                           base_url=cfg.get("base_url") or settings.GROQ_BASE_URL,
+                           json_schema=cfg.get("json_schema"))
+    if kind == "openai":
+        return OpenAICompatibleBackend(name, model, base_url=cfg["base_url"], api_key=api_key,
+                                       json_schema=cfg.get("json_schema"))
+    raise ValueError(f"Unknown specializer provider kind: {kind}")
+
+def backends_from_settings() -> List[SpecializerBackend]:
+    raw = (settings.SPECIALIZER_PROVIDERS or "").strip()
+    if not raw:
+        return [GroqBackend(f"groq:{settings.GROQ_MODEL}", settings.GROQ_MODEL,
+                            api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)]
+    return [_from_config(c) for c in json.loads(raw)]
+
+class _Stats:
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=_WINDOW)
+        self.outcomes: Deque[bool] = deque(maxlen=_WINDOW)   # True = error
+        self.tripped_until = 0.0
+
+    def record(self, latency: Optional[float], error: bool) -> None:
+        self.outcomes.append(error)
+        if latency is not None and not error:
+            self.latencies.append(latency)
+        recent = list(self.outcomes)[-10:]
+        if len(recent) >= _TRIP_MIN_SAMPLES and sum(recent) / len(recent) >= _TRIP_ERROR_RATE:
+            self.tripped_until = time.monotonic() + _TRIP_COOLDOWN
+
+    def p95(self) -> float:
+        if not self.latencies:
+            return _PRIOR_LATENCY
+        vals = sorted(self.latencies)
+        return vals[min(len(vals) - 1, int(0.95 * len(vals)))]
+
+    def error_rate(self) -> float:
+        return (sum(self.outcomes) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def tripped(self) -> bool:
+        return time.monotonic() < self.tripped_until
+
+    def score(self) -> float:
+        return self.p95() * (1.0 + 4.0 * self.error_rate())
+
+class SpecializerRouter:
+    def __init__(self, backends: List[SpecializerBackend], hedge_after: Optional[float] = None):
+        if not backends:
+            raise ValueError("At least one specializer backend is required")
+        self.backends = backends
+        self.hedge_after = settings.SPECIALIZER_HEDGE_AFTER_MS / 1000.0 if hedge_after is None else hedge_after
+        self._stats: Dict[str, _Stats] = {b.name: _Stats() for b in backends}
+
+    def fingerprint(self) -> str:
+        """Identifies the configured provider set (used in cache keys instead of a single model)."""
+        return "|".join(f"{b.kind}:{b.model}" for b in self.backends)
+
+    def ranked(self) -> List[SpecializerBackend]:
+        # Stable sort: config order breaks ties, so the first provider is preferred until data says otherwise
+        return sorted(self.backends, key=lambda b: (self._stats[b.name].tripped(), self._stats[b.name].score()))
+
+    async def _call(self, backend: SpecializerBackend, build: Callable[[SpecializerBackend], Dict[str, Any]],
+                    parse: Callable[[str], T]) -> T:
+        request = build(backend)
+        mode = (request.get("response_format") or {}).get("type", "text")
+        started = time.monotonic()
+        try:
+            with tracing.span(f"llm {backend.name}", tracing.CLIENT,
+                              backend=backend.name, model=backend.model, mode=mode):
+                result = parse(await backend.complete(request))
+        except asyncio.CancelledError:
+            raise  # lost a hedge race; says nothing about the backend
+        except Exception as e:
+            self._stats[backend.name].record(None, error=True)
+            metrics.observe_specialize(backend.name, backend.model, mode, None)
+            log.warning("Specializer backend %s failed: %s", backend.name, e)
+            raise
+        elapsed = time.monotonic() - started
+        self._stats[backend.name].record(elapsed, error=False)
+        metrics.observe_specialize(backend.name, backend.model, mode, elapsed)
+        return result
+
+    async def run(self, build: Callable[[SpecializerBackend], Dict[str, Any]], parse: Callable[[str], T]) -> T:
+        """
+        `build(backend)` returns the chat.completions kwargs for that backend and
+        `parse(content)` validates the reply (a parse error counts as a backend error).
+        """
+        order = iter(self.ranked())
+        pending: set = set()
+        hedged = False
+        last_exc: Optional[BaseException] = None
+
+        def launch() -> bool:
+            backend = next(order, None)
+            if backend is None:
+                return False
+            pending.add(asyncio.create_task(self._call(backend, build, parse)))
+            return True
+
+        launch()
+        try:
+            while pending:
+                timeout = self.hedge_after if (self.hedge_after > 0 and not hedged) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slow: fire one hedge at the next-best backend
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_exc = task.exception()
+                if not pending and not launch():
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_exc or RuntimeError("No specializer backend succeeded")
+
+    async def stream(self, build: Callable[[SpecializerBackend], Dict[str, Any]],
+                     parse: Callable[[str], T]) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streams from the best backend, yielding ("delta", text) and finally ("result", parse(full_text)).
+        No hedging here; a backend that fails before its first token is failed over, one that
+        fails mid-stream raises (the caller has already shown partial output).
+        """
+        last_exc: Optional[BaseException] = None
+        for backend in self.ranked():
+            started = time.monotonic()
+            started_ns = time.time_ns()
+            parts: List[str] = []
+            try:
+                async for text in backend.stream(build(backend)):
+                    parts.append(text)
+                    yield "delta", text
+                result = parse("".join(parts))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                tracing.record(f"llm {backend.name}", started_ns, tracing.CLIENT, error=e,
+                               backend=backend.name, model=backend.model, mode="stream", chunks=len(parts))
+                self._stats[backend.name].record(None, error=True)
+                metrics.observe_specialize(backend.name, backend.model, "stream", None)
+                log.warning("Specializer backend %s failed while streaming: %s", backend.name, e)
+                if parts:
+                    raise
+                last_exc = e
+                continue
+            elapsed = time.monotonic() - started
+            tracing.record(f"llm {backend.name}", started_ns, tracing.CLIENT,
+                           backend=backend.name, model=backend.model, mode="stream", chunks=len(parts))
+            self._stats[backend.name].record(elapsed, error=False)
+            metrics.observe_specialize(backend.name, backend.model, "stream", elapsed)
+            yield "result", result
+            return
+        raise last_exc or RuntimeError("No specializer backend succeeded")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": b.name,
+                "kind": b.kind,
+                "model": b.model,
+                "p95_seconds": round(self._stats[b.name].p95(), 4),
+                "error_rate": round(self._stats[b.name].error_rate(), 4),
+                "samples": len(self._stats[b.name].outcomes),
+                "tripped": self._stats[b.name].tripped(),
+            }
+            for b in self.ranked()
+        ]
@@ -0,0 +1,75 @@
+# backend-api/app/stage_timings.py
+from __future__ import annotations
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, Tuple
+from . import metrics, tracing
+
+"""
+Per-stage wall-clock timings for multi-step requests (agent create).
+
+A Stages object lives for one request; stage() blocks may overlap (the number
+reservation runs alongside specialization), so stage times don't sum to the total.
+finish() logs the breakdown and adds it to rolling per-process windows that
+GET /v1/stats/stages reports as count / mean / p50 / p95 per stage (and to the
+pheona_stage_seconds histogram; stages also appear in the Server-Timing header).
+"""
+
+log = logging.getLogger("pheona.stage_timings")
+
+_WINDOW = 500
+_windows: Dict[Tuple[str, str], Deque[float]] = {}
+_lock = threading.Lock()
+
+class Stages:
+    def __init__(self, flow: str):
+        self.flow = flow
+        self.durations: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._finished = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            with tracing.span(f"{self.flow}.{name}"):
+                yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        metrics.add_timing(name, seconds)
+
+    def finish(self, ok: bool = True) -> Dict[str, float]:
+        """Closes the request (idempotent); returns the stage durations including "total"."""
+        if not self._finished:
+            self._finished = True
+            self.durations["total"] = time.perf_counter() - self._started
+            with _lock:
+                for name, seconds in self.durations.items():
+                    _windows.setdefault((self.flow, name), deque(maxlen=_WINDOW)).append(seconds)
+            for name, seconds in self.durations.items():
+                metrics.STAGE.labels(self.flow, name).observe(seconds)
+            log.info("%s %s: %s", self.flow, "ok" if ok else "failed",
+                     " ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.durations.items()))
+        return self.durations
+
+def _quantile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def snapshot() -> Dict[str, Dict[str, Dict[str, float]]]:
+    out: Dict[str, Dict[str, Dict[str, float]]] = {}
+    with _lock:
+        items = [(key, sorted(window)) for key, window in _windows.items()]
+    for (flow, name), values in items:
+        out.setdefault(flow, {})[name] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 1),
+            "p50_ms": round(_quantile(values, 0.50) * 1000, 1),
+            "p95_ms": round(_quantile(values, 0.95) * 1000, 1),
+        }
+    return out
@@ -1,31 +1,265 @@
 # backend-api/app/templates.py
-import json, os
-from typing import Dict, Any, List
+import asyncio, hashlib, json, logging, os, threading, time
+from typing import Dict, Any, List, Optional, Tuple
+from . import metrics
 from .config import settings
+from .models import AgentBuilderPayload
+from .slots import SlotTemplate, compile_slots
+
+"""
+In-memory registry of templates and the prompt files they reference.
+
+Everything under PHEONA_TEMPLATES_DIR is loaded once (at startup or on first use),
+cross-references are validated, and requests are served from memory. A background
+task polls file mtimes every PHEONA_TEMPLATES_RELOAD_SECONDS and swaps in a fresh
+snapshot when anything changed; a template that fails validation on reload keeps
+its previous good version.
+
+Each template has a content hash over its JSON and every prompt it references,
+so caches can key on exactly what was used to build a prompt. A catalog index
+(metadata, required fields, version, defaults) is precomputed per snapshot for
+GET /v1/templates, with an ETag derived from all content hashes. Templates with a
+"slots" block also get their placeholder render plan compiled here (see slots.py).
+"""
+
+log = logging.getLogger("pheona.templates")
 
 class TemplateNotFound(Exception): ...
 class PromptNotFound(Exception): ...
 
+# Template keys that point at prompt files (paths relative to the repo root)
+_PROMPT_PATH_KEYS = ("system_prompt_base_path", "prompt_specialization_instructions_path")
+
 def _template_path(template_key: str) -> str:
     # e.g. "insurance/motor_trucking/inbound" → templates/insurance/motor_trucking/inbound.json
     return os.path.join(settings.PHEONA_TEMPLATES_DIR, f"{template_key}.json")
 
-def load_template(template_key: str) -> Dict[str, Any]:
-    path = _template_path(template_key)
-    if not os.path.exists(path):
-        raise TemplateNotFound(f"Template not found: {template_key} at {path}")
+def _resolve_prompt_path(path_from_template: str) -> str:
+    # Resolve paths relative to repo root so templates can store "prompts/..../file.md"
+    if os.path.isabs(path_from_template):
+        return path_from_template
+    return os.path.join(settings.PHEONA_REPO_ROOT, path_from_template)
+
+def _read_text(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return f.read().strip()
+
+def _prompt_refs(template: Dict[str, Any]) -> List[Tuple[str, str]]:
+    refs = [(k, template[k]) for k in _PROMPT_PATH_KEYS if template.get(k)]
+    slots = template.get("slots")
+    if isinstance(slots, dict):
+        if not slots.get("system_prompt_path"):
+            raise ValueError("slots.system_prompt_path is required")
+        refs.append(("slots.system_prompt_path", slots["system_prompt_path"]))
+    return refs
+
+class _Snapshot:
+    def __init__(self):
+        self.templates: Dict[str, Dict[str, Any]] = {}
+        self.hashes: Dict[str, str] = {}
+        self.prompts: Dict[str, str] = {}        # path as written in the template → text
+        self.mtimes: Dict[str, float] = {}       # absolute file path → mtime at load
+        self.slots: Dict[str, SlotTemplate] = {}   # compiled render plans, slot templates only
+        self.catalog: List[Dict[str, Any]] = []
+        self.catalog_etag: str = ""
+
+    def build_catalog(self) -> None:
+        self.catalog = [_catalog_entry(key, self.templates[key], self.hashes[key]) for key in sorted(self.templates)]
+        self.catalog_etag = hashlib.sha256(
+            "\n".join(f"{e['key']}={e['content_hash']}" for e in self.catalog).encode("utf-8")
+        ).hexdigest()[:32]
+
+def _catalog_entry(key: str, template: Dict[str, Any], content_hash: str) -> Dict[str, Any]:
+    meta = template.get("metadata") or {}
+    return {
+        "key": key,
+        "name": meta.get("name") or key,
+        "industry": meta.get("industry"),
+        "subcategory": meta.get("subcategory"),
+        "use_case": meta.get("use_case"),
+        "version": template.get("version"),
+        "required_fields": list(template.get("required_fields") or []),
+        "defaults": template.get("defaults") or {},
+        "content_hash": content_hash,
+    }
+
+class TemplateRegistry:
+    def __init__(self, templates_dir: Optional[str] = None):
+        self._templates_dir = templates_dir
+        self._snap: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def templates_dir(self) -> str:
+        return self._templates_dir or settings.PHEONA_TEMPLATES_DIR
+
+    # ---------- loading ----------
+
+    def _scan(self) -> List[Tuple[str, str]]:
+        found: List[Tuple[str, str]] = []
+        for root, _dirs, files in os.walk(self.templates_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    key = os.path.relpath(path, self.templates_dir)[:-len(".json")].replace(os.sep, "/")
+                    found.append((key, path))
+        return sorted(found)
+
+    def _load_one(self, key: str, path: str, snap: _Snapshot) -> None:
+        started = time.perf_counter()
+        snap.mtimes[path] = os.path.getmtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            raw = f.read()
+        template = json.loads(raw)
+        if not isinstance(template, dict):
+            raise ValueError("template must be a JSON object")
+        declared = template.get("templateKey")
+        if declared and declared != key:
+            log.warning("Template %s declares templateKey=%s; serving it under its path key", path, declared)
+        if not template.get("system_prompt_base_path"):
+            raise ValueError("missing system_prompt_base_path")
+
+        h = hashlib.sha256(raw.encode("utf-8"))
+        for k, rel in _prompt_refs(template):
+            full = _resolve_prompt_path(rel)
+            if not os.path.exists(full):
+                raise PromptNotFound(f"{k} → {full}")
+            if rel not in snap.prompts:
+                snap.mtimes[full] = os.path.getmtime(full)
+                snap.prompts[rel] = _read_text(full)
+            h.update(b"\0" + rel.encode("utf-8") + b"\0" + snap.prompts[rel].encode("utf-8"))
+        spec = template.get("slots")
+        if spec:
+            snap.slots[key] = compile_slots(
+                spec, snap.prompts[spec["system_prompt_path"]], AgentBuilderPayload.model_fields
+            )
+        snap.templates[key] = template
+        snap.hashes[key] = h.hexdigest()
+        metrics.TEMPLATE_LOAD.observe(time.perf_counter() - started)
+
+    def load_all(self) -> None:
+        prev = self._snap
+        snap = _Snapshot()
+        for key, path in self._scan():
+            try:
+                self._load_one(key, path, snap)
+            except Exception as e:
+                log.error("Invalid template %s: %s", path, e)
+                snap.mtimes[path] = os.path.getmtime(path)
+                if prev and key in prev.templates:
+                    # Keep serving the last good version
+                    snap.templates[key] = prev.templates[key]
+                    snap.hashes[key] = prev.hashes[key]
+                    if key in prev.slots:
+                        snap.slots[key] = prev.slots[key]
+                    for _k, rel in _prompt_refs(prev.templates[key]):
+                        if rel in prev.prompts:
+                            snap.prompts.setdefault(rel, prev.prompts[rel])
+                            full = _resolve_prompt_path(rel)
+                            snap.mtimes.setdefault(full, prev.mtimes.get(full, 0.0))
+        snap.build_catalog()
+        with self._lock:
+            self._snap = snap
+        log.info("Loaded %d templates (%d prompt files)", len(snap.templates), len(snap.prompts))
+
+    def _current(self) -> _Snapshot:
+        snap = self._snap
+        if snap is None:
+            # First use outside the app lifespan (scripts); a duplicate load is harmless
+            self.load_all()
+            snap = self._snap
+        return snap
+
+    def changed(self) -> bool:
+        snap = self._snap
+        if snap is None:
+            return True
+        with self._lock:
+            mtimes = dict(snap.mtimes)
+        if {p for _, p in self._scan()} - set(mtimes):
+            return True
+        for path, mtime in mtimes.items():
+            try:
+                if os.path.getmtime(path) != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def refresh_if_changed(self) -> bool:
+        if not self.changed():
+            return False
+        self.load_all()
+        return True
+
+    async def watch(self, interval: float) -> None:
+        """mtime polling loop; stat calls run in a thread so the event loop never blocks."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await asyncio.to_thread(self.refresh_if_changed):
+                    log.info("Templates reloaded")
+            except Exception:
+                log.exception("Template reload failed")
+
+    # ---------- lookups (memory only) ----------
+
+    def get(self, template_key: str) -> Dict[str, Any]:
+        """Returns the parsed template. Shared across requests: treat as read-only."""
+        template = self._current().templates.get(template_key)
+        if template is None:
+            raise TemplateNotFound(f"Template not found: {template_key} at {_template_path(template_key)}")
+        return template
+
+    def prompt(self, path_from_template: str) -> str:
+        snap = self._current()
+        text = snap.prompts.get(path_from_template)
+        if text is None:
+            # Not referenced by any template: read once and keep it
+            candidate = _resolve_prompt_path(path_from_template)
+            if not os.path.exists(candidate):
+                raise PromptNotFound(f"Prompt file not found: {candidate}")
+            text, mtime = _read_text(candidate), os.path.getmtime(candidate)
+            # The watcher thread iterates the snapshot's dicts; only grow them under the lock
+            with self._lock:
+                text = snap.prompts.setdefault(path_from_template, text)
+                snap.mtimes.setdefault(candidate, mtime)
+        return text
+
+    def prompt_texts(self, template_key: str) -> List[str]:
+        """Every prompt file the template references, in declaration order."""
+        return [self.prompt(rel) for _k, rel in _prompt_refs(self.get(template_key))]
+
+    def content_hash(self, template_key: str) -> str:
+        self.get(template_key)
+        return self._current().hashes[template_key]
+
+    def slots(self, template_key: str) -> Optional[SlotTemplate]:
+        """Compiled render plan if the template declares slots, else None."""
+        return self._current().slots.get(template_key)
+
+    def keys(self) -> List[str]:
+        return sorted(self._current().templates)
+
+    def catalog(self, **filters: Optional[str]) -> Tuple[List[Dict[str, Any]], str]:
+        """Catalog entries matching every non-empty metadata filter, plus their ETag."""
+        snap = self._current()
+        active = {k: v for k, v in filters.items() if v}
+        if not active:
+            return snap.catalog, snap.catalog_etag
+        entries = [e for e in snap.catalog if all(e.get(k) == v for k, v in active.items())]
+        tag = hashlib.sha256(
+            (snap.catalog_etag + json.dumps(active, sort_keys=True)).encode("utf-8")
+        ).hexdigest()[:32]
+        return entries, tag
+
+registry = TemplateRegistry()
+
+def load_template(template_key: str) -> Dict[str, Any]:
+    return registry.get(template_key)
 
 def load_prompt_text(path_from_template: str) -> str:
-    # Resolve paths relative to repo root so templates can store "prompts/..../file.md"
-    candidate = path_from_template
-    if not os.path.isabs(candidate):
-        candidate = os.path.join(settings.PHEONA_REPO_ROOT, path_from_template)
-    if not os.path.exists(candidate):
-        raise PromptNotFound(f"Prompt file not found: {candidate}")
-    with open(candidate, "r", encoding="utf-8") as f:
-        return f.read().strip()
+    return registry.prompt(path_from_template)
 
 def check_required(template: Dict[str, Any], payload: Dict[str, Any]) -> List[str]:
     req = template.get("required_fields", [])
@@ -0,0 +1,321 @@
+# backend-api/app/tracing.py
+from __future__ import annotations
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import secrets
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import httpx
+from .config import settings
+
+"""
+Lightweight request tracing: W3C traceparent in, spans out.
+
+  with tracing.span("vapi.request", method="POST", endpoint="/assistant"):
+      ...
+
+TracingMiddleware opens a server span per request, continuing the caller's trace
+id from a `traceparent` header (the Streamlit client sends one per action) and
+returning it as X-Trace-Id; provisioning tasks carry it on to the worker. Spans
+nest through a ContextVar, so concurrent tasks spawned inside a request (the early
+number reservation, hedged LLM calls) attach to the right parent. Calls to third
+parties (Vapi) are recorded as client spans but get no traceparent header: trace
+ids stay inside our own services.
+
+Sampling is decided once per trace, from the trace id itself (so every process
+agrees without coordination): a trace is kept if its id falls under
+TRACE_SAMPLE_RATIO, or if the caller marked it sampled. Unsampled spans are a
+shared no-op object, so leaving tracing on costs a ContextVar read per span.
+
+Finished spans go to a bounded in-memory buffer (dropped, and counted, when full)
+that a background task flushes to the exporters in TRACE_EXPORTERS:
+  jsonl → one JSON object per span appended to TRACE_JSONL_PATH
+  otlp  → OTLP/HTTP JSON POSTed to TRACE_OTLP_ENDPOINT (e.g. a collector on :4318)
+"""
+
+log = logging.getLogger("pheona.tracing")
+
+SERVER, CLIENT, INTERNAL = 2, 3, 1   # OTLP span kinds
+_BUFFER_MAX = 10000
+_FLUSH_BATCH = 512
+
+class _Context:
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"[:500]
+
+class _NoopSpan:
+    __slots__ = ()
+    trace_id = span_id = ""
+    error: Optional[str] = None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass  # e.g. `span.error = ...` on an unsampled span: callers needn't check for NOOP
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+NOOP = _NoopSpan()
+
+_current: ContextVar[Optional[_Context]] = ContextVar("pheona_trace", default=None)
+_buffer: Deque[Span] = deque()
+_counters: Dict[str, int] = {"finished": 0, "dropped": 0, "exported": 0, "export_errors": 0}
+
+def enabled() -> bool:
+    return bool(settings.TRACE_EXPORTERS.strip())
+
+def _sampled(trace_id: str) -> bool:
+    # The low 56 bits of a W3C trace id are random; compare them against the ratio
+    ratio = settings.TRACE_SAMPLE_RATIO
+    return ratio >= 1.0 or int(trace_id[-14:], 16) < ratio * (1 << 56)
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span id, sampled flag) or None if absent/invalid."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[1] == "0" * 32:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    return parts[1].lower(), parts[2].lower(), bool(flags & 1)
+
+def current_traceparent() -> Optional[str]:
+    ctx = _current.get()
+    return ctx.traceparent() if ctx is not None else None
+
+def current_trace_id() -> Optional[str]:
+    ctx = _current.get()
+    return ctx.trace_id if ctx is not None else None
+
+@contextlib.contextmanager
+def trace(name: str, traceparent: Optional[str] = None, kind: int = INTERNAL, **attrs: Any) -> Iterator[Any]:
+    """
+    Root span of a unit of work: continues `traceparent` when given (an API request,
+    a provisioning task queued by one), otherwise starts a new trace.
+    """
+    if not enabled():
+        yield NOOP
+        return
+    incoming = parse_traceparent(traceparent)
+    if incoming is not None:
+        trace_id, parent_id, flagged = incoming
+    else:
+        trace_id, parent_id, flagged = secrets.token_hex(16), "", False
+    sampled = flagged or _sampled(trace_id)
+    # Unsampled: nothing is recorded, but children and queued tasks still share the id
+    root = _Context(trace_id, parent_id or ("" if sampled else secrets.token_hex(8)), sampled)
+    token = _current.set(root)
+    try:
+        with span(name, kind, **attrs) as s:
+            yield s
+    finally:
+        _current.reset(token)
+
+@contextlib.contextmanager
+def span(name: str, kind: int = INTERNAL, **attrs: Any) -> Iterator[Any]:
+    """Child of the current span; a no-op outside a sampled trace."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        yield NOOP
+        return
+    s = Span(name, kind, parent.trace_id, parent.span_id or None, attrs)
+    token = _current.set(_Context(s.trace_id, s.span_id, True))
+    try:
+        yield s
+    except BaseException as e:
+        if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+            s.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        _finish(s)
+
+def record(name: str, start_ns: int, kind: int = INTERNAL, error: Optional[BaseException] = None,
+           **attrs: Any) -> None:
+    """
+    A finished child of the current span, without entering it. For work that spans
+    yields of an async generator, where a ContextVar set would leak to the consumer.
+    """
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    s = Span(name, kind, parent.trace_id, parent.span_id or None, attrs)
+    s.start_ns = start_ns
+    if error is not None:
+        s.record_error(error)
+    _finish(s)
+
+def _finish(s: Span) -> None:
+    s.end_ns = time.time_ns()
+    _counters["finished"] += 1
+    if len(_buffer) >= _BUFFER_MAX:
+        _counters["dropped"] += 1
+        return
+    _buffer.append(s)
+
+# ---------------- ASGI middleware ----------------
+
+class TracingMiddleware:
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+        incoming = None
+        for key, value in scope.get("headers", []):
+            if key == b"traceparent":
+                incoming = value.decode("latin-1")
+                break
+        status = 500
+        with trace(f"{scope.get('method', '')} {scope.get('path', '')}", incoming, SERVER,
+                   **{"http.method": scope.get("method", ""), "http.target": scope.get("path", "")}) as s:
+            trace_id = (current_trace_id() or "").encode("ascii")
+
+            async def _send(message: Dict[str, Any]) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-trace-id", trace_id)]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                route = scope.get("route")
+                if s is not NOOP:
+                    if route is not None:
+                        s.name = f"{scope.get('method', '')} {route.path}"
+                        s.set(**{"http.route": route.path})
+                    s.set(**{"http.status_code": status})
+                    if status >= 500 and s.error is None:
+                        s.error = f"HTTP {status}"
+
+# ---------------- exporters ----------------
+
+def _attr_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_body(spans: List[Span]) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": settings.TRACE_SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "pheona"}, "spans": [{
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _attr_value(v)} for k, v in s.attrs.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        } for s in spans]}],
+    }]}
+
+def _jsonl_line(s: Span) -> str:
+    return json.dumps({
+        "trace_id": s.trace_id,
+        "span_id": s.span_id,
+        "parent_id": s.parent_id,
+        "name": s.name,
+        "kind": {SERVER: "server", CLIENT: "client"}.get(s.kind, "internal"),
+        "start": s.start_ns / 1e9,
+        "duration_ms": round((s.end_ns - s.start_ns) / 1e6, 3),
+        "attrs": s.attrs,
+        "error": s.error,
+    }, default=str)
+
+def _write_jsonl(spans: List[Span]) -> None:
+    path = settings.TRACE_JSONL_PATH
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(_jsonl_line(s) + "\n" for s in spans))
+
+def _otlp_headers() -> Dict[str, str]:
+    # "k1=v1,k2=v2", as in OTEL_EXPORTER_OTLP_HEADERS
+    out = {"Content-Type": "application/json"}
+    for pair in settings.TRACE_OTLP_HEADERS.split(","):
+        key, _, value = pair.partition("=")
+        if key.strip():
+            out[key.strip()] = value.strip()
+    return out
+
+async def flush(client: Optional[httpx.AsyncClient] = None) -> int:
+    """Exports everything buffered so far; returns the number of spans exported."""
+    exporters = {e.strip() for e in settings.TRACE_EXPORTERS.split(",") if e.strip()}
+    total = 0
+    while _buffer:
+        batch = [_buffer.popleft() for _ in range(min(_FLUSH_BATCH, len(_buffer)))]
+        try:
+            if "jsonl" in exporters:
+                await asyncio.to_thread(_write_jsonl, batch)
+            if "otlp" in exporters and client is not None:
+                res = await client.post(settings.TRACE_OTLP_ENDPOINT, json=_otlp_body(batch), headers=_otlp_headers())
+                res.raise_for_status()
+        except Exception as e:
+            _counters["export_errors"] += 1
+            log.warning("Trace export of %d spans failed: %s", len(batch), e)
+            continue
+        _counters["exported"] += len(batch)
+        total += len(batch)
+    return total
+
+async def run_exporter(interval: float = 2.0) -> None:
+    """Background task for the life of the process; flushes once more on cancel."""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await flush(client)
+        finally:
+            await asyncio.shield(flush(client))
+
+def stats() -> Dict[str, Any]:
+    return {**_counters, "buffered": len(_buffer), "sample_ratio": settings.TRACE_SAMPLE_RATIO,
+            "exporters": settings.TRACE_EXPORTERS}
@@ -1,5 +1,6 @@
 # backend-api/app/utils.py
 import re, secrets, string, unicodedata
+from typing import Optional
 
 def slugify(value: str) -> str:
     value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
@@ -12,3 +13,9 @@ def short_id(n: int = 6) -> str:
 
 def new_edit_token() -> str:
     return secrets.token_urlsafe(24)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -3,9 +3,11 @@ from __future__ import annotations
 import asyncio
 import logging
 import re
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Iterable
 
 import httpx
+from . import metrics, tracing
 from .config import settings
 
 log = logging.getLogger("pheona.vapi")
@@ -18,6 +20,98 @@ def _headers() -> Dict[str, str]:
     }
 
 
+# ---------------- Shared HTTP client ----------------
+# One pooled AsyncClient per process so repeated calls (incl. every readiness poll)
+# reuse a warm TCP+TLS connection. Opened/closed by the FastAPI lifespan; built lazily
+# for scripts that never run the app.
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_enabled() -> bool:
+    if not settings.VAPI_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  (httpx[http2] extra)
+    except ImportError:
+        log.warning("VAPI_HTTP2 is on but the 'h2' package is missing; falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=settings.VAPI_BASE_URL,
+        headers=_headers(),
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=settings.VAPI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.VAPI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.VAPI_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(settings.VAPI_TIMEOUT_SECONDS, connect=settings.VAPI_CONNECT_TIMEOUT_SECONDS),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def startup() -> None:
+    get_http_client()
+
+
+async def shutdown() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _request(method: str, path: str, **kwargs: Any) -> httpx.Response:
+    """
+    Sends one request on the shared client and logs latency split into
+    connect time (0 when a pooled connection is reused) and server time
+    (request fully sent → response headers received).
+    """
+    marks: Dict[str, float] = {}
+
+    async def _trace(event: str, info: Dict[str, Any]) -> None:
+        marks[event] = time.perf_counter()
+
+    endpoint = metrics.vapi_endpoint(path)
+    # No traceparent header: Vapi is a third party, our trace ids stay in-house
+    with tracing.span(f"vapi {method} {endpoint}", tracing.CLIENT, method=method, endpoint=endpoint) as span:
+        started = time.perf_counter()
+        try:
+            res = await get_http_client().request(method, path, extensions={"trace": _trace}, **kwargs)
+        except httpx.TransportError:
+            metrics.observe_vapi(method, path, None, time.perf_counter() - started)
+            raise
+        total = time.perf_counter() - started
+        metrics.observe_vapi(method, path, res.status_code, total)
+        span.set(status=res.status_code)
+        if res.is_error:
+            span.error = f"HTTP {res.status_code}"
+
+    connect = 0.0
+    if "connection.connect_tcp.started" in marks:
+        connect_done = marks.get("connection.start_tls.complete") or marks.get("connection.connect_tcp.complete", started)
+        connect = connect_done - marks["connection.connect_tcp.started"]
+    sent = next((t for e, t in marks.items() if e.endswith("send_request_body.complete")), None)
+    headers_in = next((t for e, t in marks.items() if e.endswith("receive_response_headers.complete")), None)
+    server = (headers_in - sent) if (sent is not None and headers_in is not None) else total - connect
+
+    log.info(
+        "Vapi %s %s -> %s in %.1fms (connect %.1fms, server %.1fms, %s)",
+        method, path, res.status_code, total * 1000, connect * 1000, server * 1000, res.http_version,
+    )
+    return res
+
+
 # ---------------- Assistants ----------------
 
 async def create_assistant(
@@ -34,25 +128,62 @@ async def create_assistant(
     POST /assistant
     Body includes name, firstMessage and model (provider/model/messages).
     """
-    provider = (model_provider or "openai").strip()
-    model = (model_name or "gpt-4o-mini").strip()
-
     payload: Dict[str, Any] = {
         "name": name,
         "firstMessage": first_message,
-        "model": {
-            "provider": provider,
-            "model": model,
-            "messages": [{"role": "system", "content": system_prompt}],
-        },
+        "model": _model_block(system_prompt, model_provider, model_name),
+    }
+
+    res = await _request("POST", "/assistant", json=payload)
+    if res.is_error:
+        log.error("Vapi /assistant error %s: %s", res.status_code, res.text)
+        res.raise_for_status()
+    return res.json()
+
+
+def _model_block(system_prompt: str, model_provider: Optional[str], model_name: Optional[str]) -> Dict[str, Any]:
+    return {
+        "provider": (model_provider or "openai").strip(),
+        "model": (model_name or "gpt-4o-mini").strip(),
+        "messages": [{"role": "system", "content": system_prompt}],
     }
 
-    async with httpx.AsyncClient(base_url=settings.VAPI_BASE_URL, timeout=30.0) as client:
-        res = await client.post("/assistant", headers=_headers(), json=payload)
-        if res.is_error:
-            log.error("Vapi /assistant error %s: %s", res.status_code, res.text)
-            res.raise_for_status()
-        return res.json()
+
+async def update_assistant(
+    assistant_id: str,
+    *,
+    name: Optional[str] = None,
+    system_prompt: Optional[str] = None,
+    first_message: Optional[str] = None,
+    model_provider: Optional[str] = None,
+    model_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    PATCH /assistant/:id with only the parts that changed.
+    `model` is replaced as a whole by Vapi, so it is resent whenever the prompt changes.
+    """
+    payload: Dict[str, Any] = {}
+    if name is not None:
+        payload["name"] = name
+    if first_message is not None:
+        payload["firstMessage"] = first_message
+    if system_prompt is not None:
+        payload["model"] = _model_block(system_prompt, model_provider, model_name)
+    if not payload:
+        return {}
+
+    res = await _request("PATCH", f"/assistant/{assistant_id}", json=payload)
+    if res.is_error:
+        log.error("Vapi PATCH /assistant error %s: %s", res.status_code, res.text)
+        res.raise_for_status()
+    return res.json()
+
+
+async def delete_assistant(assistant_id: str) -> None:
+    res = await _request("DELETE", f"/assistant/{assistant_id}")
+    if res.is_error:
+        log.error("Vapi DELETE /assistant/%s error %s: %s", assistant_id, res.status_code, res.text)
+        res.raise_for_status()
 
 
 # ---------------- Phone Numbers ----------------
@@ -60,6 +191,7 @@ async def create_assistant(
 #   POST  /phone-number    → create (free Vapi number supported)  :contentReference[oaicite:0]{index=0}
 #   GET   /phone-number/:id → fetch details incl. E.164 "number"  :contentReference[oaicite:1]{index=1}
 #   DEL   /phone-number/:id → delete (cleanup on timeout)          :contentReference[oaicite:2]{index=2}
+#   PATCH /phone-number/:id → attach the assistant to a number reserved before it existed
 
 _HINT_CODE_RE = re.compile(r"\b(\d{3})\b")
 
@@ -70,63 +202,68 @@ def _parse_suggested_area_codes(msg: str) -> List[str]:
 
 
 async def _post_create_number(payload: Dict[str, Any]) -> Dict[str, Any]:
-    async with httpx.AsyncClient(base_url=settings.VAPI_BASE_URL, timeout=30.0) as client:
-        res = await client.post("/phone-number", headers=_headers(), json=payload)
-        if res.is_error:
-            log.error("Vapi phone number create error %s: %s", res.status_code, res.text)
-            res.raise_for_status()
-        return res.json()
+    res = await _request("POST", "/phone-number", json=payload)
+    if res.is_error:
+        log.error("Vapi phone number create error %s: %s", res.status_code, res.text)
+        res.raise_for_status()
+    return res.json()
 
 
 async def _get_phone_number(phone_number_id: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient(base_url=settings.VAPI_BASE_URL, timeout=30.0) as client:
-        res = await client.get(f"/phone-number/{phone_number_id}", headers=_headers())
-        if res.is_error:
-            log.error("Vapi GET /phone-number/%s error %s: %s", phone_number_id, res.status_code, res.text)
-            res.raise_for_status()
-        return res.json()
+    res = await _request("GET", f"/phone-number/{phone_number_id}")
+    if res.is_error:
+        log.error("Vapi GET /phone-number/%s error %s: %s", phone_number_id, res.status_code, res.text)
+        res.raise_for_status()
+    return res.json()
 
 
 async def _delete_phone_number(phone_number_id: str) -> None:
-    async with httpx.AsyncClient(base_url=settings.VAPI_BASE_URL, timeout=30.0) as client:
-        res = await client.delete(f"/phone-number/{phone_number_id}", headers=_headers())
-        if res.is_error:
-            log.error("Vapi DELETE /phone-number/%s error %s: %s", phone_number_id, res.status_code, res.text)
-            res.raise_for_status()
+    res = await _request("DELETE", f"/phone-number/{phone_number_id}")
+    if res.is_error:
+        log.error("Vapi DELETE /phone-number/%s error %s: %s", phone_number_id, res.status_code, res.text)
+        res.raise_for_status()
 
 
-async def create_phone_number(
-    assistant_id: str,
+async def attach_phone_number(phone_number_id: str, assistant_id: str) -> Dict[str, Any]:
+    """PATCH /phone-number/{id}: route calls on a number reserved before its assistant existed."""
+    res = await _request("PATCH", f"/phone-number/{phone_number_id}", json={"assistantId": assistant_id})
+    if res.is_error:
+        log.error("Vapi PATCH /phone-number/%s error %s: %s", phone_number_id, res.status_code, res.text)
+        res.raise_for_status()
+    return res.json()
+
+
+def phone_number_e164(pn: Dict[str, Any]) -> Optional[str]:
+    e164 = pn.get("number") or pn.get("e164") or pn.get("phone")
+    return e164.strip() if isinstance(e164, str) and e164.strip() else None
+
+
+async def reserve_phone_number(
+    assistant_id: Optional[str],
     label: Optional[str] = None,
     *,
     # start with a few good bets; we’ll append hints from API responses dynamically
     seed_area_codes: Optional[List[str]] = None,
-    poll_interval: float = 10.0,   # Vapi can take up to ~2 minutes to be routable
-    poll_timeout: float = 180.0    # poll up to 3 minutes for E.164 assignment
+    on_progress: Optional[Callable[[int, Optional[str]], Awaitable[None]]] = None,
+    # awaited with (area code, accepted?, hinted codes) after every POST attempt
+    on_area_code: Optional[Callable[[str, bool, List[str]], Awaitable[None]]] = None,
 ) -> Dict[str, Any]:
     """
-    Provision a *free* Vapi-managed number and attach it to the assistant.
-
-    Body (Vapi provider):
-      {
-        "provider": "vapi",
-        "assistantId": "<uuid>",
-        "name": "...",                       # optional
-        "numberDesiredAreaCode": "510"       # optional, but we’ll use + retry with hints
-      }
-
-    Strategy:
-      1) Try a list of area codes (includes hinted codes from API errors).
-      2) As soon as creation returns an `id`, poll GET /phone-number/{id}
-         until the E.164 number appears (or timeout).
-      3) If we time out without ever getting a number, delete the stub entry.
+    POST /phone-number, walking area codes (seed list + hints from API errors)
+    until Vapi accepts one. Returns the created record; the E.164 number may not
+    be assigned yet (see wait_for_phone_number). Without an assistant_id the number
+    is created unattached; see attach_phone_number.
     """
-    base: Dict[str, Any] = {
-        "provider": "vapi",
-        "assistantId": assistant_id,
-    }
+    base: Dict[str, Any] = {"provider": "vapi"}
+    if assistant_id:
+        base["assistantId"] = assistant_id
     if label:
         base["name"] = label
+    if settings.VAPI_WEBHOOK_URL:
+        # Let Vapi push number events to /v1/vapi/webhook so waiters wake up immediately
+        base["server"] = {"url": settings.VAPI_WEBHOOK_URL}
+        if settings.VAPI_WEBHOOK_SECRET:
+            base["server"]["secret"] = settings.VAPI_WEBHOOK_SECRET
 
     # Build retry list: seed → (later) hints from API responses
     attempts: List[str] = list(seed_area_codes or ["510", "518", "904", "509", "415", "407"])
@@ -134,43 +271,67 @@ async def create_phone_number(
     last_exc: Optional[httpx.HTTPStatusError] = None
 
     # Try each area code (Vapi sometimes rejects particular codes; it responds with suggested ones)
+    tried = 0
     for code in attempts:
+        tried += 1
+        if on_progress:
+            await on_progress(tried, None)
         try:
             payload = {**base, "numberDesiredAreaCode": code}
             created = await _post_create_number(payload)
             log.info("Vapi number created with area code %s; id=%s", code, created.get("id"))
+            if on_area_code:
+                await on_area_code(code, True, [])
             break
         except httpx.HTTPStatusError as e:
             body = e.response.text if e.response is not None else ""
+            hints = _parse_suggested_area_codes(body)
+            if on_area_code:
+                await on_area_code(code, False, hints)
             # If API hints new codes, append them to the attempts list
-            for hint in _parse_suggested_area_codes(body):
+            for hint in hints:
                 if hint not in attempts:
                     attempts.append(hint)
             last_exc = e
             continue
 
+    metrics.AREA_CODE_ATTEMPTS.labels("reserved" if created else "exhausted").observe(tried)
     if not created:
         # Exhausted all attempts
         raise last_exc or RuntimeError("Unable to create a Vapi number")
+    if on_progress and created.get("id"):
+        await on_progress(tried, created["id"])
+    return created
 
-    phone_id = created.get("id")
-    if not phone_id:
-        # Defensive: return whatever we got; caller may re-fetch via the list endpoint
-        return created
 
-    # Poll for the E.164 number to show up
-    start = asyncio.get_event_loop().time()
-    while (asyncio.get_event_loop().time() - start) < poll_timeout:
+async def wait_for_phone_number(
+    phone_id: str,
+    *,
+    poll_interval: float = 10.0,   # Vapi can take up to ~2 minutes to be routable
+    poll_timeout: float = 180.0,
+    schedule: Optional[Iterable[float]] = None,
+    sleep: Optional[Callable[[float], Awaitable[Any]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Polls GET /phone-number/{id} until the E.164 number appears; None on timeout.
+    `schedule` yields the delay before each re-check (default: fixed poll_interval);
+    `sleep` may return early, e.g. when a webhook reports the number is ready.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    delays = iter(schedule) if schedule is not None else None
+    sleep = sleep or asyncio.sleep
+    checks = 0
+    while (loop.time() - start) < poll_timeout:
         pn = await _get_phone_number(phone_id)
-        e164 = pn.get("number") or pn.get("e164") or pn.get("phone")
-        if isinstance(e164, str) and e164.strip():
+        checks += 1
+        if phone_number_e164(pn):
+            metrics.POLL_ITERATIONS.labels("ready").observe(checks)
             return pn
-        await asyncio.sleep(poll_interval)
-
-    # If we never saw a number, delete the dangling record to keep the org clean
-    try:
-        await _delete_phone_number(phone_id)
-        log.warning("Deleted unprovisioned Vapi number id=%s after timeout", phone_id)
-    except Exception as e:
-        log.error("Failed to delete unprovisioned number id=%s: %s", phone_id, e)
-    return created  # best-effort: return what we have
+        delay = next(delays) if delays is not None else poll_interval
+        remaining = poll_timeout - (loop.time() - start)
+        if remaining <= 0:
+            break
+        await sleep(min(delay, remaining))
+    metrics.POLL_ITERATIONS.labels("timeout").observe(checks)
+    return None
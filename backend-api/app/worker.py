@@ -0,0 +1,178 @@
+# backend-api/app/worker.py
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import random
+import signal
+import socket
+from typing import Any, Dict, Optional, Set
+import redis.asyncio as aioredis
+from prometheus_client import start_http_server
+from redis.exceptions import ResponseError
+from . import provisioning, tracing, vapi_client
+from .config import settings
+from .redis_client import get_async_client, close_async_client
+
+"""
+Provisioning worker: drains provisioning:tasks with a Redis consumer group.
+
+Run standalone with `python -m app.worker` (any number of processes/pods), or let the
+API run one in-process when PROVISIONING_INLINE_WORKER is on.
+
+- Leases: a task stays pending in the group while we work on it; a heartbeat re-claims it
+  every lease/3 seconds. Entries idle longer than PROVISIONING_LEASE_SECONDS (dead worker)
+  are taken over with XAUTOCLAIM.
+- Retries: failures are re-queued through provisioning:delayed with exponential backoff
+  and jitter, up to PROVISIONING_MAX_RETRIES, then marked failed.
+- Resume: provisioning.process() restarts from the stored phone-number id.
+"""
+
+log = logging.getLogger("pheona.worker")
+
+class ProvisioningWorker:
+    def __init__(self, redis: Optional[aioredis.Redis] = None, consumer: Optional[str] = None,
+                 concurrency: Optional[int] = None):
+        self.redis = redis or get_async_client()
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = max(1, concurrency or settings.PROVISIONING_WORKER_CONCURRENCY)
+        self.lease = settings.PROVISIONING_LEASE_SECONDS
+        self._inflight: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(provisioning.STREAM, provisioning.GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        await self.ensure_group()
+        log.info("Provisioning worker %s started (concurrency=%d)", self.consumer, self.concurrency)
+        loop = asyncio.get_running_loop()
+        next_reclaim = 0.0
+        while not self._stopping.is_set():
+            try:
+                await provisioning.promote_due(self.redis)
+                if loop.time() >= next_reclaim:
+                    await self._reclaim_stale()
+                    next_reclaim = loop.time() + self.lease / 2
+
+                free = self.concurrency - len(self._inflight)
+                if free <= 0:
+                    await asyncio.wait(self._inflight, timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                resp = await self.redis.xreadgroup(
+                    provisioning.GROUP, self.consumer, {provisioning.STREAM: ">"}, count=free, block=1000
+                )
+                for _stream, entries in resp or []:
+                    for entry_id, fields in entries:
+                        self._spawn(entry_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Worker loop error; backing off")
+                await asyncio.sleep(1.0)
+
+        # Let in-flight tasks finish; anything unfinished is re-claimed by another worker
+        if self._inflight:
+            await asyncio.wait(self._inflight, timeout=self.lease)
+        log.info("Provisioning worker %s stopped", self.consumer)
+
+    def _spawn(self, entry_id: str, fields: Dict[str, Any]) -> None:
+        task = asyncio.create_task(self._handle(entry_id, fields))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _reclaim_stale(self) -> None:
+        free = self.concurrency - len(self._inflight)
+        if free <= 0:
+            return
+        resp = await self.redis.xautoclaim(
+            provisioning.STREAM, provisioning.GROUP, self.consumer,
+            min_idle_time=int(self.lease * 1000), start_id="0-0", count=free,
+        )
+        for entry_id, fields in resp[1]:
+            if fields:  # deleted entries come back empty
+                log.warning("Re-claimed stale provisioning task %s (%s)", entry_id, fields.get("slug"))
+                self._spawn(entry_id, fields)
+
+    async def _heartbeat(self, entry_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await self.redis.xclaim(
+                provisioning.STREAM, provisioning.GROUP, self.consumer,
+                min_idle_time=0, message_ids=[entry_id], justid=True,
+            )
+
+    async def _handle(self, entry_id: str, fields: Dict[str, Any]) -> None:
+        slug = fields.get("slug")
+        retry = int(fields.get("retry") or 0)
+        heartbeat = asyncio.create_task(self._heartbeat(entry_id))
+        try:
+            error: Optional[str] = None
+            try:
+                # Same trace as the create that queued the task
+                with tracing.trace("provision", fields.get("traceparent"), slug=slug or "", retry=retry):
+                    await provisioning.process(fields, self.redis)
+            except Exception as e:
+                error = _describe(e)
+            # Nobody awaits this task, so a failure here has to be logged here; the unacked
+            # entry is re-claimed once its lease lapses
+            try:
+                await self._record_outcome(entry_id, fields, retry, error)
+            except Exception:
+                log.exception("Recording outcome for %s failed; entry left for reclaim", slug)
+        finally:
+            heartbeat.cancel()
+
+    async def _record_outcome(self, entry_id: str, fields: Dict[str, Any], retry: int, error: Optional[str]) -> None:
+        slug = fields.get("slug")
+        if error is not None:
+            if retry < settings.PROVISIONING_MAX_RETRIES:
+                delay = _backoff(retry)
+                log.warning("Provisioning %s failed (retry %d in %.0fs): %s", slug, retry + 1, delay, error)
+                await provisioning.update_state(slug, self.redis, retries=retry + 1, error=error[:500])
+                await provisioning.schedule_retry({**fields, "retry": retry + 1}, delay, self.redis)
+            else:
+                log.error("Provisioning %s failed permanently: %s", slug, error)
+                await provisioning.fail(slug, error, self.redis)
+        # Only ack once the outcome (ready / retry scheduled / failed) is recorded
+        await self.redis.xack(provisioning.STREAM, provisioning.GROUP, entry_id)
+        await self.redis.xdel(provisioning.STREAM, entry_id)
+
+def _backoff(retry: int) -> float:
+    base = settings.PROVISIONING_RETRY_BASE_SECONDS * (2 ** retry)
+    return min(settings.PROVISIONING_RETRY_MAX_SECONDS, base) * random.uniform(0.5, 1.0)
+
+def _describe(e: Exception) -> str:
+    response = getattr(e, "response", None)
+    if response is not None:
+        return f"{response.status_code}: {response.text}"
+    return str(e) or e.__class__.__name__
+
+async def _main() -> None:
+    worker = ProvisioningWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    if settings.METRICS_WORKER_PORT:
+        start_http_server(settings.METRICS_WORKER_PORT)
+    exporter = asyncio.create_task(tracing.run_exporter()) if tracing.enabled() else None
+    await vapi_client.startup()
+    try:
+        await worker.run()
+    finally:
+        if exporter is not None:
+            exporter.cancel()
+            await asyncio.gather(exporter, return_exceptions=True)
+        await vapi_client.shutdown()
+        await close_async_client()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main())
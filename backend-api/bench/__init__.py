@@ -0,0 +1,21 @@
+# backend-api/bench/__init__.py
+"""
+Load/latency bench for the API, run against in-process fakes of Groq and Vapi and
+fakeredis (or a real Redis with --redis-url; use a scratch database).
+
+  pip install -r bench/requirements.txt
+  python -m bench run --scenarios preview,create,load --requests 200 --concurrency 20 \
+      --llm-latency 0.4 --llm-tps 400 --number-ready-after 3 --reject-area-codes 212 \
+      --area-codes 212,415 --drain-timeout 60 --out bench/results/base.json
+  python -m bench compare bench/results/base.json bench/results/new.json --max-regression 10
+
+Settings can be overridden per run with --env KEY=VALUE (e.g. --env SPEC_CACHE_MAX_ENTRIES=0).
+
+Result JSON:
+  meta       label, started_at, duration_s, git_sha, python, redis
+  config     load shape and fake upstream parameters
+  scenarios  per scenario: requests, ok, errors, status_counts, wall_s, throughput_rps,
+             latency_ms {mean, p50, p95, p99, max}, upstream {llm, vapi} call counts,
+             redis_ops per command; preview_stream adds first_event_ms, create with
+             --drain-timeout adds provisioning {ready, failed, pending, time_to_ready_ms}
+"""
@@ -0,0 +1,162 @@
+# backend-api/bench/__main__.py
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+"""
+CLI: `python -m bench run ...` and `python -m bench compare BASE NEW` (see bench/__init__.py).
+
+The app reads its settings at import, so `run` fills in the environment before
+importing anything from it.
+"""
+
+log = logging.getLogger("pheona.bench")
+
+# Required settings; the fakes never look at them
+_PLACEHOLDER_ENV = {"BACKEND_API_KEY": "bench", "VAPI_API_KEY": "bench", "GROQ_API_KEY": "bench"}
+
+def _codes(value: str) -> List[str]:
+    return [c.strip() for c in value.split(",") if c.strip()]
+
+def _add_run_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--scenarios", default="preview,create,load",
+                   help="comma-separated: preview, preview_stream, create, load")
+    p.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    p.add_argument("--concurrency", type=int, default=10, help="clients in flight")
+    p.add_argument("--distinct", type=int, default=0,
+                   help="distinct payloads to cycle through (0 = every request differs, i.e. no cache hits)")
+    p.add_argument("--area-codes", type=_codes, default=[], help="area codes requested by create, in rotation")
+    p.add_argument("--drain-timeout", type=float, default=0.0,
+                   help="after create, wait up to this long for numbers to be provisioned (0 = don't)")
+    p.add_argument("--seed-agents", type=int, default=20, help="agents to create for load when create didn't run")
+    p.add_argument("--redis-url", default=None, help="real Redis instead of fakeredis")
+    p.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM time to first token (s)")
+    p.add_argument("--llm-tps", type=float, default=500.0, help="fake LLM output tokens per second")
+    p.add_argument("--llm-output-tokens", type=int, default=600, help="fake LLM reply length in tokens")
+    p.add_argument("--vapi-assistant-latency", type=float, default=0.3, help="fake Vapi assistant create (s)")
+    p.add_argument("--vapi-latency", type=float, default=0.02, help="fake Vapi latency of other calls (s)")
+    p.add_argument("--number-ready-after", type=float, default=2.0,
+                   help="seconds until a fake number has its E.164 assigned")
+    p.add_argument("--reject-area-codes", type=_codes, default=[], help="area codes the fake Vapi always rejects")
+    p.add_argument("--reject-rate", type=float, default=0.0, help="fraction of other area codes rejected")
+    p.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="setting override (repeatable)")
+    p.add_argument("--label", default="", help="free-form name stored in meta")
+    p.add_argument("--out", default=None, help="write the result JSON here (default: stdout)")
+    p.add_argument("-v", "--verbose", action="store_true", help="show app logs")
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    from . import runner
+    from .fakes import FakeLLMBackend, FakeVapi
+
+    llm = FakeLLMBackend(latency=args.llm_latency, tokens_per_second=args.llm_tps,
+                         output_tokens=args.llm_output_tokens)
+    vapi = FakeVapi(assistant_latency=args.vapi_assistant_latency, base_latency=args.vapi_latency,
+                    ready_after=args.number_ready_after, reject_area_codes=set(args.reject_area_codes),
+                    reject_rate=args.reject_rate)
+    result = await runner.run(
+        scenarios=_codes(args.scenarios), requests=args.requests, concurrency=args.concurrency,
+        distinct=args.distinct, area_codes=args.area_codes, drain_timeout=args.drain_timeout,
+        seed_agents=args.seed_agents, redis_url=args.redis_url, llm=llm, vapi=vapi, label=args.label,
+    )
+    result["config"]["env"] = dict(kv.split("=", 1) for kv in args.env)
+    return result
+
+def _print_summary(result: Dict[str, Any]) -> None:
+    print(f"{'scenario':<15} {'reqs':>6} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}  upstream",
+          file=sys.stderr)
+    for name, s in result["scenarios"].items():
+        lat = s["latency_ms"]
+        calls = sum(s["upstream"]["llm"].values()), sum(s["upstream"]["vapi"].values())
+        print(f"{name:<15} {s['requests']:>6} {s['errors']:>5} {s['throughput_rps']:>8.1f} "
+              f"{lat.get('p50', 0):>9.1f} {lat.get('p95', 0):>9.1f} {lat.get('p99', 0):>9.1f}  "
+              f"llm={calls[0]} vapi={calls[1]}", file=sys.stderr)
+        if "provisioning" in s:
+            prov = s["provisioning"]
+            ready = prov.get("time_to_ready_ms", {})
+            print(f"{'':<15} provisioning ready={prov.get('ready', 0)} failed={prov.get('failed', 0)} "
+                  f"pending={prov.get('pending', 0)} time_to_ready p50={ready.get('p50', 0):.0f}ms "
+                  f"p95={ready.get('p95', 0):.0f}ms", file=sys.stderr)
+
+# ---------------- compare ----------------
+
+_HIGHER_IS_BETTER = {"throughput_rps"}
+
+def _metrics(scenario: Dict[str, Any]) -> Dict[str, float]:
+    out = {"throughput_rps": scenario["throughput_rps"], "errors": scenario["errors"]}
+    out.update({f"{k}_ms": v for k, v in scenario["latency_ms"].items()})
+    out["llm_calls"] = sum(scenario["upstream"]["llm"].values())
+    out["vapi_calls"] = sum(scenario["upstream"]["vapi"].values())
+    out["redis_ops"] = sum(scenario["redis_ops"].values())
+    return out
+
+def _change(base: float, new: float) -> Optional[float]:
+    return None if not base else (new - base) / base * 100.0
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], max_regression: Optional[float]) -> int:
+    """Prints a per-scenario table; returns 1 if p95 or throughput regressed past max_regression %."""
+    failed = []
+    for name in base["scenarios"]:
+        if name not in new["scenarios"]:
+            print(f"{name}: missing from {new['meta'].get('label') or 'new run'}")
+            continue
+        print(f"\n{name}")
+        b, n = _metrics(base["scenarios"][name]), _metrics(new["scenarios"][name])
+        for key in b:
+            pct = _change(b[key], n.get(key, 0))
+            shown = f"{pct:+.1f}%" if pct is not None else ""
+            print(f"  {key:<16} {b[key]:>12.2f} {n.get(key, 0):>12.2f} {shown:>9}")
+            if max_regression is None or pct is None or key not in ("p95_ms", "throughput_rps"):
+                continue
+            worse = -pct if key in _HIGHER_IS_BETTER else pct
+            if worse > max_regression:
+                failed.append(f"{name} {key} {pct:+.1f}%")
+    if failed:
+        print(f"\nRegressions beyond {max_regression}%: {', '.join(failed)}")
+        return 1
+    return 0
+
+def _main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="API load/latency bench against fakes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    _add_run_args(sub.add_parser("run", help="run scenarios and emit result JSON"))
+    cmp = sub.add_parser("compare", help="diff two result files")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--max-regression", type=float, default=None,
+                     help="exit 1 if p95 or throughput is worse by more than this percentage")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.base) as f1, open(args.new) as f2:
+            return compare(json.load(f1), json.load(f2), args.max_regression)
+
+    for key, value in _PLACEHOLDER_ENV.items():
+        os.environ.setdefault(key, value)
+    for kv in args.env:
+        key, sep, value = kv.partition("=")
+        if not sep:
+            parser.error(f"--env expects KEY=VALUE, got {kv!r}")
+        os.environ[key] = value
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not args.verbose:
+        log.setLevel(logging.INFO)
+
+    result = asyncio.run(_run(args))
+    _print_summary(result)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        if os.path.dirname(args.out):
+            os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,124 @@
+# backend-api/bench/fakes.py
+from __future__ import annotations
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import httpx
+from app.specializer_backends import SpecializerBackend
+
+"""
+In-process stand-ins for the upstreams, with tunable latency.
+
+FakeLLMBackend plugs into the specializer router in place of Groq: each call waits
+`latency` (time to first token), then emits `output_tokens` at `tokens_per_second`
+(~4 characters per token), as one reply or as a stream.
+
+FakeVapi is an httpx transport serving the Vapi endpoints the app uses: assistant
+create/patch/delete after `assistant_latency`, phone-number create (rejecting the
+area codes in `reject_area_codes`, plus `reject_rate` of the others, with Vapi's
+"Try one of …" hint), and numbers that get their E.164 assignment `ready_after`
+seconds after creation. Every other call takes `base_latency`.
+
+Both count calls so a run can report upstream traffic per scenario.
+"""
+
+_CHARS_PER_TOKEN = 4
+
+class FakeLLMBackend(SpecializerBackend):
+    kind = "fake"
+
+    def __init__(self, latency: float = 0.5, tokens_per_second: float = 500.0, output_tokens: int = 600,
+                 name: str = "fake-llm", model: str = "fake/bench"):
+        super().__init__(name, model, json_schema=True)
+        self.latency = latency
+        self.tokens_per_second = max(1.0, tokens_per_second)
+        self.output_tokens = output_tokens
+        self.calls: Counter = Counter()
+
+    def _reply(self, request: Dict[str, Any]) -> str:
+        # Echo something request-specific so different payloads give different prompts
+        prompt = request["messages"][-1]["content"]
+        filler_chars = max(0, self.output_tokens * _CHARS_PER_TOKEN - 120)
+        body = ("You are a helpful intake agent. " * (filler_chars // 32 + 1))[:filler_chars]
+        return json.dumps({
+            "system_prompt": f"{body}\n[ref {abs(hash(prompt)) % 10**8}]",
+            "first_message": "Hi, thanks for calling. How can I help today?",
+        })
+
+    async def complete(self, request: Dict[str, Any]) -> str:
+        self.calls["complete"] += 1
+        await asyncio.sleep(self.latency + self.output_tokens / self.tokens_per_second)
+        return self._reply(request)
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[str]:
+        self.calls["stream"] += 1
+        text = self._reply(request)
+        await asyncio.sleep(self.latency)
+        chunk = 8 * _CHARS_PER_TOKEN   # ~8 tokens per delta
+        for i in range(0, len(text), chunk):
+            await asyncio.sleep(8 / self.tokens_per_second)
+            yield text[i:i + chunk]
+
+_HINT_POOL = ["904", "509", "415", "407", "512", "303", "617", "206"]
+
+class FakeVapi:
+    def __init__(self, assistant_latency: float = 0.3, base_latency: float = 0.02, ready_after: float = 2.0,
+                 reject_area_codes: Optional[Set[str]] = None, reject_rate: float = 0.0, seed: int = 1):
+        self.assistant_latency = assistant_latency
+        self.base_latency = base_latency
+        self.ready_after = ready_after
+        self.reject_area_codes = set(reject_area_codes or ())
+        self.reject_rate = reject_rate
+        self.calls: Counter = Counter()
+        self._numbers: Dict[str, Dict[str, Any]] = {}
+        self._random = random.Random(seed)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        endpoint = re.sub(r"^/(assistant|phone-number)/[^/]+", r"/\1/{id}", path)
+        self.calls[f"{request.method} {endpoint}"] += 1
+        body = json.loads(request.content) if request.content else {}
+
+        if path.startswith("/assistant"):
+            await asyncio.sleep(self.assistant_latency if request.method == "POST" else self.base_latency)
+            if request.method == "DELETE":
+                return httpx.Response(200, json={})
+            return httpx.Response(201 if request.method == "POST" else 200,
+                                  json={"id": path.rsplit("/", 1)[-1] if request.method != "POST" else str(uuid.uuid4()),
+                                        **body})
+
+        await asyncio.sleep(self.base_latency)
+        if request.method == "POST" and path == "/phone-number":
+            code = str(body.get("numberDesiredAreaCode") or "")
+            if code in self.reject_area_codes or self._random.random() < self.reject_rate:
+                hints = ", ".join(self._random.sample(_HINT_POOL, 3))
+                return httpx.Response(400, json={
+                    "message": f"Area code {code} is currently unavailable. Hint: Try one of {hints}.",
+                })
+            number_id = str(uuid.uuid4())
+            self._numbers[number_id] = {"id": number_id, "areaCode": code, "created": time.monotonic(), **body}
+            return httpx.Response(201, json=self._view(number_id))
+
+        number_id = path.rsplit("/", 1)[-1]
+        if number_id not in self._numbers:
+            return httpx.Response(404, json={"message": "Not Found"})
+        if request.method == "DELETE":
+            self._numbers.pop(number_id)
+            return httpx.Response(200, json={})
+        if request.method == "PATCH":
+            self._numbers[number_id].update(body)
+        return httpx.Response(200, json=self._view(number_id))
+
+    def _view(self, number_id: str) -> Dict[str, Any]:
+        record = dict(self._numbers[number_id])
+        if time.monotonic() - record.pop("created") >= self.ready_after:
+            record["number"] = f"+1{record.get('areaCode') or '510'}555{int(uuid.UUID(number_id)) % 10000:04d}"
+        return record
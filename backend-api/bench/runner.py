@@ -0,0 +1,348 @@
+# backend-api/bench/runner.py
+from __future__ import annotations
+import asyncio
+import logging
+import platform
+import secrets
+import subprocess
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from app import metrics, prompt_specializer, redis_client, vapi_client
+from app.config import settings
+from app.main import app
+from app.specializer_backends import SpecializerRouter
+from .fakes import FakeLLMBackend, FakeVapi
+
+"""
+Runs the API in-process against the fakes and measures it.
+
+Requests go through httpx's ASGI transport (no sockets, so the numbers are the
+app's own cost plus the simulated upstreams), inside the app's lifespan: the inline
+provisioning worker, caches and middleware all run as in production. Each scenario
+is a closed loop of `concurrency` clients issuing `requests` calls in total.
+
+  preview         POST /v1/agent/preview
+  preview_stream  POST /v1/agent/preview/stream (also reports time to first delta)
+  create          POST /v1/agent/create; with drain_timeout > 0, then waits for the
+                  background number provisioning and reports time to ready
+  load            GET /v1/agent/{slug} over the agents created so far (seeding some
+                  without phone numbers if none were)
+
+Upstream counts are per-scenario deltas; provisioning of earlier creates can still be
+calling Vapi while later scenarios run unless create drains (and create's redis_ops
+then include the drain's own status polls).
+"""
+
+log = logging.getLogger("pheona.bench")
+
+SCENARIOS = ("preview", "preview_stream", "create", "load")
+
+# ---------------- setup ----------------
+
+def _use_fakeredis() -> None:
+    import fakeredis  # bench-only dependency (bench/requirements.txt)
+
+    # fakeredis answers XREADGROUP BLOCK at once, which would spin the worker (and swamp
+    # redis_ops); wait for the next XADD instead, as Redis would
+    stream_added = asyncio.Event()
+
+    class _BenchPipeline(redis_client._TimedPipeline):
+        async def execute(self, raise_on_error: bool = True) -> List[Any]:
+            added = any(str(args[0]).upper() == "XADD" for args, _ in self.command_stack)
+            result = await super().execute(raise_on_error)
+            if added:
+                stream_added.set()
+            return result
+
+    class _BenchRedis(redis_client._TimedRedis, fakeredis.FakeAsyncRedis):
+        """fakeredis with the app's command timing, so redis_ops are counted the same way."""
+
+        def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> _BenchPipeline:
+            return _BenchPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+        async def xadd(self, *args: Any, **kwargs: Any) -> Any:
+            result = await super().xadd(*args, **kwargs)
+            stream_added.set()
+            return result
+
+        async def xreadgroup(self, *args: Any, block: Optional[int] = None, **kwargs: Any) -> Any:
+            stream_added.clear()
+            result = await super().xreadgroup(*args, **kwargs)
+            if result or not block:
+                return result
+            try:
+                await asyncio.wait_for(stream_added.wait(), block / 1000)
+            except asyncio.TimeoutError:
+                return result
+            return await super().xreadgroup(*args, **kwargs)
+
+    redis_client._async_client = _BenchRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+def _git_sha() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+# ---------------- payloads ----------------
+
+def _payload(run_id: str, n: int, distinct: int, area_codes: List[str]) -> Dict[str, Any]:
+    # Payload k of `distinct`: repeats share the specialization cache entry, new ones miss it
+    k = n % distinct if distinct > 0 else n
+    body: Dict[str, Any] = {
+        "template_key": "insurance/motor_trucking/inbound",
+        "agent_name": "Riley",
+        "business_name": f"Bench Freight {run_id}-{k}",
+        "voice_gender": "female" if k % 2 else "male",
+        "languages": ["English"],
+        "free_instructions": "Keep answers short and confirm the caller's DOT number back to them.",
+        "info_to_collect": [
+            {"field": "dot_number", "label": "DOT number", "required": True},
+            {"field": "fleet_size", "label": "Fleet size", "required": False},
+        ],
+    }
+    if area_codes:
+        body["area_code"] = area_codes[n % len(area_codes)]
+    return body
+
+# ---------------- measurement ----------------
+
+def _percentile(values: List[float], q: float) -> float:
+    # Nearest rank on a sorted list
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Seconds in, milliseconds out."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50": round(_percentile(ordered, 0.50) * 1000, 2),
+        "p95": round(_percentile(ordered, 0.95) * 1000, 2),
+        "p99": round(_percentile(ordered, 0.99) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+def _redis_ops() -> Counter:
+    counts: Counter = Counter()
+    for family in metrics.REDIS_OP.collect():
+        for sample in family.samples:
+            if sample.name.endswith("_count"):
+                counts[sample.labels["op"]] += int(sample.value)
+    return counts
+
+class _Upstreams:
+    """Snapshot of every call counter; diff() gives what happened since."""
+
+    def __init__(self, bench: "Bench"):
+        self.bench = bench
+        self.llm = Counter(bench.llm.calls)
+        self.vapi = Counter(bench.vapi.calls)
+        self.redis = _redis_ops()
+
+    def diff(self) -> Dict[str, Any]:
+        return {
+            "upstream": {
+                "llm": dict(Counter(self.bench.llm.calls) - self.llm),
+                "vapi": dict(sorted((Counter(self.bench.vapi.calls) - self.vapi).items())),
+            },
+            "redis_ops": dict(sorted((_redis_ops() - self.redis).items())),
+        }
+
+async def _closed_loop(requests: int, concurrency: int,
+                       call: Callable[[int], Awaitable[int]]) -> Tuple[List[float], Counter, float]:
+    """`concurrency` clients take request numbers until `requests` have been sent."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_n = 0
+
+    async def client() -> None:
+        nonlocal next_n
+        while next_n < requests:
+            n, next_n = next_n, next_n + 1
+            started = time.perf_counter()
+            try:
+                status = str(await call(n))
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(max(1, min(concurrency, requests)))))
+    return latencies, statuses, time.perf_counter() - started
+
+# ---------------- scenarios ----------------
+
+class Bench:
+    def __init__(self, *, requests: int, concurrency: int, distinct: int, area_codes: List[str],
+                 drain_timeout: float, seed_agents: int, llm: FakeLLMBackend, vapi: FakeVapi):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.distinct = distinct
+        self.area_codes = area_codes
+        self.drain_timeout = drain_timeout
+        self.seed_agents = seed_agents
+        self.llm = llm
+        self.vapi = vapi
+        self.run_id = secrets.token_hex(3)   # keeps payloads unique per run on a shared Redis
+        self.created: List[Tuple[str, str]] = []   # (slug, edit token)
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def run(self, scenarios: List[str]) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                         headers={"X-API-Key": settings.BACKEND_API_KEY},
+                                         timeout=httpx.Timeout(300.0)) as self.client:
+                for name in scenarios:
+                    if name == "load" and not self.created:
+                        # Seeding isn't part of the measurement
+                        log.info("Seeding %d agents for load", self.seed_agents)
+                        await self._create(provision=False, requests=self.seed_agents)
+                    log.info("Running %s (%d requests, concurrency %d)", name, self.requests, self.concurrency)
+                    before = _Upstreams(self)
+                    result = await getattr(self, f"_{name}")()
+                    results[name] = {**result, **before.diff()}
+        return results
+
+    def _scenario(self, latencies: List[float], statuses: Counter, wall: float) -> Dict[str, Any]:
+        ok = sum(v for k, v in statuses.items() if k.isdigit() and int(k) < 400)
+        return {
+            "requests": len(latencies),
+            "ok": ok,
+            "errors": len(latencies) - ok,
+            "status_counts": dict(sorted(statuses.items())),
+            "wall_s": round(wall, 3),
+            "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+            "latency_ms": summarize(latencies),
+        }
+
+    async def _preview(self) -> Dict[str, Any]:
+        async def call(n: int) -> int:
+            res = await self.client.post("/v1/agent/preview", json=_payload(self.run_id, n, self.distinct, []))
+            return res.status_code
+
+        return self._scenario(*await _closed_loop(self.requests, self.concurrency, call))
+
+    async def _preview_stream(self) -> Dict[str, Any]:
+        first_delta: List[float] = []
+
+        async def call(n: int) -> int:
+            started = time.perf_counter()
+            body = _payload(self.run_id, n, self.distinct, [])
+            async with self.client.stream("POST", "/v1/agent/preview/stream", json=body) as res:
+                seen = False
+                async for line in res.aiter_lines():
+                    if not seen and line.startswith("event: "):
+                        # A cache hit goes straight to `done`; count that as the first byte too
+                        seen = True
+                        first_delta.append(time.perf_counter() - started)
+                    if line == "event: error":
+                        return 502
+            return res.status_code
+
+        out = self._scenario(*await _closed_loop(self.requests, self.concurrency, call))
+        out["first_event_ms"] = summarize(first_delta)
+        return out
+
+    async def _create(self, provision: bool = True, requests: Optional[int] = None) -> Dict[str, Any]:
+        accepted: Dict[str, Tuple[str, float]] = {}   # slug → (token, request start)
+
+        async def call(n: int) -> int:
+            started = time.perf_counter()
+            body = {**_payload(self.run_id, n, self.distinct, self.area_codes), "provision_phone_number": provision}
+            res = await self.client.post("/v1/agent/create", json=body)
+            if res.status_code == 200:
+                data = res.json()
+                accepted[data["slug"]] = (data["editToken"], started)
+            return res.status_code
+
+        out = self._scenario(*await _closed_loop(requests or self.requests, self.concurrency, call))
+        self.created.extend((slug, token) for slug, (token, _) in accepted.items())
+        if provision and self.drain_timeout > 0:
+            out["provisioning"] = await self._drain(accepted)
+        return out
+
+    async def _drain(self, accepted: Dict[str, Tuple[str, float]]) -> Dict[str, Any]:
+        """Polls every created agent's provisioning status until it settles or the timeout passes."""
+        pending = dict(accepted)
+        outcomes: Counter = Counter()
+        to_ready: List[float] = []
+        deadline = time.perf_counter() + self.drain_timeout
+        while pending and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+            for slug, (token, started) in list(pending.items()):
+                res = await self.client.get(f"/v1/agent/{slug}/provisioning", params={"token": token})
+                status = res.json().get("status") if res.status_code == 200 else "error"
+                if status == "pending":
+                    continue
+                del pending[slug]
+                outcomes[status] += 1
+                if status == "ready":
+                    to_ready.append(time.perf_counter() - started)
+        outcomes["pending"] += len(pending)
+        return {**dict(sorted(outcomes.items())), "time_to_ready_ms": summarize(to_ready)}
+
+    async def _load(self) -> Dict[str, Any]:
+        agents = list(self.created)
+
+        async def call(n: int) -> int:
+            slug, token = agents[n % len(agents)]
+            res = await self.client.get(f"/v1/agent/{slug}", params={"token": token})
+            return res.status_code
+
+        return self._scenario(*await _closed_loop(self.requests, self.concurrency, call))
+
+# ---------------- entry ----------------
+
+async def run(*, scenarios: List[str], requests: int, concurrency: int, distinct: int = 0,
+              area_codes: Optional[List[str]] = None, drain_timeout: float = 0.0, seed_agents: int = 20,
+              redis_url: Optional[str] = None, llm: Optional[FakeLLMBackend] = None,
+              vapi: Optional[FakeVapi] = None, label: str = "") -> Dict[str, Any]:
+    """One bench run; returns the machine-readable result (see bench/__init__.py)."""
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown scenario(s): {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    llm = llm or FakeLLMBackend()
+    vapi = vapi or FakeVapi()
+    if redis_url is None:
+        _use_fakeredis()
+    else:
+        settings.REDIS_URL = redis_url
+    prompt_specializer.set_router(SpecializerRouter([llm]))
+    vapi_client._client = httpx.AsyncClient(transport=vapi.transport(), base_url=settings.VAPI_BASE_URL,
+                                            headers=vapi_client._headers())
+
+    bench = Bench(requests=requests, concurrency=concurrency, distinct=distinct, area_codes=area_codes or [],
+                  drain_timeout=drain_timeout, seed_agents=seed_agents, llm=llm, vapi=vapi)
+    started = time.time()
+    results = await bench.run(scenarios)
+    return {
+        "meta": {
+            "label": label,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+            "duration_s": round(time.time() - started, 3),
+            "git_sha": _git_sha(),
+            "python": platform.python_version(),
+            "redis": "external" if redis_url else "fakeredis",
+        },
+        "config": {
+            "requests": requests,
+            "concurrency": concurrency,
+            "distinct": distinct,
+            "area_codes": area_codes or [],
+            "drain_timeout": drain_timeout,
+            "llm": {"latency": llm.latency, "tokens_per_second": llm.tokens_per_second,
+                    "output_tokens": llm.output_tokens},
+            "vapi": {"assistant_latency": vapi.assistant_latency, "base_latency": vapi.base_latency,
+                     "ready_after": vapi.ready_after, "reject_area_codes": sorted(vapi.reject_area_codes),
+                     "reject_rate": vapi.reject_rate},
+        },
+        "scenarios": results,
+    }
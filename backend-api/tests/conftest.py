@@ -0,0 +1,40 @@
+# backend-api/tests/conftest.py
+import asyncio
+import inspect
+import os
+
+# Required settings; nothing under test talks to the real services
+for _key in ("BACKEND_API_KEY", "VAPI_API_KEY", "GROQ_API_KEY"):
+    os.environ.setdefault(_key, "test")
+
+import fakeredis
+import httpx
+import pytest
+from app import vapi_client
+from app.config import settings
+from bench.fakes import FakeVapi
+
+"""
+Shared fixtures. `async def` tests run on a fresh event loop each (no pytest-asyncio
+needed); `redis` is an empty fakeredis and `fake_vapi` routes vapi_client to the
+in-process fake used by the bench.
+"""
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if inspect.iscoroutinefunction(pyfuncitem.obj):
+        kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+        asyncio.run(pyfuncitem.obj(**kwargs))
+        return True
+    return None
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+@pytest.fixture
+def fake_vapi(monkeypatch):
+    vapi = FakeVapi(assistant_latency=0, base_latency=0, ready_after=0)
+    client = httpx.AsyncClient(transport=vapi.transport(), base_url=settings.VAPI_BASE_URL)
+    monkeypatch.setattr(vapi_client, "_client", client)
+    return vapi
@@ -0,0 +1,104 @@
+# backend-api/tests/test_agent_codec.py
+import json
+import pytest
+from fastapi import HTTPException
+from app import agent_codec, agent_store
+
+BASE = "You are a friendly intake agent for a motor trucking insurance agency. " * 40
+
+class _Templates:
+    def __init__(self):
+        self.texts = {"ins/inbound": [BASE]}
+
+    def prompt_texts(self, key):
+        return self.texts[key]
+
+@pytest.fixture
+def templates(monkeypatch):
+    stub = _Templates()
+    monkeypatch.setattr(agent_codec, "template_registry", stub)
+    monkeypatch.setattr(agent_codec, "_dicts", {})
+    return stub
+
+def _record(**overrides):
+    record = {
+        "payload": {"template_key": "ins/inbound", "agent_name": "Ava", "services": ["auto", "cargo"]},
+        "system_prompt": BASE + "Always confirm the DOT number.",
+        "first_message": "Hi, this is Ava. How can I help today?",
+        "assistantId": "asst_1", "editToken": "tok", "revision": 3,
+    }
+    record.update(overrides)
+    return record
+
+async def _store(redis, mapping, dictionary):
+    pipe = redis.pipeline(transaction=True)
+    agent_codec.ensure_dict_ops(pipe, dictionary)
+    pipe.hset("agent:a", mapping=mapping)
+    await pipe.execute()
+    return await redis.hgetall("agent:a")
+
+async def test_v2_round_trip_uses_the_template_dictionary(redis, templates):
+    record = _record()
+    mapping, dictionary = agent_codec.encode(record)
+    assert mapping["codec"] == agent_codec.CODEC_VERSION
+    assert mapping["system_prompt"].startswith("zd:")
+    assert mapping["first_message"].startswith("t:")  # too short to be worth compressing
+    assert mapping["dict"] == dictionary[0]
+    assert mapping["assistantId"] == "asst_1" and mapping["revision"] == "3"
+    assert agent_codec.encoded_size(mapping) < len(record["system_prompt"]) / 4
+
+    raw = await _store(redis, mapping, dictionary)
+    decoded = await agent_codec.decode(raw, redis)
+    assert decoded == {**record, "revision": "3"}
+
+async def test_v1_records_decode_unchanged(redis, templates):
+    record = _record()
+    raw = {**record, "payload": json.dumps(record["payload"]), "revision": "3"}
+    assert await agent_codec.decode(raw, redis) == {**record, "revision": "3"}
+    assert (await agent_codec.decode({"system_prompt": "s", "first_message": "f"}, redis))["payload"] == {}
+
+async def test_decode_uses_the_stored_dictionary_after_the_template_changes(redis, templates):
+    record = _record()
+    mapping, dictionary = agent_codec.encode(record)
+    raw = await _store(redis, mapping, dictionary)
+
+    # New template version → new dictionary id; the process cache is cold (e.g. another worker)
+    templates.texts["ins/inbound"] = ["Completely different wording. " * 50]
+    agent_codec._dicts.clear()
+    new_id, _ = agent_codec.template_dictionary("ins/inbound")
+    assert new_id != raw["dict"]
+
+    assert await agent_codec.decode(raw, redis) == {**record, "revision": "3"}
+
+async def test_missing_dictionary_is_an_error_not_garbage(redis, templates):
+    mapping, _ = agent_codec.encode(_record())  # dictionary never written
+    agent_codec._dicts.clear()
+    with pytest.raises(agent_codec.MissingDictionary, match="dictionary"):
+        await agent_codec.decode(mapping, redis)
+
+async def test_load_with_an_evicted_dictionary_is_a_503(redis, templates, monkeypatch):
+    monkeypatch.setattr(agent_store, "ar", redis)
+    mapping, dictionary = agent_codec.encode(_record())
+    await _store(redis, mapping, dictionary)
+    assert await redis.ttl(agent_codec.dict_key(dictionary[0])) == -1  # stored without a TTL
+    await redis.delete(agent_codec.dict_key(dictionary[0]))  # evicted anyway
+    agent_codec._dicts.clear()
+    with pytest.raises(HTTPException) as e:
+        await agent_store.get_agent("a")
+    assert e.value.status_code == 503 and "dictionary" in e.value.detail
+
+async def test_unknown_template_falls_back_to_plain_zlib(redis, templates):
+    record = _record(payload={"template_key": "gone/template", "agent_name": "Ava"})
+    templates.texts = {}
+    mapping, dictionary = agent_codec.encode(record)
+    assert dictionary is None and mapping["dict"] == ""
+    assert mapping["system_prompt"].startswith("z:")
+    assert await agent_codec.decode(mapping, redis) == {**record, "revision": "3"}
+
+@pytest.mark.parametrize("fmt", ["x", "zz"])
+def test_unknown_formats_are_rejected(fmt):
+    value = f"{fmt}:" + agent_codec._b85(agent_codec._compress(b"{}", None))
+    with pytest.raises(ValueError, match="unknown"):
+        agent_codec._decode_text(value, None)
+    with pytest.raises(ValueError, match="unknown"):
+        agent_codec._decode_payload(value)
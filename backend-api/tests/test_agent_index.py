@@ -0,0 +1,66 @@
+# backend-api/tests/test_agent_index.py
+import base64
+import json
+import pytest
+from app import agent_index
+
+def _cursor(obj) -> str:
+    return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode()
+
+async def _seed(redis, count: int):
+    pipe = redis.pipeline(transaction=True)
+    for i in range(count):
+        payload = {"business_name": f"Acme {i:02d}", "agent_name": "Ava", "template_key": "ins/inbound"}
+        created = 1_000 + i // 2  # pairs share a timestamp, so ties have to page correctly
+        pipe.hset(f"agent:a{i:02d}", mapping=agent_index.summary_fields(payload, created))
+        agent_index.index_ops(pipe, f"a{i:02d}", payload, created)
+    await pipe.execute()
+
+async def _all_pages(redis, **kwargs):
+    slugs, cursor = [], None
+    while True:
+        items, cursor = await agent_index.list_agents(limit=3, cursor=cursor, redis=redis, **kwargs)
+        slugs += [item["slug"] for item in items]
+        if cursor is None:
+            return slugs
+
+async def test_pages_cover_every_agent_once(redis):
+    await _seed(redis, 10)
+    newest_first = await _all_pages(redis)
+    assert sorted(newest_first) == [f"a{i:02d}" for i in range(10)]
+    assert newest_first[0] in ("a08", "a09")
+    assert await _all_pages(redis, name_prefix="acme") == [f"a{i:02d}" for i in range(10)]
+    assert await _all_pages(redis, name_prefix="acme 0", template_key="ins/inbound") == \
+        [f"a{i:02d}" for i in range(10)]
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 json!",
+    _cursor({}),
+    _cursor([]),
+    _cursor(["s", "m"]),
+    _cursor({"s": "x", "m": "a01"}),
+    _cursor({"s": 5, "m": 7}),
+    _cursor({"s": True, "m": "a01"}),
+    _cursor({"s": 5}),
+    _cursor({"m": "acme\u0000a01"}),          # name cursor on a newest-first listing
+    _cursor({"s": 5, "m": "a01", "x": 1}),
+])
+def test_malformed_score_cursors_are_value_errors(cursor):
+    with pytest.raises(ValueError, match="invalid cursor"):
+        agent_index.decode_cursor(cursor, "score")
+
+@pytest.mark.parametrize("cursor", [_cursor({"s": 1000, "m": "a01"}), _cursor({"m": 5}), _cursor("acme")])
+def test_malformed_name_cursors_are_value_errors(cursor):
+    with pytest.raises(ValueError, match="invalid cursor"):
+        agent_index.decode_cursor(cursor, "name")
+
+def test_non_finite_scores_are_rejected():
+    cursor = base64.urlsafe_b64encode(b'{"s": NaN, "m": "a01"}').decode()
+    with pytest.raises(ValueError):
+        agent_index.decode_cursor(cursor, "score")
+
+async def test_list_agents_rejects_a_cursor_from_the_other_listing(redis):
+    await _seed(redis, 5)
+    _, score_cursor = await agent_index.list_agents(limit=2, redis=redis)
+    with pytest.raises(ValueError):
+        await agent_index.list_agents(name_prefix="acme", limit=2, cursor=score_cursor, redis=redis)
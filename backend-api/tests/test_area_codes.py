@@ -0,0 +1,21 @@
+# backend-api/tests/test_area_codes.py
+import asyncio
+import pytest
+from app import area_codes
+
+async def test_concurrent_attempts_are_all_counted(redis):
+    await asyncio.gather(*(area_codes.record_attempt("415", i % 2 == 0, ["904", "509"], redis) for i in range(20)))
+
+    stats = await area_codes.snapshot(redis)
+    assert stats["415"]["s"] == pytest.approx(10, rel=1e-3)
+    assert stats["415"]["f"] == pytest.approx(10, rel=1e-3)
+    assert stats["904"]["h"] == pytest.approx(20, rel=1e-3)
+    assert await redis.hgetall(area_codes.METRICS_KEY) == {"attempts": "20", "successes": "10"}
+
+async def test_proven_codes_sort_first(redis):
+    await area_codes.record_attempt("904", True, (), redis)
+    await area_codes.record_attempt("510", False, ["509"], redis)
+
+    order = await area_codes.ordered(("212",), redis=redis)
+    assert order[:2] == ["212", "904"]
+    assert order.index("509") < order.index("510")
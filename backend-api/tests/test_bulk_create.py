@@ -0,0 +1,47 @@
+# backend-api/tests/test_bulk_create.py
+import asyncio
+import json
+import pytest
+from app import provisioning, redis_client, stage_timings
+from app.models import CreateAgentRequest
+from app.routes import agents
+
+@pytest.fixture(autouse=True)
+def app_redis(redis, monkeypatch):
+    monkeypatch.setattr(redis_client, "_async_client", redis)
+
+def _item(n: int) -> dict:
+    # No free_instructions: the slot template renders locally, so no LLM is involved
+    return {"template_key": "insurance/motor_trucking/inbound", "agent_name": "Riley",
+            "business_name": f"Freight {n}", "voice_gender": "female", "languages": ["English"],
+            "info_to_collect": [{"field": "dot_number", "label": "DOT number", "required": True}],
+            "area_code": "415"}
+
+async def test_bulk_leaves_numbers_to_the_worker(redis, fake_vapi):
+    rows = [json.loads(line) async for line in agents._bulk_events([_item(n) for n in range(6)])]
+    assert rows[-1] == {"summary": True, "total": 6, "created": 6, "failed": 0}
+    assert fake_vapi.calls["POST /assistant"] == 6
+    assert not [call for call in fake_vapi.calls if "/phone-number" in call]
+    assert await redis.xlen(provisioning.STREAM) == 6
+
+async def test_single_create_reserves_the_number_early(redis, fake_vapi):
+    created = await agents._create_agent(CreateAgentRequest(**_item(1)))
+    state = await provisioning.get_state(created.slug, redis)
+    assert state["phoneNumberId"]
+    assert fake_vapi.calls["POST /phone-number"] == 1
+    assert fake_vapi.calls["PATCH /phone-number/{id}"] == 1
+
+async def test_attach_falls_back_to_the_worker_when_the_reservation_was_cancelled(fake_vapi):
+    async def reserve():
+        await asyncio.sleep(10)
+
+    task = asyncio.create_task(reserve())
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert await agents._attach_number(task, "asst_1", stage_timings.Stages("create")) is None
+
+async def test_attach_falls_back_when_the_reservation_is_cancelled_while_waiting(fake_vapi):
+    task = asyncio.create_task(asyncio.sleep(10))
+    asyncio.get_running_loop().call_later(0.05, task.cancel)
+    assert await agents._attach_number(task, "asst_1", stage_timings.Stages("create")) is None
+    assert not [call for call in fake_vapi.calls if "/phone-number" in call]
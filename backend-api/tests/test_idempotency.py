@@ -0,0 +1,35 @@
+# backend-api/tests/test_idempotency.py
+import json
+import pytest
+from app import idempotency
+
+@pytest.fixture(autouse=True)
+def use_fakeredis(redis, monkeypatch):
+    monkeypatch.setattr(idempotency, "ar", redis)
+
+async def test_first_caller_owns_the_key_and_later_ones_replay(redis):
+    owner = await idempotency.begin("k1", "fp")
+    assert isinstance(owner, str)
+    await idempotency.finish("k1", "fp", 200, '{"slug": "a"}')
+    assert await idempotency.begin("k1", "fp") == (200, '{"slug": "a"}')
+    with pytest.raises(idempotency.IdempotencyConflict):
+        await idempotency.begin("k1", "other")
+
+async def test_release_frees_the_key_for_a_retry(redis):
+    owner = await idempotency.begin("k1", "fp")
+    await idempotency.release("k1", owner)
+    assert await redis.get("idem:create:k1") is None
+    assert isinstance(await idempotency.begin("k1", "fp"), str)
+
+async def test_release_leaves_a_newer_claim_alone(redis):
+    stale = await idempotency.begin("k1", "fp")
+    await redis.delete("idem:create:k1")  # the first claim expired while its request ran
+    fresh = await idempotency.begin("k1", "fp")
+    await idempotency.release("k1", stale)
+    assert json.loads(await redis.get("idem:create:k1"))["owner"] == fresh
+
+async def test_release_never_drops_a_stored_response(redis):
+    owner = await idempotency.begin("k1", "fp")
+    await idempotency.finish("k1", "fp", 200, "{}")
+    await idempotency.release("k1", owner)
+    assert await idempotency.begin("k1", "fp") == (200, "{}")
@@ -0,0 +1,65 @@
+# backend-api/tests/test_json_stream.py
+import json
+import pytest
+from app.json_stream import JSONFieldStream
+
+FIELDS = ("system_prompt", "first_message")
+
+def _feed(chunks):
+    parser = JSONFieldStream(FIELDS)
+    deltas = [d for chunk in chunks for d in parser.feed(chunk)]
+    return parser, deltas
+
+def _joined(deltas, field):
+    return "".join(text for f, text in deltas if f == field)
+
+DOC = {
+    "system_prompt": 'Line one\nTab\there "quoted" back\\slash / slash é \U0001F600 done',
+    "notes": {"system_prompt": "nested, ignored", "list": ["a", "b"]},
+    "first_message": "Hi \U0001F44B — how can I help?",
+}
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_every_split_point_decodes_the_same(ensure_ascii):
+    text = "```json\n" + json.dumps(DOC, ensure_ascii=ensure_ascii) + "\n```"
+    for cut in range(len(text) + 1):
+        parser, deltas = _feed([text[:cut], text[cut:]])
+        assert parser.values == {f: DOC[f] for f in FIELDS}, cut
+        assert _joined(deltas, "system_prompt") == DOC["system_prompt"]
+        assert parser.done
+
+def test_single_character_chunks_split_escapes_and_surrogate_pairs():
+    text = json.dumps({"first_message": "a\\b\"c\U0001F600d", "system_prompt": "é\n"})
+    assert "\\ud83d\\ude00" in text
+    parser, deltas = _feed(list(text))
+    assert parser.values == {"first_message": 'a\\b"c\U0001F600d', "system_prompt": "é\n"}
+    # The pair only surfaces once both halves have arrived, never as a lone surrogate
+    assert all(not ("\ud800" <= ch <= "\udfff") for _, t in deltas for ch in t)
+
+def test_deltas_are_coalesced_per_chunk():
+    _, deltas = _feed(['{"system_prompt": "Hel', 'lo", "first_message": "Hi"}'])
+    assert deltas == [("system_prompt", "Hel"), ("system_prompt", "lo"), ("first_message", "Hi")]
+
+def test_unrequested_and_nested_fields_are_skipped():
+    parser, deltas = _feed(['{"other": "x", "meta": {"first_message": "no"}, "first_message": "yes"}'])
+    assert deltas == [("first_message", "yes")]
+    assert parser.values["system_prompt"] == ""
+
+def test_input_after_the_closing_brace_is_ignored():
+    parser, deltas = _feed(['{"system_prompt": "a"} {"system_prompt": "b"}'])
+    assert parser.done
+    assert deltas == [("system_prompt", "a")]
+
+@pytest.mark.parametrize("raw, expected", [
+    ("\\ud83dx", "\ufffdx"),                        # high surrogate, then a plain character
+    ("\\ud83d\\n", "\ufffd\n"),                     # ... then another escape
+    ("\\ud83d\\u0041", "\ufffdA"),                  # ... then a non-surrogate \u escape
+    ("\\ud83d\\ud83d\\ude00", "\ufffd\U0001F600"),  # ... then a full pair
+    ("\\ude00a", "\ufffda"),                        # lone low surrogate
+    ("ab\\ud83d", "ab\ufffd"),                      # string closes with the high half pending
+])
+def test_unpaired_surrogates_become_replacement_characters(raw, expected):
+    text = '{"first_message": "' + raw + '", "system_prompt": "ok"}'
+    for chunks in ([text], list(text)):
+        parser, _ = _feed(chunks)
+        assert parser.values == {"first_message": expected, "system_prompt": "ok"}
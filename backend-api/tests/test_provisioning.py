@@ -0,0 +1,123 @@
+# backend-api/tests/test_provisioning.py
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from app import provisioning
+from app.config import settings
+
+@pytest.fixture(autouse=True)
+def fast_polls(monkeypatch):
+    monkeypatch.setattr(settings, "PROVISIONING_POLL_INITIAL_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "PROVISIONING_POLL_MAX_INTERVAL_SECONDS", 0.02)
+    monkeypatch.setattr(settings, "PROVISIONING_POLL_LEARN", False)
+
+def _task(slug="acme-1", **extra):
+    return {"slug": slug, "assistant_id": "asst-1", "label": "", "area_code": "", "retry": 0, **extra}
+
+def _post_number() -> httpx.Request:
+    return httpx.Request("POST", "https://api.vapi.ai/phone-number", json={"provider": "vapi"})
+
+async def _pending(redis, slug="acme-1", **state):
+    await redis.hset(f"agent:{slug}", mapping={"assistantId": "asst-1"})
+    await redis.hset(provisioning.state_key(slug), mapping={**provisioning.initial_state(), **state})
+
+async def test_process_reserves_and_marks_ready(redis, fake_vapi):
+    await _pending(redis)
+    await provisioning.process(_task(area_code="415"), redis)
+
+    state = await provisioning.get_state("acme-1", redis)
+    assert state["status"] == provisioning.READY
+    assert state["phoneNumber"].startswith("+1415")
+    assert state["phoneNumberId"]
+    assert await redis.hget("agent:acme-1", "phoneNumber") == state["phoneNumber"]
+    assert fake_vapi.calls["POST /phone-number"] == 1
+
+async def test_process_waits_for_assignment(redis, fake_vapi):
+    fake_vapi.ready_after = 0.05
+    await _pending(redis)
+    await provisioning.process(_task(), redis)
+
+    assert (await provisioning.get_state("acme-1", redis))["status"] == provisioning.READY
+    assert fake_vapi.calls["GET /phone-number/{id}"] >= 1
+
+async def test_process_resumes_from_stored_number(redis, fake_vapi):
+    fake_vapi.ready_after = 0.05
+    created = await fake_vapi.handle(_post_number())
+    phone_id = created.json()["id"]
+    await _pending(redis, phoneNumberId=phone_id, reserved_at=f"{time.time():.3f}")
+    fake_vapi.calls.clear()
+
+    await provisioning.process(_task(), redis)
+
+    state = await provisioning.get_state("acme-1", redis)
+    assert state["status"] == provisioning.READY
+    assert state["phoneNumberId"] == phone_id
+    assert fake_vapi.calls["POST /phone-number"] == 0
+
+async def test_process_skips_finished_agents(redis, fake_vapi):
+    await _pending(redis, status=provisioning.READY)
+    await provisioning.process(_task(), redis)
+    assert not fake_vapi.calls
+
+async def test_process_raises_when_number_never_assigned(redis, fake_vapi, monkeypatch):
+    monkeypatch.setattr(settings, "PROVISIONING_POLL_TIMEOUT_SECONDS", 0.05)
+    fake_vapi.ready_after = 60
+    await _pending(redis)
+
+    with pytest.raises(provisioning.NumberNotReady):
+        await provisioning.process(_task(), redis)
+    # The reserved id is kept so the retry resumes instead of creating another number
+    assert (await provisioning.get_state("acme-1", redis))["phoneNumberId"]
+
+async def test_process_walks_hinted_area_codes(redis, fake_vapi):
+    fake_vapi.reject_area_codes = {"212"}
+    await _pending(redis)
+    await provisioning.process(_task(area_code="212"), redis)
+
+    state = await provisioning.get_state("acme-1", redis)
+    assert state["status"] == provisioning.READY
+    assert not state["phoneNumber"].startswith("+1212")
+    assert state["attempts"] >= 2
+
+async def test_fail_deletes_the_dangling_number(redis, fake_vapi):
+    created = await fake_vapi.handle(_post_number())
+    phone_id = created.json()["id"]
+    await _pending(redis, phoneNumberId=phone_id)
+
+    await provisioning.fail("acme-1", "gave up", redis)
+
+    state = await provisioning.get_state("acme-1", redis)
+    assert state["status"] == provisioning.FAILED
+    assert state["error"] == "gave up"
+    assert fake_vapi.calls["DELETE /phone-number/{id}"] == 1
+
+async def test_mark_ready_updates_agent_and_state(redis):
+    await _pending(redis)
+    await provisioning.mark_ready("acme-1", "+15105550100", "pn-1", redis)
+
+    assert await redis.hget("agent:acme-1", "phoneNumber") == "+15105550100"
+    state = await provisioning.get_state("acme-1", redis)
+    assert (state["status"], state["phoneNumberId"]) == (provisioning.READY, "pn-1")
+
+async def test_promote_due_moves_only_due_tasks(redis):
+    await provisioning.schedule_retry(_task("due", retry=1), 0, redis)
+    await provisioning.schedule_retry(_task("later", retry=1), 3600, redis)
+
+    assert await provisioning.promote_due(redis) == 1
+
+    entries = await redis.xrange(provisioning.STREAM)
+    assert [fields["slug"] for _, fields in entries] == ["due"]
+    remaining = await redis.zrange(provisioning.DELAYED, 0, -1)
+    assert [json.loads(m)["slug"] for m in remaining] == ["later"]
+
+async def test_promote_due_moves_each_task_once(redis):
+    for i in range(5):
+        await provisioning.schedule_retry(_task(f"agent-{i}", retry=1), 0, redis)
+
+    moved = await asyncio.gather(*(provisioning.promote_due(redis) for _ in range(4)))
+
+    assert sum(moved) == 5
+    assert await redis.xlen(provisioning.STREAM) == 5
+    assert await redis.zcard(provisioning.DELAYED) == 0
@@ -0,0 +1,59 @@
+# backend-api/tests/test_readiness.py
+import asyncio
+from app import readiness
+
+async def _numpat(redis) -> int:
+    return await redis.execute_command("PUBSUB", "NUMPAT")
+
+async def test_waiters_share_one_subscription(redis):
+    async with readiness.Waiter("pn-1", redis), readiness.Waiter("pn-2", redis), readiness.Waiter("pn-3", redis):
+        assert await _numpat(redis) == 1
+    assert await _numpat(redis) == 0
+    assert redis not in readiness._dispatchers
+
+async def test_waiter_arriving_during_shutdown_gets_a_registered_dispatcher(redis):
+    first = readiness.Waiter("pn-1", redis)
+    await first.__aenter__()
+    old = readiness._dispatchers[redis]
+    closing = asyncio.create_task(first.__aexit__(None, None, None))
+    await asyncio.sleep(0)  # the last discard is now tearing the subscription down
+    assert redis not in readiness._dispatchers
+
+    async with readiness.Waiter("pn-2", redis) as second:
+        await closing
+        assert second._dispatcher is readiness._dispatchers[redis] is not old
+        assert await _numpat(redis) == 1
+        # A waiter that picked up the old dispatcher before it stopped is redirected
+        assert await old.add("pn-3", asyncio.Event()) is second._dispatcher
+        assert not old.waiters
+    await second._dispatcher.discard("pn-3", next(iter(second._dispatcher.waiters["pn-3"])))
+    assert await _numpat(redis) == 0
+    assert redis not in readiness._dispatchers
+
+async def test_push_wakes_only_that_number(redis):
+    async with readiness.Waiter("pn-1", redis) as one, readiness.Waiter("pn-2", redis) as two:
+        woken = asyncio.gather(one.sleep(5), two.sleep(0.2))
+        await asyncio.sleep(0.05)
+        await readiness.notify_ready("pn-1", redis)
+        assert await asyncio.wait_for(woken, 2) == [True, False]
+
+async def test_push_before_sleep_is_not_lost(redis):
+    async with readiness.Waiter("pn-1", redis) as waiter:
+        await readiness.notify_ready("pn-1", redis)
+        await asyncio.sleep(0.05)
+        assert await asyncio.wait_for(waiter.sleep(5), 2) is True
+        assert await waiter.sleep(0.01) is False
+
+async def test_sleep_without_pubsub_falls_back_to_timer(redis, monkeypatch):
+    def broken():
+        raise ConnectionError("no pub/sub")
+
+    monkeypatch.setattr(redis, "pubsub", broken)
+    async with readiness.Waiter("pn-1", redis) as waiter:
+        assert await waiter.sleep(0.01) is False
+
+def test_backoff_schedule_is_capped():
+    delays = readiness.backoff_schedule(0.5, 1.0, 2.0, 4.0)
+    assert next(delays) == 0.5
+    for _ in range(20):
+        assert 0 < next(delays) <= 4.0
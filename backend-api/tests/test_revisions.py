@@ -0,0 +1,60 @@
+# backend-api/tests/test_revisions.py
+import json
+import random
+import pytest
+from app import revisions
+
+_LINES = ["You are Ava.\n", "Collect the DOT number.\n", "Be brief.\n", "Never quote prices.\n",
+          "Transfer claims to a human.\n", "Hours are 9-5.\n", "Speak Spanish if asked.\n", ""]
+
+def _text(rng: random.Random) -> str:
+    text = "".join(rng.choice(_LINES) for _ in range(rng.randint(0, 12)))
+    # Sometimes end without a newline, which line diffs get wrong easily
+    return text + rng.choice(["", "Goodbye", "\n"])
+
+def _payload(rng: random.Random, prev: dict) -> dict:
+    payload = dict(prev)
+    for field in rng.sample(["agent_name", "timezone", "services", "free_instructions", "after_hours"], 2):
+        if field in payload and rng.random() < 0.3:
+            del payload[field]
+        else:
+            payload[field] = rng.choice(["x", "y", ["a", "b"], None, False, {"k": 1}])
+    return payload
+
+@pytest.mark.parametrize("seed", range(20))
+def test_every_earlier_version_rebuilds_from_the_latest(seed):
+    rng = random.Random(seed)
+    versions = [{"payload": {"agent_name": "Ava"}, "system_prompt": _text(rng), "first_message": "Hi"}]
+    log = []
+    for rev in range(1, 16):
+        prev = versions[-1]
+        new = {"payload": _payload(rng, prev["payload"]),
+               "system_prompt": _text(rng) if rng.random() < 0.7 else prev["system_prompt"],
+               "first_message": rng.choice(["Hi", "Hello there", "Hi\nthere", ""])}
+        changed = sorted(set(prev["payload"]) | set(new["payload"]))
+        entry = revisions.make_revision(
+            rev,
+            revisions.payload_changes(prev["payload"], new["payload"], changed),
+            (prev["system_prompt"], prev["first_message"]),
+            (new["system_prompt"], new["first_message"]),
+        )
+        log.append(json.loads(json.dumps(entry)))  # stored as JSON in Redis
+        versions.append(new)
+
+    current = versions[-1]
+    for rev in range(len(log), 0, -1):
+        current = revisions.revert(current, log[rev - 1])
+        assert current == versions[rev - 1], f"revision {rev}"
+
+def test_unchanged_prompts_are_omitted():
+    entry = revisions.make_revision(2, {"timezone": "UTC"}, ("a\n", "hi"), ("a\n", "hi"))
+    assert set(entry) == {"rev", "at", "payload"}
+    assert revisions.revert({"payload": {"timezone": "EST"}, "system_prompt": "a\n", "first_message": "hi"}, entry) == \
+        {"payload": {"timezone": "UTC"}, "system_prompt": "a\n", "first_message": "hi"}
+
+def test_delta_only_stores_changed_lines():
+    old = "".join(f"line {i}\n" for i in range(100))
+    new = old.replace("line 50\n", "line fifty\n")
+    delta = revisions.text_delta(old, new)
+    assert delta == [[50, 51, ["line 50\n"]]]
+    assert revisions.apply_delta(new, delta) == old
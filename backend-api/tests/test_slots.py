@@ -0,0 +1,84 @@
+# backend-api/tests/test_slots.py
+import json
+import pytest
+from app.slots import SlotTemplateError, compile_plan, compile_slots
+from app.templates import check_required, registry
+
+FIELDS = ("agent_name", "business_name", "services", "info_to_collect", "free_instructions", "after_hours")
+
+def _render(text, **values):
+    return compile_plan(text, FIELDS).render(values)
+
+def test_values_and_filters():
+    text = "{{agent_name}} at {{ business_name }}: {{services|join}}"
+    assert _render(text, agent_name="Ava", business_name="Acme", services=["cuts", "color"]) == \
+        "Ava at Acme: cuts, color"
+    assert _render("{{info_to_collect|json}}", info_to_collect={"name": True}) == '{\n  "name": true\n}'
+    assert _render("{{after_hours}}/{{services|join}}", after_hours=False, services="one") == "no/one"
+
+def test_missing_optional_values_render_empty():
+    assert _render("[{{agent_name}}] [{{services|join}}]") == "[] []"
+
+@pytest.mark.parametrize("value, shown", [
+    ("Call back later", True), ("   ", False), (None, False), ([], False), ({}, False), (False, False), (["x"], True),
+])
+def test_sections_follow_emptiness(value, shown):
+    text = "{{#free_instructions}}extra{{/free_instructions}}{{^free_instructions}}none{{/free_instructions}}"
+    assert _render(text, free_instructions=value) == ("extra" if shown else "none")
+
+def test_standalone_section_lines_are_dropped():
+    text = "Intro\n{{#services}}\nServices: {{services|join}}\n{{/services}}\nOutro\n"
+    assert _render(text, services=["a"]) == "Intro\nServices: a\nOutro\n"
+    assert _render(text) == "Intro\nOutro\n"
+
+def test_nested_sections():
+    text = "{{#agent_name}}A{{#services}}S{{/services}}{{/agent_name}}"
+    assert _render(text, agent_name="x", services=["y"]) == "AS"
+    assert _render(text, agent_name="x") == "A"
+    assert _render(text, services=["y"]) == ""
+
+def test_values_are_inserted_verbatim_and_never_re_expanded():
+    values = {"agent_name": "{{business_name}}", "business_name": 'O\'Brien & "Sons" <ltd>\\n'}
+    assert _render("{{agent_name}}|{{business_name}}", **values) == \
+        '{{business_name}}|O\'Brien & "Sons" <ltd>\\n'
+    # The json filter escapes for JSON, so the rendered value round-trips
+    assert json.loads(_render("{{business_name|json}}", **values)) == values["business_name"]
+
+def test_render_is_deterministic_and_leaves_literal_braces_alone():
+    plan = compile_plan("Use {braces} and {{ agent_name }} and }}{{", FIELDS)
+    assert plan.render({"agent_name": "x"}) == plan.render({"agent_name": "x"}) == "Use {braces} and x and }}{{"
+    assert plan.fields == {"agent_name"}
+
+@pytest.mark.parametrize("text, error", [
+    ("{{nope}}", "unknown slot"),
+    ("{{agent_name|upper}}", "unknown filter"),
+    ("{{#services}}open", "unclosed section"),
+    ("{{#services}}x{{/agent_name}}", "unexpected"),
+    ("{{/services}}", "unexpected"),
+])
+def test_invalid_templates_fail_at_compile_time(text, error):
+    with pytest.raises(SlotTemplateError, match=error):
+        compile_plan(text, FIELDS)
+
+def test_slot_template_llm_modes():
+    system = "You are {{agent_name}}.\n{{#free_instructions}}\n{{free_instructions}}\n{{/free_instructions}}\n"
+    slots = compile_slots({}, system, FIELDS)
+    values = {"agent_name": "Ava", "business_name": "Acme"}
+    assert slots.render(values) == ("You are Ava.", "Hi, this is Ava with Acme. How can I help today?")
+    assert not slots.needs_llm(values)
+    assert slots.needs_llm({**values, "free_instructions": "Be brief"})
+    assert compile_slots({"llm": "always"}, system, FIELDS).needs_llm(values)
+    with pytest.raises(SlotTemplateError):
+        compile_slots({"llm": "sometimes"}, system, FIELDS)
+
+def test_shipped_slot_templates_render_with_only_required_fields():
+    registry.load_all()
+    for key in registry.keys():
+        slots = registry.slots(key)
+        if slots is None:
+            continue
+        template = registry.get(key)
+        values = {f: "x" for f in check_required(template, {})}
+        system_prompt, first_message = slots.render(values)
+        assert system_prompt and first_message
+        assert "{{" not in system_prompt + first_message
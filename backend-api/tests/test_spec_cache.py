@@ -0,0 +1,105 @@
+# backend-api/tests/test_spec_cache.py
+import asyncio
+import pytest
+from app import spec_cache
+
+@pytest.fixture(autouse=True)
+def fresh_cache(redis, monkeypatch):
+    monkeypatch.setattr(spec_cache, "ar", redis)
+    monkeypatch.setattr(spec_cache, "_l1", spec_cache._LRU(100))
+    monkeypatch.setattr(spec_cache, "_inflight", {})
+    monkeypatch.setattr(spec_cache, "_counters", dict.fromkeys(spec_cache._counters, 0))
+
+def _compute(calls, started=None, release=None, val=("sys", "hi")):
+    async def compute():
+        calls.append(1)
+        if started is not None:
+            started.set()
+        if release is not None:
+            await release.wait()
+        return val
+    return compute
+
+async def _stream(calls, started=None, release=None):
+    calls.append(1)
+    yield "delta", '{"system_prompt": "s'
+    if started is not None:
+        started.set()
+    if release is not None:
+        await release.wait()
+    yield "delta", 'ys", "first_message": "hi"}'
+    yield "result", ("sys", "hi")
+
+async def test_concurrent_misses_compute_once():
+    calls, release = [], asyncio.Event()
+    tasks = [asyncio.create_task(spec_cache.get_or_specialize("k", _compute(calls, release=release))) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    release.set()
+    assert await asyncio.gather(*tasks) == [("sys", "hi")] * 5
+    assert len(calls) == 1
+    assert spec_cache._counters["coalesced_local"] == 4
+    assert spec_cache._inflight == {}
+
+async def test_cancelled_leader_hands_over_to_a_follower():
+    calls, started = [], asyncio.Event()
+    leader = asyncio.create_task(spec_cache.get_or_specialize("k", _compute(calls, started, asyncio.Event())))
+    await started.wait()
+    followers = [asyncio.create_task(spec_cache.get_or_specialize("k", _compute(calls))) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    leader.cancel()
+    assert await asyncio.wait_for(asyncio.gather(*followers), 2) == [("sys", "hi")] * 3
+    assert leader.cancelled()
+    assert len(calls) == 2  # the leader's, abandoned, and one follower's
+    assert await spec_cache.lookup("k") == ("sys", "hi")
+
+async def test_leader_error_reaches_followers():
+    async def boom():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("llm down")
+
+    tasks = [asyncio.create_task(spec_cache.get_or_specialize("k", boom)) for _ in range(3)]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert spec_cache._inflight == {}
+
+async def test_stream_leader_streams_and_others_join():
+    calls, started, release = [], asyncio.Event(), asyncio.Event()
+
+    async def consume():
+        return [item async for item in spec_cache.stream_or_join("k", lambda: _stream(calls, started, release))]
+
+    leader = asyncio.create_task(consume())
+    await started.wait()
+    streamed = asyncio.create_task(consume())
+    plain = asyncio.create_task(spec_cache.get_or_specialize("k", _compute(calls)))
+    await asyncio.sleep(0.05)
+    release.set()
+    leader_items, streamed_items, plain_val = await asyncio.gather(leader, streamed, plain)
+    assert [kind for kind, _ in leader_items] == ["delta", "delta", "result"]
+    assert streamed_items == [("result", ("sys", "hi"))]
+    assert plain_val == ("sys", "hi")
+    assert len(calls) == 1
+    assert await spec_cache.lookup("k") == ("sys", "hi")
+
+async def test_abandoned_stream_hands_over_to_a_follower():
+    calls, started = [], asyncio.Event()
+    it = spec_cache.stream_or_join("k", lambda: _stream(calls, started, asyncio.Event()))
+    assert (await it.__anext__())[0] == "delta"
+    follower = asyncio.create_task(spec_cache.get_or_specialize("k", _compute(calls)))
+    await asyncio.sleep(0.05)
+    await it.aclose()  # client disconnected mid-stream
+    assert await asyncio.wait_for(follower, 2) == ("sys", "hi")
+    assert len(calls) == 2
+
+async def test_second_worker_waits_for_the_lock_holder(redis):
+    calls, started, release = [], asyncio.Event(), asyncio.Event()
+    holder = asyncio.create_task(spec_cache.get_or_specialize("k", _compute(calls, started, release)))
+    await started.wait()
+    # Another process: nothing in flight locally, so it has to go through Redis
+    spec_cache._inflight.clear()
+    waiter = asyncio.create_task(spec_cache.get_or_specialize("k", _compute(calls)))
+    await asyncio.sleep(0.05)
+    release.set()
+    assert await asyncio.wait_for(asyncio.gather(holder, waiter), 3) == [("sys", "hi")] * 2
+    assert len(calls) == 1
+    assert spec_cache._counters["coalesced_remote"] == 1
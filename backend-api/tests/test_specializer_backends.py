@@ -0,0 +1,109 @@
+# backend-api/tests/test_specializer_backends.py
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+import pytest
+from app.specializer_backends import SpecializerBackend, SpecializerRouter
+
+class _Scripted(SpecializerBackend):
+    kind = "test"
+
+    def __init__(self, name: str, delay: float = 0.0, error: Optional[Exception] = None,
+                 reply: Optional[str] = None, chunks: Optional[List[str]] = None):
+        super().__init__(name, f"test/{name}")
+        self.delay = delay
+        self.error = error
+        self.reply = reply or name
+        self.chunks = chunks
+        self.calls = 0
+        self.cancelled = False
+
+    async def complete(self, request: Dict[str, Any]) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[str]:
+        if self.chunks is None:
+            async for text in super().stream(request):
+                yield text
+            return
+        self.calls += 1
+        for text in self.chunks:
+            yield text
+        if self.error is not None:
+            raise self.error
+
+def _build(backend: SpecializerBackend) -> Dict[str, Any]:
+    return {"model": backend.model, "messages": []}
+
+def test_backend_must_implement_complete_and_stream():
+    class Partial(SpecializerBackend):
+        async def complete(self, request):
+            return ""
+
+    with pytest.raises(TypeError):
+        Partial("p", "m")
+
+async def test_error_fails_over_to_the_next_backend():
+    first, second = _Scripted("a", error=RuntimeError("down")), _Scripted("b")
+    router = SpecializerRouter([first, second], hedge_after=0)
+    assert await router.run(_build, str) == "b"
+    assert (first.calls, second.calls) == (1, 1)
+    assert router.snapshot()[-1]["name"] == "a"  # the failure pushes it down the ranking
+
+async def test_parse_error_counts_as_a_backend_failure():
+    def parse(text: str) -> str:
+        if text == "a":
+            raise ValueError("not JSON")
+        return text
+
+    router = SpecializerRouter([_Scripted("a"), _Scripted("b")], hedge_after=0)
+    assert await router.run(_build, parse) == "b"
+
+async def test_all_backends_failing_raises_the_last_error():
+    router = SpecializerRouter([_Scripted("a", error=RuntimeError("a down")),
+                                _Scripted("b", error=RuntimeError("b down"))], hedge_after=0)
+    with pytest.raises(RuntimeError, match="b down"):
+        await router.run(_build, str)
+
+async def test_hedge_fires_after_the_delay_and_cancels_the_loser():
+    slow, fast = _Scripted("slow", delay=5), _Scripted("fast", delay=0.01)
+    router = SpecializerRouter([slow, fast], hedge_after=0.05)
+    started = asyncio.get_running_loop().time()
+    assert await router.run(_build, str) == "fast"
+    assert asyncio.get_running_loop().time() - started < 1
+    await asyncio.sleep(0)  # let the cancellation reach the loser
+    assert slow.cancelled
+    # A lost race is not an error for the slow backend
+    stats = {b["name"]: b for b in router.snapshot()}
+    assert stats["slow"]["samples"] == 0
+
+async def test_no_hedge_when_the_primary_answers_in_time():
+    primary, spare = _Scripted("primary", delay=0.01), _Scripted("spare")
+    router = SpecializerRouter([primary, spare], hedge_after=0.5)
+    assert await router.run(_build, str) == "primary"
+    assert spare.calls == 0
+
+async def test_stream_fails_over_before_the_first_delta():
+    broken = _Scripted("a", chunks=[], error=RuntimeError("refused"))
+    ok = _Scripted("b", chunks=["{", "}"])
+    router = SpecializerRouter([broken, ok], hedge_after=0)
+    events = [e async for e in router.stream(_build, str)]
+    assert events == [("delta", "{"), ("delta", "}"), ("result", "{}")]
+
+async def test_stream_raises_after_partial_output():
+    partial = _Scripted("a", chunks=["{"], error=RuntimeError("reset"))
+    spare = _Scripted("b", chunks=["{}"])
+    router = SpecializerRouter([partial, spare], hedge_after=0)
+    events = []
+    with pytest.raises(RuntimeError, match="reset"):
+        async for e in router.stream(_build, str):
+            events.append(e)
+    assert events == [("delta", "{")]
+    assert spare.calls == 0
@@ -0,0 +1,48 @@
+# backend-api/tests/test_tracing.py
+import httpx
+import pytest
+from app import tracing, vapi_client
+from app.config import settings
+
+SAMPLED = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+UNSAMPLED = "00-" + "0" * 31 + "1-" + "b" * 16 + "-00"
+
+@pytest.fixture
+def upstream(monkeypatch):
+    seen = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(404 if request.url.path.endswith("/missing") else 200, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handle), base_url=settings.VAPI_BASE_URL)
+    monkeypatch.setattr(vapi_client, "_client", client)
+    monkeypatch.setattr(settings, "TRACE_EXPORTERS", "jsonl")
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATIO", 0.0)
+    monkeypatch.setattr(tracing, "_buffer", tracing.deque())
+    return seen
+
+def test_noop_span_accepts_writes():
+    tracing.NOOP.error = "HTTP 500"
+    tracing.NOOP.set(status=500)
+    tracing.NOOP.record_error(RuntimeError("x"))
+    assert tracing.NOOP.error is None
+
+@pytest.mark.parametrize("traceparent", [SAMPLED, UNSAMPLED])
+async def test_vapi_requests_carry_no_traceparent(upstream, traceparent):
+    with tracing.trace("request", traceparent):
+        assert tracing.current_traceparent()
+        await vapi_client._request("GET", "/assistant/a1")
+    assert "traceparent" not in upstream[0].headers
+
+async def test_error_status_is_recorded_on_sampled_spans(upstream):
+    with tracing.trace("request", SAMPLED):
+        await vapi_client._request("GET", "/assistant/missing")
+    vapi_span = next(s for s in tracing._buffer if s.name.startswith("vapi "))
+    assert vapi_span.error == "HTTP 404" and vapi_span.attrs["status"] == 404
+
+async def test_error_status_on_an_unsampled_span_is_harmless(upstream):
+    with tracing.trace("request", UNSAMPLED):
+        res = await vapi_client._request("GET", "/assistant/missing")
+    assert res.status_code == 404
+    assert not tracing._buffer
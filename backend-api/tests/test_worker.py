@@ -0,0 +1,101 @@
+# backend-api/tests/test_worker.py
+import asyncio
+import json
+import pytest
+from app import provisioning, worker
+from app.config import settings
+from app.worker import ProvisioningWorker
+
+async def _queue(redis, slug="acme-1"):
+    await redis.hset(provisioning.state_key(slug), mapping=provisioning.initial_state())
+    return await redis.xadd(provisioning.STREAM, {"slug": slug, "assistant_id": "asst-1", "retry": 0})
+
+async def _drain(w):
+    await asyncio.gather(*w._inflight)
+
+async def test_reclaims_tasks_left_by_a_dead_worker(redis, monkeypatch):
+    handled = []
+
+    async def process(fields, r):
+        handled.append(fields["slug"])
+        await provisioning.mark_ready(fields["slug"], "+15105550100", "pn-1", r)
+
+    monkeypatch.setattr(provisioning, "process", process)
+    w = ProvisioningWorker(redis=redis, consumer="alive")
+    await w.ensure_group()
+    await _queue(redis)
+    # Another consumer read the task and died without acking it
+    await redis.xreadgroup(provisioning.GROUP, "dead", {provisioning.STREAM: ">"}, count=1)
+
+    w.lease = 10
+    await w._reclaim_stale()
+    assert not w._inflight  # not idle long enough yet
+
+    w.lease = 0
+    await w._reclaim_stale()
+    await _drain(w)
+
+    assert handled == ["acme-1"]
+    assert (await provisioning.get_state("acme-1", redis))["status"] == provisioning.READY
+    assert (await redis.xpending(provisioning.STREAM, provisioning.GROUP))["pending"] == 0
+    assert await redis.xlen(provisioning.STREAM) == 0
+
+async def test_failure_schedules_a_retry_with_backoff(redis, monkeypatch):
+    async def process(fields, r):
+        raise RuntimeError("vapi down")
+
+    monkeypatch.setattr(provisioning, "process", process)
+    w = ProvisioningWorker(redis=redis, consumer="w1")
+    await w.ensure_group()
+    entry_id = await _queue(redis)
+    await redis.xreadgroup(provisioning.GROUP, "w1", {provisioning.STREAM: ">"})
+
+    await w._handle(entry_id, {"slug": "acme-1", "assistant_id": "asst-1", "retry": "0"})
+
+    state = await provisioning.get_state("acme-1", redis)
+    assert state["status"] == provisioning.PENDING
+    assert (state["retries"], state["error"]) == (1, "vapi down")
+    [(member, _due)] = await redis.zrange(provisioning.DELAYED, 0, -1, withscores=True)
+    assert json.loads(member)["retry"] == 1
+    assert await redis.xlen(provisioning.STREAM) == 0  # acked and removed; the retry lives in the zset
+
+async def test_last_retry_fails_permanently(redis, monkeypatch):
+    async def process(fields, r):
+        raise RuntimeError("vapi down")
+
+    monkeypatch.setattr(provisioning, "process", process)
+    w = ProvisioningWorker(redis=redis, consumer="w1")
+    await w.ensure_group()
+    entry_id = await _queue(redis)
+
+    retry = settings.PROVISIONING_MAX_RETRIES
+    await w._handle(entry_id, {"slug": "acme-1", "assistant_id": "asst-1", "retry": str(retry)})
+
+    state = await provisioning.get_state("acme-1", redis)
+    assert (state["status"], state["error"]) == (provisioning.FAILED, "vapi down")
+    assert await redis.zcard(provisioning.DELAYED) == 0
+
+@pytest.mark.parametrize("retry", range(8))
+def test_backoff_is_exponential_jittered_and_capped(retry):
+    ceiling = min(settings.PROVISIONING_RETRY_MAX_SECONDS, settings.PROVISIONING_RETRY_BASE_SECONDS * 2 ** retry)
+    for _ in range(50):
+        assert ceiling / 2 <= worker._backoff(retry) <= ceiling
+
+async def test_failure_to_record_the_outcome_leaves_the_entry_for_reclaim(redis, monkeypatch, caplog):
+    async def process(fields, r):
+        raise RuntimeError("vapi down")
+
+    async def update_state(*a, **kw):
+        raise ConnectionError("redis gone")
+
+    monkeypatch.setattr(provisioning, "process", process)
+    monkeypatch.setattr(provisioning, "update_state", update_state)
+    w = ProvisioningWorker(redis=redis, consumer="w1")
+    await w.ensure_group()
+    entry_id = await _queue(redis)
+    await redis.xreadgroup(provisioning.GROUP, "w1", {provisioning.STREAM: ">"})
+
+    await w._handle(entry_id, {"slug": "acme-1", "assistant_id": "asst-1", "retry": "0"})  # must not raise
+
+    assert "Recording outcome for acme-1 failed" in caplog.text
+    assert (await redis.xpending(provisioning.STREAM, provisioning.GROUP))["pending"] == 1
@@ -1,8 +1,7 @@
 from __future__ import annotations
 import json
-import os
 import time
-from pathlib import Path
+import uuid
 from typing import Dict, Any, List
 
 import pandas as pd
@@ -10,15 +9,17 @@ import streamlit as st
 from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
 
-from client.api import preview_agent, create_agent, is_backend_configured, load_agent
+from client.api import (
+    stream_preview, create_agent, bulk_create, is_backend_configured, load_agent, get_provisioning,
+    get_template_catalog, CreateUnresolved,
+)
 from components.collect_list import collect_list
 
 load_dotenv()
 
 st.set_page_config(page_title="Pheona – Build your Voice Agent", page_icon="🎙️", layout="centered")
 
-TEMPLATES_DIR = Path(os.getenv("PHEONA_TEMPLATES_DIR", Path(__file__).resolve().parents[1] / "templates"))
-MOTOR_TRUCKING_TEMPLATE = TEMPLATES_DIR / "insurance/motor_trucking/inbound.json"
+DEFAULT_TEMPLATE_KEY = "insurance/motor_trucking/inbound"
 
 class AgentBuilderPayload(BaseModel):
     industry: str = "insurance"
@@ -35,20 +36,38 @@ class AgentBuilderPayload(BaseModel):
     info_to_collect: List[Dict[str, Any]]
     template_key: str = "insurance/motor_trucking/inbound"
 
-def load_template() -> Dict[str, Any]:
-    with open(MOTOR_TRUCKING_TEMPLATE, "r", encoding="utf-8") as f:
-        return json.load(f)
+@st.cache_data(ttl=60, show_spinner=False)
+def load_catalog() -> List[Dict[str, Any]]:
+    # One small catalog response from the backend (ETag-revalidated), cached across reruns
+    try:
+        return get_template_catalog().get("templates", [])
+    except Exception:
+        return []
+
+def load_template(catalog: List[Dict[str, Any]], key: str) -> Dict[str, Any]:
+    return next((t for t in catalog if t.get("key") == key), {})
 
 def section_header(title: str, caption: str | None = None):
     st.subheader(title)
     if caption:
         st.caption(caption)
 
+catalog = load_catalog()
+st.session_state.setdefault("template_key", DEFAULT_TEMPLATE_KEY)
+
 # ---------- Sidebar: Build status & Load saved agent ----------
 with st.sidebar:
     st.markdown("#### Build status")
     st.write("Backend configured:", "✅" if is_backend_configured() else "❌")
-    st.write("Template:", f"`{MOTOR_TRUCKING_TEMPLATE.name}`")
+    template_keys = [t["key"] for t in catalog] or [DEFAULT_TEMPLATE_KEY]
+    if st.session_state["template_key"] not in template_keys:
+        st.session_state["template_key"] = template_keys[0]
+    st.selectbox(
+        "Template",
+        options=template_keys,
+        format_func=lambda k: load_template(catalog, k).get("name") or k,
+        key="template_key",
+    )
     st.divider()
     st.markdown("**Load saved agent**")
     default_edit = st.text_input("Paste edit link (or leave blank)", placeholder="/edit/<slug>?token=<token>")
@@ -66,6 +85,8 @@ with st.sidebar:
             else:
                 data = load_agent(slug_in, token_in)
                 saved = data.get("payload", {})
+                if saved.get("template_key") in template_keys:
+                    st.session_state["template_key"] = saved["template_key"]
                 st.session_state["agent_name"] = saved.get("agent_name", "")
                 st.session_state["business_name"] = saved.get("business_name", "")
                 st.session_state["website"] = saved.get("website", "")
@@ -84,7 +105,7 @@ with st.sidebar:
         except Exception as e:
             st.error(f"Load failed: {e}")
 
-tpl = load_template()
+tpl = load_template(catalog, st.session_state["template_key"])
 
 # ---------- Controlled defaults ----------
 st.session_state.setdefault("agent_name", "")
@@ -98,10 +119,11 @@ st.session_state.setdefault("free_instructions", "")
 st.session_state.setdefault("last_slug", "")
 st.session_state.setdefault("last_token", "")
 st.session_state.setdefault("last_phone", "")
+st.session_state.setdefault("last_preview_id", "")
 
 # ---------- UI ----------
 st.title("Pheona")
-st.write("Spin up a production-grade **inbound** voice agent for **Motor Trucking Insurance** in minutes.")
+st.write(f"Spin up a production-grade voice agent for **{tpl.get('name') or 'Motor Trucking Insurance'}** in minutes.")
 
 section_header("1) Identity")
 col1, col2 = st.columns(2)
@@ -146,6 +168,10 @@ def gather_payload() -> Dict[str, Any]:
         transfer_number=(st.session_state["transfer_number"].strip() or None),
         free_instructions=st.session_state["free_instructions"].strip(),
         info_to_collect=info_to_collect,
+        template_key=st.session_state["template_key"],
+        industry=tpl.get("industry") or "insurance",
+        subcategory=tpl.get("subcategory") or "motor_trucking",
+        use_case=tpl.get("use_case") or "inbound_lead_capture",
     ).model_dump()
 
 def validate_can_submit() -> List[str]:
@@ -171,6 +197,28 @@ def activation_countdown(seconds: int = 120):
     timer.success("Number should be active now. Try calling!")
     bar.empty()
 
+def wait_for_phone_number(slug: str, token: str, placeholder, timeout: int = 240, interval: float = 3.0) -> str:
+    # The backend provisions numbers in the background; poll its status endpoint
+    status = st.empty()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        prov = get_provisioning(slug, token)
+        state = prov.get("status")
+        if state == "ready":
+            status.empty()
+            return (prov.get("phoneNumber") or "").strip()
+        if state in ("failed", "skipped"):
+            if state == "failed":
+                status.warning(f"Phone provisioning failed: {prov.get('error') or 'unknown error'}")
+            else:
+                status.empty()
+            return ""
+        status.info(f"Provisioning phone number… (attempt {prov.get('attempts') or 1})")
+        placeholder.write("**Phone number:** provisioning…")
+        time.sleep(interval)
+    status.info("Still provisioning. Use “Refresh phone number” in a minute.")
+    return ""
+
 with colp:
     if st.button("🔎 Preview prompt", width="stretch"):
         errs = validate_can_submit()
@@ -179,11 +227,24 @@ with colp:
         else:
             try:
                 payload = gather_payload()
-                resp = preview_agent(payload)
+                resp, streamed = None, {"system_prompt": "", "first_message": ""}
+                live = st.empty()
+                for event, data in stream_preview(payload):
+                    if event == "delta":
+                        streamed[data["field"]] += data["text"]
+                        live.code(streamed["system_prompt"] or "…", language="markdown")
+                    elif event == "error":
+                        raise RuntimeError(data.get("detail") or "preview stream failed")
+                    elif event == "done":
+                        resp = data
+                live.empty()
+                if resp is None:
+                    raise RuntimeError("preview stream ended early")
                 missing_fields = (resp or {}).get("missing", {}).get("missing_fields", [])
                 if missing_fields:
                     st.warning(f"Missing required inputs: {', '.join(missing_fields)}")
                 else:
+                    st.session_state["last_preview_id"] = resp.get("preview_id") or ""
                     st.success("Preview ready.")
                     with st.expander("Show generated preview prompt"):
                         st.code((resp.get("preview") or {}).get("system_prompt", ""), language="markdown")
@@ -200,9 +261,33 @@ with colb:
         else:
             try:
                 payload = gather_payload()
-                resp = create_agent(payload)
+                # The key outlives a click only while that create is unresolved: clicking again after
+                # a timeout picks up the same agent, clicking again after an answer builds a new one
+                payload_key = json.dumps(payload, sort_keys=True)
+                if st.session_state.get("create_payload") != payload_key or not st.session_state.get("create_idempotency_key"):
+                    st.session_state["create_payload"] = payload_key
+                    st.session_state["create_idempotency_key"] = str(uuid.uuid4())
+                try:
+                    resp = create_agent(
+                        payload,
+                        preview_id=st.session_state["last_preview_id"] or None,
+                        idempotency_key=st.session_state["create_idempotency_key"],
+                    )
+                except CreateUnresolved:
+                    raise
+                except Exception:
+                    st.session_state["create_idempotency_key"] = None
+                    raise
+                st.session_state["create_idempotency_key"] = None
                 st.success("Your agent is live!")
                 st.write(f"**Assistant ID:** `{resp.get('assistantId')}`")
+                if resp.get("server_timing"):
+                    with st.expander("Where the time went (server)"):
+                        st.caption(f"Trace id: `{resp.get('trace_id', '')}`")
+                        timing_df = pd.DataFrame(
+                            [{"stage": k, "ms": v} for k, v in resp["server_timing"].items()]
+                        ).set_index("stage")
+                        st.bar_chart(timing_df, horizontal=True)
 
                 st.session_state["last_slug"] = resp.get("slug") or ""
                 st.session_state["last_token"] = resp.get("editToken") or ""
@@ -212,6 +297,12 @@ with colb:
                 phone_label = st.session_state["last_phone"] or "provisioning…"
                 phone_placeholder.write(f"**Phone number:** {phone_label}")
 
+                if not st.session_state["last_phone"] and (resp.get("provisioning") or {}).get("status") == "pending":
+                    st.session_state["last_phone"] = wait_for_phone_number(
+                        st.session_state["last_slug"], st.session_state["last_token"], phone_placeholder
+                    )
+                    phone_placeholder.write(f"**Phone number:** {st.session_state['last_phone'] or 'provisioning…'}")
+
                 # Show the activation countdown *after* we have any number text
                 if st.session_state["last_phone"]:
                     activation_countdown(120)
@@ -231,8 +322,83 @@ with colb:
                 st.code(f"/edit/{resp.get('slug')}?token={resp.get('editToken')}")
             except ValidationError as e:
                 st.error(str(e))
+            except CreateUnresolved as e:
+                st.warning(f"No answer from the server yet ({e}). Click Build again to pick up the same "
+                           "request; it won't create a second agent.")
             except Exception as e:
                 st.error(f"Create failed: {e}")
 
+def csv_rows_to_payloads(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # Columns are payload fields; blanks fall back to this form's values. "languages" is
+    # ";"-separated and "info_to_collect" is a JSON list (defaults to the list above).
+    base = gather_payload()
+    base["provision_phone_number"] = True
+    items = []
+    for row in df.fillna("").astype(str).to_dict(orient="records"):
+        item = dict(base)
+        for col, raw in row.items():
+            value = raw.strip()
+            if not value or col not in item and col not in ("area_code", "provision_phone_number"):
+                continue
+            if col == "languages":
+                item[col] = [v.strip() for v in value.split(";") if v.strip()]
+            elif col == "info_to_collect":
+                item[col] = json.loads(value)
+            elif col == "provision_phone_number":
+                item[col] = value.lower() in ("1", "true", "yes", "y")
+            else:
+                item[col] = value
+        items.append(item)
+    return items
+
+with st.expander("Bulk create from CSV"):
+    st.caption(
+        "One agent per row. Columns: agent_name, business_name (required), and optionally website, "
+        "voice_gender, languages (e.g. English;Spanish), timezone, transfer_number, free_instructions, "
+        "area_code, provision_phone_number, info_to_collect (JSON). Blank cells use the form above."
+    )
+    upload = st.file_uploader("CSV file", type=["csv"], key="bulk_csv")
+    if upload is not None:
+        try:
+            bulk_df = pd.read_csv(upload, dtype=str)
+        except Exception as e:
+            bulk_df = None
+            st.error(f"Could not read CSV: {e}")
+        if bulk_df is not None:
+            st.dataframe(bulk_df.head(20), width="stretch")
+            if st.button(f"🚀 Create {len(bulk_df)} agents", width="stretch"):
+                try:
+                    items = csv_rows_to_payloads(bulk_df)
+                    progress = st.progress(0.0)
+                    table = st.empty()
+                    results: List[Dict[str, Any]] = []
+                    for row in bulk_create(items):
+                        if row.get("summary"):
+                            st.success(f"Created {row['created']} of {row['total']} agents ({row['failed']} failed).")
+                            continue
+                        src = items[row["index"]]
+                        res = row.get("result") or {}
+                        results.append({
+                            "row": row["index"] + 1,
+                            "agent_name": src.get("agent_name"),
+                            "business_name": src.get("business_name"),
+                            "ok": row["ok"],
+                            "slug": res.get("slug", ""),
+                            "edit_link": f"/edit/{res['slug']}?token={res['editToken']}" if res else "",
+                            "error": "" if row["ok"] else json.dumps(row.get("error")),
+                        })
+                        progress.progress(len(results) / len(items))
+                        table.dataframe(pd.DataFrame(results).sort_values("row"), width="stretch")
+                    if results:
+                        st.download_button(
+                            "Download results CSV",
+                            pd.DataFrame(results).sort_values("row").to_csv(index=False),
+                            file_name="agents.csv", mime="text/csv",
+                        )
+                except json.JSONDecodeError as e:
+                    st.error(f"Invalid info_to_collect JSON in CSV: {e}")
+                except Exception as e:
+                    st.error(f"Bulk create failed: {e}")
+
 with st.expander("Template defaults (read-only)"):
-    st.json(load_template())
+    st.json(tpl)
@@ -1,15 +1,24 @@
 # frontend-streamlit/client/api.py
 from __future__ import annotations
+import json
 import os
+import secrets
+import uuid
 import requests
 import streamlit as st
 
 # Streamlit Cloud → set in .streamlit/secrets.toml
 BACKEND_BASE_URL = st.secrets.get("BACKEND_BASE_URL", os.getenv("BACKEND_BASE_URL", "http://127.0.0.1:8000"))
 BACKEND_API_KEY  = st.secrets.get("BACKEND_API_KEY",  os.getenv("BACKEND_API_KEY", ""))
+# Ask the backend to keep every trace started here (normally it samples)
+TRACE_SAMPLED = str(st.secrets.get("TRACE_SAMPLED", os.getenv("TRACE_SAMPLED", ""))).lower() in ("1", "true", "yes")
+
+def _traceparent() -> str:
+    # W3C trace context: one new trace per backend call / user action
+    return f"00-{uuid.uuid4().hex}-{secrets.token_hex(8)}-{'01' if TRACE_SAMPLED else '00'}"
 
 def _headers() -> dict:
-    hdrs = {"Content-Type": "application/json"}
+    hdrs = {"Content-Type": "application/json", "traceparent": _traceparent()}
     if BACKEND_API_KEY:
         hdrs["X-API-Key"] = BACKEND_API_KEY
     return hdrs
@@ -28,19 +37,127 @@ def preview_agent(payload: dict) -> dict:
         raise RuntimeError(f"Server error '{r.status_code} {r.reason}' → {r.text}")
     return r.json()
 
-def create_agent(payload: dict) -> dict:
+def stream_preview(payload: dict):
+    """Yields (event, data) from the SSE preview: "delta" chunks, then "done" (or "error")."""
+    url = f"{BACKEND_BASE_URL}/v1/agent/preview/stream"
+    hdrs = {**_headers(), "Accept": "text/event-stream"}
+    with requests.post(url, json=payload, headers=hdrs, stream=True, timeout=(6, 60)) as r:
+        if not r.ok:
+            raise RuntimeError(f"Server error '{r.status_code} {r.reason}' → {r.text}")
+        event, data = "message", []
+        for line in r.iter_lines(decode_unicode=True):
+            if line:
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                continue
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+
+# The backend holds a retry with an in-progress Idempotency-Key for up to
+# IDEMPOTENCY_WAIT_SECONDS (90s); the read timeout has to outlast that wait
+CREATE_TIMEOUT = (6, 120)
+
+class CreateUnresolved(Exception):
+    """No answer for this create yet (timeout, connection error, still running): retry with the same key."""
+
+def create_agent(payload: dict, preview_id: str | None = None, idempotency_key: str | None = None,
+                 retries: int = 2) -> dict:
     body = dict(payload)
     body.setdefault("template_key", "insurance/motor_trucking/inbound")
     body.setdefault("provision_phone_number", True)
+    if preview_id:
+        # Lets the backend reuse the previewed prompt instead of re-running the LLM
+        body["preview_id"] = preview_id
     url = f"{BACKEND_BASE_URL}/v1/agent/create"
-    r = requests.post(url, json=body, headers=_headers(), timeout=60)
+    # Same key on every retry: the backend waits for / replays the first attempt instead of
+    # creating another assistant and number
+    hdrs = {**_headers(), "Idempotency-Key": idempotency_key or str(uuid.uuid4())}
+    for attempt in range(retries + 1):
+        try:
+            r = requests.post(url, json=body, headers=hdrs, timeout=CREATE_TIMEOUT)
+            break
+        except (requests.Timeout, requests.ConnectionError) as e:
+            if attempt == retries:
+                raise CreateUnresolved(str(e)) from e
+    if r.status_code == 409 and "idempotency_key_in_progress" in r.text:
+        raise CreateUnresolved("the original request is still running")
     if not r.ok:
         raise RuntimeError(f"Server error '{r.status_code} {r.reason}' → {r.text}")
-    return r.json()
+    data = r.json()
+    data["server_timing"] = parse_server_timing(r.headers.get("Server-Timing", ""))
+    data["trace_id"] = r.headers.get("X-Trace-Id") or hdrs["traceparent"].split("-")[1]
+    return data
+
+def parse_server_timing(header: str) -> dict:
+    """'specialize;dur=812.4, vapi;dur=231.0' → {"specialize": 812.4, "vapi": 231.0} (milliseconds)."""
+    out = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                try:
+                    out[name] = float(value)
+                except ValueError:
+                    pass
+    return out
+
+def bulk_create(items: list):
+    """Yields one dict per created/failed agent as the backend finishes them, then the summary."""
+    url = f"{BACKEND_BASE_URL}/v1/agents/bulk"
+    body = "\n".join(json.dumps(item) for item in items)
+    hdrs = {**_headers(), "Content-Type": "application/x-ndjson", "Accept": "application/x-ndjson"}
+    with requests.post(url, data=body.encode("utf-8"), headers=hdrs, stream=True, timeout=(6, 600)) as r:
+        if not r.ok:
+            raise RuntimeError(f"Server error '{r.status_code} {r.reason}' → {r.text}")
+        for line in r.iter_lines(decode_unicode=True):
+            if line:
+                yield json.loads(line)
+
+# Last GET /v1/agent/{slug} body per (slug, token) + its ETag; repeat loads revalidate cheaply
+_agent_cache: dict = {}
 
 def load_agent(slug: str, token: str) -> dict:
     url = f"{BACKEND_BASE_URL}/v1/agent/{slug}"
-    r = requests.get(url, params={"token": token}, headers=_headers(), timeout=20)
+    hdrs = _headers()
+    cached = _agent_cache.get((slug, token))
+    if cached:
+        hdrs["If-None-Match"] = cached["etag"]
+    r = requests.get(url, params={"token": token}, headers=hdrs, timeout=20)
+    if r.status_code == 304 and cached:
+        return cached["body"]
     if not r.ok:
         raise RuntimeError(f"Load failed '{r.status_code} {r.reason}' → {r.text}")
+    body = r.json()
+    if r.headers.get("ETag"):
+        _agent_cache[(slug, token)] = {"etag": r.headers["ETag"], "body": body}
+    return body
+
+def get_provisioning(slug: str, token: str) -> dict:
+    url = f"{BACKEND_BASE_URL}/v1/agent/{slug}/provisioning"
+    r = requests.get(url, params={"token": token}, headers=_headers(), timeout=10)
+    if not r.ok:
+        raise RuntimeError(f"Provisioning status failed '{r.status_code} {r.reason}' → {r.text}")
     return r.json()
+
+# Last catalog response + its ETag, kept for the life of the Streamlit process
+_catalog_cache: dict = {"etag": None, "body": None}
+
+def get_template_catalog(**filters) -> dict:
+    hdrs = _headers()
+    cached = _catalog_cache if not filters else {"etag": None, "body": None}
+    if cached["etag"]:
+        hdrs["If-None-Match"] = cached["etag"]
+    url = f"{BACKEND_BASE_URL}/v1/templates"
+    r = requests.get(url, params={k: v for k, v in filters.items() if v}, headers=hdrs, timeout=10)
+    if r.status_code == 304 and cached["body"] is not None:
+        return cached["body"]
+    if not r.ok:
+        raise RuntimeError(f"Template catalog failed '{r.status_code} {r.reason}' → {r.text}")
+    body = r.json()
+    if not filters:
+        _catalog_cache.update(etag=r.headers.get("ETag"), body=body)
+    return body